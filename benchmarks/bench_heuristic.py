@@ -0,0 +1,205 @@
+# Run from the repository root with python -m benchmarks.bench_heuristic, so that the src package can be imported
+import argparse
+import hashlib
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+from typing import Callable
+
+from src.Analyzers.clusters import ClusterIndex
+from src.Analyzers.geode import Geode
+from src.Analyzers.instrumentation import COUNTERS, TIMERS
+from src.grid_reader import GeodeFile, parse_geode
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Phases are timed inclusively: a phase that runs inside another phase (e.g. average_isolation inside
+# populate_group) is counted in both. Recursive calls of a phase are only counted once.
+PHASES = {
+    'init_neighbours': (Geode, '__init_neighbours__'),
+    'populate_bridges': (Geode, 'populate_bridges'),
+    'average_isolation': (Geode, 'average_isolation'),
+    # The clusters are rebuilt before every group, and updated locally whenever a cell joins or leaves a group
+    'rebuild_clusters': (ClusterIndex, 'rebuild'),
+    'split_clusters': (ClusterIndex, 'remove'),
+    'merge_clusters': (ClusterIndex, 'restore'),
+    'populate_group': (Geode, 'populate_group'),
+}
+
+
+class PhaseTimer:
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+        self._depth: dict[str, int] = defaultdict(int)
+
+    def wrap(self, phase: str, func: Callable) -> Callable:
+        @wraps(func)
+        def timed(*args, **kwargs):
+            self._depth[phase] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth[phase] -= 1
+                if self._depth[phase] == 0:
+                    self.seconds[phase] += time.perf_counter() - start
+        return timed
+
+    def install(self) -> Callable[[], None]:
+        originals = {phase: getattr(cls, name) for phase, (cls, name) in PHASES.items()}
+        for phase, (cls, name) in PHASES.items():
+            setattr(cls, name, self.wrap(phase, originals[phase]))
+
+        def uninstall():
+            for phase_, (cls_, name_) in PHASES.items():
+                setattr(cls_, name_, originals[phase_])
+        return uninstall
+
+    def reset(self):
+        self.seconds.clear()
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    ordered = sorted(values)
+
+    def percentile(fraction: float) -> float:
+        # Nearest-rank percentile
+        return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+    return {'mean': sum(ordered) / len(ordered),
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+            'p99': percentile(0.99),
+            'max': ordered[-1]}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def select_geodes(geode_file: GeodeFile, start: int, stop: int, sample: int, seed: int) -> list[int]:
+    indices = list(range(*slice(start, stop).indices(len(geode_file))))
+    if sample is not None and sample < len(indices):
+        indices = sorted(random.Random(seed).sample(indices, sample))
+    return indices
+
+
+def run_benchmark(path: str, indices: list[int], repeat: int, trace_memory: bool, collect_stats: bool = True) -> dict:
+    """
+    Runs the heuristic placement on the geodes and reports the timings
+    :param collect_stats: Whether to time the phases and collect the statistics of the geodes. Both slow down the
+                          placement, so without them only the parse and placement times are reported
+    """
+    timer = PhaseTimer()
+    per_phase: dict[str, list[float]] = defaultdict(list)
+    per_counter: dict[str, list[int]] = defaultdict(list)
+    per_timer: dict[str, list[float]] = defaultdict(list)
+    # The placement is deterministic, so runs that found the same layouts have the same digest
+    layouts = hashlib.sha256()
+    peak_memory = 0
+    uninstall = timer.install() if collect_stats else None
+    try:
+        with GeodeFile(path) as geode_file:
+            raw_geodes = [geode_file.raw(index) for index in indices]
+        if trace_memory:
+            tracemalloc.start()
+
+        batch_start = time.perf_counter()
+        for _ in range(repeat):
+            for raw_geode in raw_geodes:
+                timer.reset()
+                start = time.perf_counter()
+                geode = parse_geode(raw_geode)
+                parsed = time.perf_counter()
+                stats = geode.enable_instrumentation() if collect_stats else None
+                geode.heuristic_placement()
+                end = time.perf_counter()
+
+                per_phase['parse'].append(parsed - start)
+                per_phase['heuristic_placement'].append(end - parsed)
+                per_phase['total'].append(end - start)
+                if collect_stats:
+                    for phase in PHASES:
+                        per_phase[phase].append(timer.seconds[phase])
+                    for counter in COUNTERS:
+                        per_counter[counter].append(stats.counters[counter])
+                    for timer_phase in TIMERS:
+                        per_timer[timer_phase].append(stats.seconds[timer_phase])
+                layouts.update(geode.layout_digest().encode())
+        batch_seconds = time.perf_counter() - batch_start
+
+        if trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        if uninstall is not None:
+            uninstall()
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'path': path,
+        'geodes': indices,
+        'repeat': repeat,
+        'collect_stats': collect_stats,
+        'seconds': batch_seconds,
+        'geodes_per_second': len(indices) * repeat / batch_seconds,
+        'layout_digest': layouts.hexdigest(),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_kb': None if resource is None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'peak_traced_bytes': peak_memory if trace_memory else None,
+        'phases': {phase: percentiles(values) for phase, values in per_phase.items()},
+        # The timers that Geode keeps itself, see GeodeStats
+        'timers': {timer_phase: percentiles(values) for timer_phase, values in per_timer.items()},
+        'counters': {counter: percentiles(values) for counter, values in per_counter.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the heuristic placement pipeline',
+                                     epilog='Run from the repository root with python -m benchmarks.bench_heuristic')
+    parser.add_argument('path', nargs='?', default='geodes.txt')
+    parser.add_argument('--start', type=int, default=0, help='Index of the first geode to consider')
+    parser.add_argument('--stop', type=int, default=100, help='Index after the last geode to consider')
+    parser.add_argument('--sample', type=int, default=None, help='Randomly sample this many of the geodes')
+    parser.add_argument('--seed', type=int, default=0, help='Seed used for sampling geodes')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Track peak Python memory with tracemalloc, which slows down the run')
+    parser.add_argument('--no-stats', action='store_true',
+                        help='Only time the plain placement, without phase timers and geode statistics')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    with GeodeFile(args.path) as geode_file_:
+        selected = select_geodes(geode_file_, args.start, args.stop, args.sample, args.seed)
+    report = run_benchmark(args.path, selected, args.repeat, args.trace_memory, not args.no_stats)
+
+    print(f'{len(selected) * args.repeat} geodes in {report["seconds"]:.2f} seconds '
+          f'({report["geodes_per_second"]:.1f} geodes/s), layout digest {report["layout_digest"][:16]}',
+          file=sys.stderr)
+    timed = list(report['phases'].items()) + [(f'stats.{name}', stats) for name, stats in report['timers'].items()]
+    for phase_name, stats in timed:
+        print(f'{phase_name:>30}: ' + ', '.join(f'{key} {value * 1000:8.2f}ms' for key, value in stats.items()),
+              file=sys.stderr)
+    for counter_name, stats_ in report['counters'].items():
+        print(f'{counter_name:>30}: ' + ', '.join(f'{key} {value:10.1f}' for key, value in stats_.items()),
+              file=sys.stderr)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
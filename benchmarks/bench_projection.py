@@ -0,0 +1,77 @@
+# Run from the repository root with python -m benchmarks.bench_projection, so that the src package can be imported
+import argparse
+import json
+import platform
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.bench_heuristic import git_commit, percentiles
+from src.sat_projection import Coord, ProjectionProblem, decompress, geode_compressed, load_budding_amethysts
+
+MODES = {
+    'incomplete': False,
+    'exact': True,
+}
+
+
+def run_benchmark(budding_amethysts: set[Coord], repeat: int, time_limit: float) -> dict:
+    per_mode: dict[str, dict[str, list[float]]] = {mode: defaultdict(list) for mode in MODES}
+    solutions: dict[str, dict] = {}
+    for _ in range(repeat):
+        # Modes take turns, so a slow down of the machine affects both of them
+        for mode, exact in MODES.items():
+            start = time.perf_counter()
+            problem = ProjectionProblem(budding_amethysts, exact=exact)
+            built = time.perf_counter()
+            solution = problem.solve(time_limit)
+            end = time.perf_counter()
+
+            per_mode[mode]['build'].append(built - start)
+            per_mode[mode]['solve'].append(end - built)
+            per_mode[mode]['total'].append(end - start)
+            solutions[mode] = None if solution is None else {
+                'harvested_clusters': solution.harvested_clusters,
+                'projections': solution.projections,
+                'optimal': solution.optimal,
+            }
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'budding_amethysts': len(budding_amethysts),
+        'repeat': repeat,
+        'time_limit': time_limit,
+        'modes': {mode: {'solution': solutions[mode],
+                         'phases': {phase: percentiles(values) for phase, values in phases.items()}}
+                  for mode, phases in per_mode.items()},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the incomplete and exact projection models',
+                                     epilog='Run from the repository root with python -m benchmarks.bench_projection')
+    parser.add_argument('path', nargs='?', default=None,
+                        help='File with the coordinates of the budding amethysts, defaults to the built-in geode')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--time-limit', type=float, default=60, help='Time limit per solve in seconds')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    buds = decompress(geode_compressed) if args.path is None else load_budding_amethysts(args.path)
+    report = run_benchmark(buds, args.repeat, args.time_limit)
+
+    for mode_name, mode_report in report['modes'].items():
+        solution_ = mode_report['solution']
+        print(f'{mode_name}: ' + ('no solution' if solution_ is None else
+                                  f'{solution_["harvested_clusters"]} clusters, {solution_["projections"]} '
+                                  f'projections ({"optimal" if solution_["optimal"] else "not proven optimal"})'),
+              file=sys.stderr)
+        for phase_name, stats in mode_report['phases'].items():
+            print(f'{phase_name:>10}: ' + ', '.join(f'{key} {value * 1000:8.2f}ms' for key, value in stats.items()),
+                  file=sys.stderr)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
@@ -0,0 +1,172 @@
+from collections import deque
+from typing import Iterable
+
+from src.Analyzers.isolation import is_traversable
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+
+
+class ClusterIndex:
+    """
+    Persistent index of the clusters of traversable cells (ungrouped pumpkins and bridges).
+    Every traversable cell is labelled with the id of its cluster. Instead of recomputing all clusters whenever a
+    cell changes group, the index only searches locally around that cell:
+    - A cell leaving the traversable set can split its cluster. This is detected by searching from all of its
+      neighbours at the same time. Searches that meet are merged (disjoint-set over the searches), and as soon as
+      only one search is left, all other searches have fully explored the pieces that broke off. These are usually
+      the smaller pieces, but not always: a piece that several neighbours are part of is searched faster until the
+      searches meet.
+    - A cell re-entering the traversable set (a rolled back placement) merges the clusters of its neighbours.
+    """
+
+    def __init__(self):
+        self.cluster_of: dict[Cell, int] = {}
+        self.members: dict[int, set[Cell]] = {}
+        self.pumpkins: dict[int, int] = {}
+        self._next_id = 0
+        # The total number of cells expanded while rebuilding and splitting clusters
+        self.expansions = 0
+
+    @property
+    def clusters(self) -> list[set[Cell]]:
+        # Only clusters with at least one pumpkin count as a cluster
+        return [self.members[cluster_id] for cluster_id, pumpkins in self.pumpkins.items() if pumpkins > 0]
+
+    def rebuild(self, cells: Iterable[Cell]):
+        self.cluster_of.clear()
+        self.members.clear()
+        self.pumpkins.clear()
+
+        for cell in cells:
+            if cell in self.cluster_of or not is_traversable(cell):
+                continue
+            cluster_id = self._new_cluster()
+            visited_cells = set()
+            current_cells = {cell}
+            while current_cells:
+                visited_cells |= current_cells
+                current_cells = {neighbour
+                                 for edge in current_cells
+                                 for neighbour in edge.neighbours
+                                 if neighbour not in visited_cells and is_traversable(neighbour)}
+            self.expansions += len(visited_cells)
+            self.pumpkins[cluster_id] += self._relabel(visited_cells, cluster_id)
+
+    def remove(self, cell: Cell) -> list[set[Cell]]:
+        """
+        Removes a cell that is no longer traversable from its cluster
+        :param cell: The cell that was added to a group
+        :return: The clusters (with pumpkins) that the old cluster of the cell consists of after removing the cell.
+                 If it contains more than one cluster, the cell split up its cluster.
+        """
+        cluster_id = self.cluster_of.pop(cell, None)
+        if cluster_id is None:
+            return []
+        self.members[cluster_id].remove(cell)
+        if cell.projected_block is GeodeEnum.PUMPKIN:
+            self.pumpkins[cluster_id] -= 1
+
+        seeds = [neighbour for neighbour in cell.neighbours if neighbour in self.cluster_of]
+        if len(seeds) > 1:
+            for piece in self._split_off(seeds):
+                piece_id = self._new_cluster()
+                self.members[cluster_id] -= piece
+                moved_pumpkins = self._relabel(piece, piece_id)
+                self.pumpkins[piece_id] += moved_pumpkins
+                self.pumpkins[cluster_id] -= moved_pumpkins
+
+        # The pieces of the old cluster are the clusters of the seeds
+        pieces = {self.cluster_of[seed] for seed in seeds} | {cluster_id}
+        for piece_id in pieces:
+            if not self.members[piece_id]:
+                del self.members[piece_id]
+                del self.pumpkins[piece_id]
+        return [self.members[piece_id] for piece_id in pieces
+                if piece_id in self.members and self.pumpkins[piece_id] > 0]
+
+    def restore(self, cell: Cell) -> set[Cell]:
+        """
+        Adds a cell that became traversable again, merging the clusters around it
+        :param cell: The cell that was removed from a group
+        :return: The cluster the cell is now part of
+        """
+        neighbour_ids = {self.cluster_of[neighbour] for neighbour in cell.neighbours if neighbour in self.cluster_of}
+        if neighbour_ids:
+            # Relabel the smaller clusters to the largest one
+            cluster_id = max(neighbour_ids, key=lambda neighbour_id: len(self.members[neighbour_id]))
+            for neighbour_id in neighbour_ids - {cluster_id}:
+                self.pumpkins[cluster_id] += self._relabel(self.members.pop(neighbour_id), cluster_id)
+                del self.pumpkins[neighbour_id]
+        else:
+            cluster_id = self._new_cluster()
+        self.pumpkins[cluster_id] += self._relabel({cell}, cluster_id)
+        return self.members[cluster_id]
+
+    def _new_cluster(self) -> int:
+        cluster_id = self._next_id
+        self._next_id += 1
+        self.members[cluster_id] = set()
+        self.pumpkins[cluster_id] = 0
+        return cluster_id
+
+    def _relabel(self, cells: set[Cell], cluster_id: int) -> int:
+        # Moves the cells to the cluster and returns the number of pumpkins that were moved
+        for cell in cells:
+            self.cluster_of[cell] = cluster_id
+        self.members[cluster_id] |= cells
+        return sum(1 for cell in cells if cell.projected_block is GeodeEnum.PUMPKIN)
+
+    def _split_off(self, seeds: list[Cell]) -> list[set[Cell]]:
+        """
+        Searches from all seeds in lockstep until at most one search can still expand.
+        :param seeds: Traversable cells that used to be connected through the removed cell
+        :return: The pieces that broke off, i.e. every piece except the one that was still being searched. If all
+                 searches finished, the largest piece is the one that is left out.
+        """
+        parent = list(range(len(seeds)))
+        visited: list[set[Cell]] = [{seed} for seed in seeds]
+        frontiers: list[deque[Cell]] = [deque([seed]) for seed in seeds]
+        owner: dict[Cell, int] = {seed: search for search, seed in enumerate(seeds)}
+
+        def find(search: int) -> int:
+            while parent[search] != search:
+                parent[search] = parent[parent[search]]
+                search = parent[search]
+            return search
+
+        active = set(range(len(seeds)))
+        exhausted: list[int] = []
+        while len(active) > 1:
+            for search in list(active):
+                if search not in active:  # Merged into another search during this round
+                    continue
+                if not frontiers[search]:
+                    active.remove(search)
+                    exhausted.append(search)
+                    continue
+                cell = frontiers[search].popleft()
+                self.expansions += 1
+                for neighbour in cell.neighbours:
+                    if neighbour not in self.cluster_of:
+                        continue
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = search
+                        visited[search].add(neighbour)
+                        frontiers[search].append(neighbour)
+                        continue
+                    other = find(other)
+                    if other == search:
+                        continue
+                    # The searches met, so they explore the same piece. Merge the smaller search into the larger.
+                    if len(visited[other]) > len(visited[search]):
+                        search, other = other, search
+                    parent[other] = search
+                    visited[search] |= visited[other]
+                    frontiers[search].extend(frontiers[other])
+                    active.discard(other)
+                    active.add(search)
+
+        if active:  # The remaining search was not explored fully, so it is the piece that keeps the old label
+            return [visited[search] for search in exhausted]
+        return sorted((visited[search] for search in exhausted), key=len)[:-1]
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+
+from src.Analyzers.geode import Geode
+from src.Analyzers.isolation import batched_isolation, neighbour_table
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+
+
+class CellView:
+    """
+    Read-only view on a single cell of a CompactGeode, which is only meant for printing.
+    It exposes the same attributes as Cell, so it can reuse the string functions of Cell.
+    """
+
+    def __init__(self, geode: CompactGeode, cell_id: int):
+        self._geode = geode
+        self._cell_id = cell_id
+        self.row, self.col = divmod(cell_id, geode.cols)
+
+    @property
+    def projected_block(self) -> GeodeEnum:
+        return GeodeEnum(int(self._geode.blocks[self._cell_id]))
+
+    @property
+    def group_nr(self) -> int:
+        return int(self._geode.group_nr[self._cell_id])
+
+    @property
+    def average_block_distance(self) -> float:
+        return float(self._geode.average_block_distance[self._cell_id])
+
+    @property
+    def reachable_pumpkins(self) -> int:
+        return int(self._geode.reachable_pumpkins[self._cell_id])
+
+    has_group = Cell.has_group
+    projected_str = Cell.projected_str
+    group_str = Cell.group_str
+    merged_str = Cell.merged_str
+    isolation_str = Cell.isolation_str
+
+
+class CompactGeode:
+    """
+    Array-backed alternative to Geode.
+    All per-cell state is stored in flat NumPy arrays indexed by cell id (row * cols + col), and the neighbours of
+    every cell are stored in a precomputed index table, which keeps geodes small enough to analyze in bulk.
+    """
+
+    def __init__(self, blocks: np.ndarray):
+        """
+        :param blocks: A 2d array with the GeodeEnum int values of the projected blocks
+        """
+        self.rows, self.cols = blocks.shape
+        self.blocks: np.ndarray = blocks.astype(np.uint8).ravel()
+        self.group_nr: np.ndarray = np.full(self.blocks.size, -1, dtype=np.int16)
+        self.average_block_distance: np.ndarray = np.full(self.blocks.size, np.inf)
+        self.reachable_pumpkins: np.ndarray = np.zeros(self.blocks.size, dtype=np.int32)
+        self.neighbours: np.ndarray = neighbour_table(self.rows, self.cols)
+        self.populate_bridges()
+
+    @classmethod
+    def from_enum_grid(cls, grid: list[list[GeodeEnum]]) -> CompactGeode:
+        return cls(np.array([[block.int_value for block in row] for row in grid], dtype=np.uint8))
+
+    @classmethod
+    def from_geode(cls, geode: Geode) -> CompactGeode:
+        compact = cls(np.array([[cell.projected_block.int_value for cell in row] for row in geode.grid],
+                               dtype=np.uint8))
+        for cell in geode.cells:
+            cell_id = cell.row * compact.cols + cell.col
+            compact.group_nr[cell_id] = cell.group_nr
+            compact.average_block_distance[cell_id] = cell.average_block_distance
+            compact.reachable_pumpkins[cell_id] = cell.reachable_pumpkins
+        return compact
+
+    def to_geode(self) -> Geode:
+        # Groups are not carried over, as Geode builds its groups while placing them
+        blocks = self.blocks.reshape(self.rows, self.cols)
+        return Geode([[Cell(row, col, GeodeEnum(int(blocks[row, col])))
+                       for col in range(self.cols)]
+                      for row in range(self.rows)])
+
+    def neighbour_values(self, values: np.ndarray, fill) -> np.ndarray:
+        """
+        :param values: A per-cell array
+        :param fill: The value to use for neighbours outside the grid
+        :return: A (cells, 4) array with the values of the neighbours of each cell
+        """
+        padded = np.append(values, np.array([fill], dtype=values.dtype))
+        return padded[self.neighbours]
+
+    def populate_bridges(self):
+        # Replace air blocks that connect to at least two pumpkins with a bridge
+        pumpkin_neighbours = self.neighbour_values(self.blocks == GeodeEnum.PUMPKIN.int_value, False).sum(axis=1)
+        self.blocks[(self.blocks == GeodeEnum.AIR.int_value) & (pumpkin_neighbours >= 2)] = GeodeEnum.BRIDGE.int_value
+
+    def reset_groups(self):
+        self.group_nr[:] = -1
+
+    @property
+    def pumpkins(self) -> np.ndarray:
+        return (self.blocks == GeodeEnum.PUMPKIN.int_value) & (self.group_nr == -1)
+
+    @property
+    def traversable(self) -> np.ndarray:
+        return (((self.blocks == GeodeEnum.PUMPKIN.int_value) | (self.blocks == GeodeEnum.BRIDGE.int_value))
+                & (self.group_nr == -1))
+
+    def average_isolation(self):
+        # Computes the isolation metric for all cells at once
+        self.average_block_distance, self.reachable_pumpkins, _ = batched_isolation(self.traversable, self.pumpkins,
+                                                                                    self.neighbours)
+
+    def compute_clusters(self, traversable: np.ndarray = None) -> np.ndarray:
+        """
+        Labels the clusters of traversable cells by repeatedly propagating the smallest cell id to all neighbours
+        :param traversable: The cells that clusters consist of, defaults to the traversable cells
+        :return: Per cell the label of its cluster, or -1 if the cell is not part of a cluster with a pumpkin
+        """
+        if traversable is None:
+            traversable = self.traversable
+        no_label = self.blocks.size
+        labels = np.where(traversable, np.arange(self.blocks.size), no_label)
+        while True:
+            new_labels = np.where(traversable,
+                                  np.minimum(labels, self.neighbour_values(labels, no_label).min(axis=1)),
+                                  no_label)
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+        # Each cluster has at least one pumpkin
+        labels[~np.isin(labels, labels[self.pumpkins])] = -1
+        return labels
+
+    def heuristic_placement(self):
+        # The placement itself is inherently sequential, so it runs on a Geode built from the arrays
+        geode = self.to_geode()
+        geode.heuristic_placement()
+        for cell in geode.cells:
+            cell_id = cell.row * self.cols + cell.col
+            self.group_nr[cell_id] = cell.group_nr
+            self.average_block_distance[cell_id] = cell.average_block_distance
+            self.reachable_pumpkins[cell_id] = cell.reachable_pumpkins
+
+    def cell(self, row: int, col: int) -> CellView:
+        return CellView(self, row * self.cols + col)
+
+    def _pretty_print_grid(self, str_func: Callable[[CellView], str]):
+        for row in range(self.rows):
+            print(''.join(str_func(self.cell(row, col))
+                          for col in range(self.cols)))
+
+    def pretty_print_group_grid(self):
+        self._pretty_print_grid(CellView.group_str)
+
+    def pretty_print_projection(self):
+        self._pretty_print_grid(CellView.projected_str)
+
+    def pretty_print_merged(self):
+        self._pretty_print_grid(CellView.merged_str)
+
+    def pretty_print_average_distance(self):
+        self._pretty_print_grid(CellView.isolation_str)
@@ -1,11 +1,23 @@
+import hashlib
+import heapq
+import random
+from contextlib import AbstractContextManager, nullcontext
 from typing import Callable
 
+import numpy as np
+
+from src.Analyzers.clusters import ClusterIndex
+from src.Analyzers.instrumentation import GeodeStats
+from src.Analyzers.local_search import LocalSearch
+from src.Analyzers.isolation import IsolationEngine, ISOLATION_THRESHOLD, neighbour_table
 from src.Enums.geode_enum import GeodeEnum
-from src.Utils.collections.queue_extensions import PrioritySet
+from src.Utils.collections.queue_extensions import IndexedPriorityQueue
+from src.Utils.dihedral import canonicalize
 from src.cell import Cell
-from src.group import Group
+from src.group import Group, MAX_GROUP_SIZE
 
-MAX_GROUP_SIZE = 12
+# Shared context manager used instead of a timer when instrumentation is disabled
+_NO_TIMER = nullcontext()
 
 
 class Geode:
@@ -16,10 +28,31 @@ class Geode:
                                  for row in range(len(self.grid))
                                  for col in range(len(self.grid[0]))}
         self.__init_neighbours__()
+        # All cells ordered by their flat id (row * cols + col), to index the vectorized neighbour table
+        self.flat_cells: list[Cell] = [cell for row in self.grid for cell in row]
+        self.neighbour_table = neighbour_table(len(self.grid), len(self.grid[0]))
         self.groups: dict[int, Group] = {}
-        self.clusters: set[frozenset[Cell]] = set()
+        self.isolation_engine = IsolationEngine(self.cells)
+        self.cluster_index = ClusterIndex()
+        # The clusters that the cluster of the most recently grouped cell was split into
+        self.last_cluster_split: list[set[Cell]] = []
+        # Every cell that was added to or removed from a group, in order, so queues can tell which priorities changed
+        self.group_changes: list[Cell] = []
+        # Only collected after enable_instrumentation is called
+        self.stats: GeodeStats = None
         self.populate_bridges()
 
+    def enable_instrumentation(self) -> GeodeStats:
+        self.stats = GeodeStats()
+        return self.stats
+
+    def _count(self, counter: str, amount: int = 1):
+        if self.stats is not None:
+            self.stats.count(counter, amount)
+
+    def _timer(self, phase: str) -> AbstractContextManager:
+        return _NO_TIMER if self.stats is None else self.stats.timer(phase)
+
     def __init_neighbours__(self):
         for cell in self.cells:
             row_len = len(self.grid)
@@ -37,121 +70,92 @@ class Geode:
                      for neighbour in cell.neighbours
                      if neighbour.projected_block == GeodeEnum.PUMPKIN)) >= 2):
                 cell.projected_block = GeodeEnum.BRIDGE
+        self.isolation_engine.invalidate_all(self.cells)
+        self.compute_clusters()
 
     def reset_groups(self):
         # Reset groups
         for block in self.cells:
             block.group_nr = -1
         self.groups.clear()
+        self.group_changes.clear()
+        self.reset_derived_state()
+
+    def reset_derived_state(self):
+        # Recomputes everything that depends on the groups, after the groups were changed without notifying the geode
+        self.isolation_engine.invalidate_all(self.cells)
+        self.compute_clusters()
+
+    def _on_group_change(self, cell: Cell):
+        # Called by groups whenever a cell is added or removed, which changes which cells are traversable
+        self.group_changes.append(cell)
+        with self._timer('isolation_updates'):
+            self.isolation_engine.invalidate(cell)
+        with self._timer('cluster_updates'):
+            expansions = self.cluster_index.expansions
+            if cell.has_group:
+                self.last_cluster_split = self.cluster_index.remove(cell)
+            else:  # Rolling back a placement merges the clusters around the cell again
+                self.cluster_index.restore(cell)
+            self._count('cluster_expansions', self.cluster_index.expansions - expansions)
 
     def compute_clusters(self):
-        # Returns a list of the clusters of pumpkins that already can naturally reach each other.
+        # Rebuilds the clusters of pumpkins that already can naturally reach each other.
         # If every pumpkin can reach every pumpkin, then there's only one cluster
         # If there's also a 1x1 group that can't reach any other pumpkin, then there are two, etc.
         # Each cluster has at least one pumpkin
-        undiscovered_pumpkins = set(cell for cell in self.cells
-                                    if cell.projected_block == GeodeEnum.PUMPKIN and not cell.has_group)
-
-        clusters = set()
-
-        while len(undiscovered_pumpkins) > 0:
-            # Pick an arbitrary cell - can't be done in a for loop because we decrease it during the loop
-            source_cell = next(iter(undiscovered_pumpkins))
-            visited_cells = set()
-            current_cells = {source_cell}
-
-            while len(current_cells) > 0:
-                visited_cells |= current_cells
-
-                # BFS
-                current_cells = {cell
-                                 for edge in current_cells
-                                 for cell in edge.neighbours
-                                 if cell not in visited_cells
-                                 and cell.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]
-                                 and not cell.has_group}
-            undiscovered_pumpkins -= visited_cells
-            clusters.add(frozenset(visited_cells))
-        self.clusters = clusters
-
-    def average_isolation(self, frontier: set[Cell] = None):
+        # Afterwards, the cluster index is kept up to date by the groups notifying the geode of changes.
+        with self._timer('compute_clusters'):
+            expansions = self.cluster_index.expansions
+            self.cluster_index.rebuild(self.flat_cells)
+            self._count('cluster_expansions', self.cluster_index.expansions - expansions)
+
+    @property
+    def clusters(self) -> list[set[Cell]]:
+        return self.cluster_index.clusters
+
+    def average_isolation(self, frontier: set[Cell] = None) -> set[Cell]:
         """
         Computes the isolation metric for the frontier, which mostly comes down to the average distance to all other
-        reachable pumpkins
+        reachable pumpkins.
+        Only cells whose component changed since their metric was last computed are recomputed.
+        Without a frontier, all those cells are computed at once by a vectorized breadth first search.
         :param frontier: The cells to compute the metric for. Defaults to all cells
+        :return: The cells whose metric was recomputed
         """
-        # The caller does not expect frontier to change, so we use cells to potentially modify the frontier
-        cells = set()
-        if frontier is not None:
-            extended_frontier = {neighbour
-                                 for cell in frontier
-                                 if cell.projected_block == GeodeEnum.BRIDGE
-                                 for neighbour in cell.neighbours
-                                 if neighbour.projected_block in [GeodeEnum.PUMPKIN] and not neighbour.has_group}
-            cells = frontier | extended_frontier
-        else:
-            cells = set(self.cells)
-
-        for cell in cells:
-            if cell.projected_block in [GeodeEnum.OBSIDIAN, GeodeEnum.AIR] or cell.has_group:
-                cell.average_block_distance = float('inf')
-                continue
-
-            # Breadth first search, not storing any distances but just the average distance
-            total_distance = 0.0
-            visited_cells = set()
-            cell.reachable_pumpkins = 0
-
-            current_distance = 0
-            current_cells = {cell}
-
-            while len(current_cells) > 0:
-                total_distance += current_distance * len([cell for cell in current_cells
-                                                          if cell.projected_block == GeodeEnum.PUMPKIN
-                                                          and not cell.has_group])
-                cell.reachable_pumpkins += len([cell for cell in current_cells
-                                                if cell.projected_block == GeodeEnum.PUMPKIN
-                                                and not cell.has_group])
-                visited_cells |= current_cells
-
-                new_cells = {cell
-                             for edge in current_cells
-                             for cell in edge.neighbours
-                             if cell not in visited_cells
-                             and cell.projected_block not in [GeodeEnum.OBSIDIAN, GeodeEnum.AIR]
-                             and not cell.has_group}
-
-                current_cells = new_cells
-                current_distance += 1
-            try:
-                cell.average_block_distance = total_distance / cell.reachable_pumpkins
-            except ZeroDivisionError:
-                cell.average_block_distance = float('inf')
-            # If it only visited less than MAX range blocks, increase the score so the algorithm has to get it
-            if cell.reachable_pumpkins <= MAX_GROUP_SIZE:
-                cell.average_block_distance = 60 - cell.reachable_pumpkins
+        with self._timer('average_isolation'):
+            expansions = self.isolation_engine.expansions
+            # The caller does not expect frontier to change, so we use cells to potentially modify the frontier
+            if frontier is not None:
+                extended_frontier = {neighbour
+                                     for cell in frontier
+                                     if cell.projected_block == GeodeEnum.BRIDGE
+                                     for neighbour in cell.neighbours
+                                     if neighbour.projected_block in [GeodeEnum.PUMPKIN] and not neighbour.has_group}
+                recomputed = self.isolation_engine.update(frontier | extended_frontier)
+            else:
+                recomputed = self.isolation_engine.update_batched(self.flat_cells, self.neighbour_table)
+            self._count('isolation_expansions', self.isolation_engine.expansions - expansions)
+        return recomputed
 
     def handle_cluster_splitting(self,
                                  cell: Cell,
                                  group: Group,
-                                 old_clusters: set[frozenset[Cell]],
-                                 new_clusters: set[frozenset[Cell]],
+                                 changed_new_clusters: list[set[Cell]],
                                  visited_blocks: set[Cell]) -> bool:
-        # We take the difference between the old set of clusters and the new set of clusters:
-        # original - new = the cluster that was split up
-        # new - original = the clusters it was split up into
-        unchanged_clusters = old_clusters & new_clusters
-        changed_new_clusters = new_clusters - unchanged_clusters
+        # changed_new_clusters are the clusters that the cluster of the placed cell was split up into.
+        # All other clusters are unchanged by the placement.
+        self._count('cluster_splits')
 
         # There should be no scenario in which this method is called and there are not at least two clusters
-        largest_new_cluster = max(changed_new_clusters, key=lambda cluster: len(cluster))
-        second_largest_new_cluster = max(changed_new_clusters - {largest_new_cluster}, key=lambda cluster: len(cluster))
+        changed_new_clusters = sorted(changed_new_clusters, key=lambda cluster: len(cluster), reverse=True)
+        largest_new_cluster, second_largest_new_cluster = changed_new_clusters[:2]
         if len(largest_new_cluster) == len(second_largest_new_cluster):
             # If the largest clusters are equally large, we don't exclude the largest cluster anymore.
             # For the block to end up being placed, it will have to absorb all clusters
             smallest_changed_new_clusters = changed_new_clusters
         else:
-            smallest_changed_new_clusters = changed_new_clusters - {largest_new_cluster}
+            smallest_changed_new_clusters = changed_new_clusters[1:]
 
         # For the neighbours of the newly added block, we check if entire clusters can be added to the
         # current group
@@ -224,6 +228,7 @@ class Geode:
         else:
             group.remove_cell(cell)
             commit_block = False
+            self._count('rollbacks')
         return commit_block
 
     def populate_group(self,
@@ -241,31 +246,52 @@ class Geode:
         """
         absorb_cluster_mode_enabled = absorption_target_set is not None
 
+        # The queue lives as long as the group is populated. It holds the frontier (restricted to the absorption target
+        # set when absorbing) and only the cells whose priority may have changed are updated in each iteration.
+        q = IndexedPriorityQueue()
+        new_cells = frontier
+        seen_group_changes = len(self.group_changes)
+
         while len(group) < MAX_GROUP_SIZE:
             commit_block = True
-            q = PrioritySet()
 
             if absorb_cluster_mode_enabled:
                 # If absorb_cluster_mode_enabled is active, the blocks in the queue are not guaranteed to be neighbours
                 # of the current group, so we should only add blocks to the queue that are both in the frontier and in
                 # the set of blocks that is to be absorbed
-                for cell in frontier & absorption_target_set:
-                    q.add(cell, cell.priority)
+                new_cells = new_cells & absorption_target_set
+                changed_cells = set()
             else:
                 # absorb_cluster_mode_enabled is inactive, we need to recompute the isolation metric for the
                 # frontier, then add the blocks to the queue
-                self.average_isolation(frontier)
-                for cell in frontier:
-                    q.add(cell, cell.priority)
+                changed_cells = self.average_isolation(frontier)
+
+            # The priority of a pumpkin only depends on its own isolation score, but the priority of a bridge also
+            # depends on the scores and groups of its neighbours
+            changed_cells.update(self.group_changes[seen_group_changes:])
+            seen_group_changes = len(self.group_changes)
+            changed_cells |= {neighbour
+                              for cell in changed_cells
+                              for neighbour in cell.neighbours
+                              if neighbour.projected_block is GeodeEnum.BRIDGE}
+            pushed_cells = [cell for cell in changed_cells if cell in q]
+            pushed_cells.extend(new_cells)
+            for cell in pushed_cells:
+                q.push(cell, cell.priority)
+            self._count('queue_pushes', len(pushed_cells))
+            new_cells = set()
 
             try:  # Select the cell for this iteration
-                cell: Cell = q.get()
+                cell: Cell = q.pop()
+                self._count('queue_pops')
                 # If there's only one node left to add, don't add bridges
                 if MAX_GROUP_SIZE - len(group) == 1:
                     while cell.projected_block == GeodeEnum.BRIDGE:
                         visited_blocks.add(cell)
                         frontier.remove(cell)
-                        cell = q.get()
+                        self._count('bridge_skips')
+                        cell = q.pop()
+                        self._count('queue_pops')
             except IndexError:
                 break
 
@@ -276,64 +302,131 @@ class Geode:
                                  for neighbour in cell.neighbours))):
                 visited_blocks.add(cell)
                 frontier.remove(cell)
+                self._count('bridge_skips')
                 continue
 
             group.add_cell(cell)
             visited_blocks.add(cell)
             frontier.remove(cell)
 
-            # During the computation of the isolation metric we also make a set of clusters consisting of blocks
-            # that can all reach each other without traversing bedrock and blocks with groups
+            # The cluster index keeps track of clusters consisting of blocks that can all reach each other without
+            # traversing bedrock and blocks with groups
             # When placing a block, if it leads to n new clusters, we know that the block breaks up
             # an existing cluster into 1 + n clusters
             # Splitting up clusters like this is only possible when not absorbing clusters
-            if not absorb_cluster_mode_enabled:
-                # Store the old clusters before we recompute them
-                old_clusters = self.clusters
-                self.compute_clusters()
-                if len(self.clusters) > len(old_clusters):
-                    commit_block = self.handle_cluster_splitting(cell, group, old_clusters,
-                                                                 self.clusters, visited_blocks)
-                    # If the block is rolled back, we also roll back the clusters
-                    if commit_block:
-                        self.compute_clusters()
-                    else:  # If a cluster is added, we recompute the clusters so the next run is accurate.
-                        self.clusters = old_clusters
+            # If the block is rolled back, the cluster index merges the clusters again by itself
+            if not absorb_cluster_mode_enabled and len(self.last_cluster_split) > 1:
+                with self._timer('handle_cluster_splitting'):
+                    commit_block = self.handle_cluster_splitting(cell, group, self.last_cluster_split,
+                                                                 visited_blocks)
 
             if commit_block:
                 # We add new neighbours to the frontier
-                frontier |= {neighbour for neighbour in cell.neighbours
+                new_cells = {neighbour for neighbour in cell.neighbours
                              if neighbour.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]
                              and not neighbour.has_group
-                             and neighbour not in visited_blocks}
+                             and neighbour not in visited_blocks
+                             and neighbour not in frontier}
+                frontier |= new_cells
 
-    def heuristic_placement(self):
+    def heuristic_placement(self, rng: random.Random = None, source_choices: int = 1):
+        """
+        Greedily places groups, starting each group from the most isolated pumpkin without a group
+        :param rng: Only used to pick the source of each group when there are multiple source choices
+        :param source_choices: Picks the source of each group at random from this many most isolated pumpkins
+        """
         self.reset_groups()
 
         while any(not block.has_group
-                  for block in self.cells
+                  for block in self.flat_cells
                   if block.projected_block == GeodeEnum.PUMPKIN):
             # Before populating a new group, we should always update the isolation score for all blocks
-            # and compute clusters
             self.average_isolation()
-            self.compute_clusters()
 
-            source_block = min((block for block in self.cells
-                                if block.projected_block == GeodeEnum.PUMPKIN and not block.has_group),
-                               key=lambda x: x.priority)
+            source_blocks = (block for block in self.flat_cells
+                             if block.projected_block == GeodeEnum.PUMPKIN and not block.has_group)
+            if rng is None or source_choices == 1:
+                source_block = min(source_blocks, key=lambda x: x.priority)
+            else:
+                source_block = rng.choice(heapq.nsmallest(source_choices, source_blocks, key=lambda x: x.priority))
             frontier = {source_block}
             visited_blocks = set()
-            # Instantiate the group (looks weird because of default dicts)
-            group = Group()
-            group.group_nr = len(self.groups)
-            self.groups[group.group_nr] = group
+            group = self.new_group()
+
+            with self._timer('populate_group'):
+                self.populate_group(group, frontier, visited_blocks)
+                if not len(group):
+                    # The source block is rolled back if it splits its cluster into clusters that can't be absorbed.
+                    # It is placed regardless, otherwise the same source block would be selected over and over again
+                    group.add_cell(source_block)
+                    frontier = {neighbour for neighbour in source_block.neighbours
+                                if neighbour.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]
+                                and not neighbour.has_group
+                                and neighbour not in visited_blocks}
+                    self.populate_group(group, frontier, visited_blocks)
+
+    def improve_layout(self, max_iterations: int = 10_000, time_limit: float = None) -> int:
+        """
+        Improves the current groups with local moves, see LocalSearch
+        :return: The number of moves that were applied
+        """
+        return LocalSearch(self).run(max_iterations, time_limit)
+
+    def new_group(self) -> Group:
+        # Instantiate the group (looks weird because of default dicts)
+        group = Group(on_change=self._on_group_change)
+        group.group_nr = len(self.groups)
+        self.groups[group.group_nr] = group
+        return group
+
+    def block_array(self) -> np.ndarray:
+        # The GeodeEnum int value of every cell
+        return np.array([[cell.projected_block.int_value for cell in row] for row in self.grid], dtype=np.uint8)
+
+    def canonical_form(self) -> tuple[np.ndarray, int]:
+        """
+        Geodes that are rotations or mirror images of each other have the same canonical form, so they can share one
+        solution. The heuristic itself depends on the orientation, so a shared solution has to be computed on the
+        canonical form.
+        :return: The blocks of the minimal rotation/reflection of the geode, and the transform that maps the geode
+                 onto it (see src.Utils.dihedral)
+        """
+        return canonicalize(self.block_array())
 
-            self.populate_group(group, frontier, visited_blocks)
+    def layout_digest(self) -> str:
+        """
+        The placement is deterministic: cells are iterated in flat id order wherever the order matters, and ties
+        between equal priorities are broken by block type and position (see Cell.__lt__).
+        The digest can be used to check that two runs, e.g. before and after a performance change, found the same
+        layout.
+        :return: A hash of the blocks and the group number of every cell
+        """
+        return hashlib.sha256(self.block_array().tobytes()
+                              + np.array(self.group_grid(), dtype='<i2').tobytes()).hexdigest()
+
+    def group_grid(self) -> tuple[tuple[int, ...], ...]:
+        # The group number of every cell, -1 for cells without a group
+        return tuple(tuple(cell.group_nr for cell in row) for row in self.grid)
+
+    def apply_group_grid(self, group_grid: tuple[tuple[int, ...], ...]):
+        """
+        Replaces the current groups by a previously computed group assignment
+        :param group_grid: The group number of every cell, as returned by group_grid
+        """
+        self.reset_groups()
+        for group_nr in sorted({group_nr for row in group_grid for group_nr in row} - {-1}):
+            group = Group(on_change=self._on_group_change)
+            group.group_nr = group_nr
+            self.groups[group_nr] = group
+        for row in self.grid:
+            for cell in row:
+                if (group_nr := group_grid[cell.row][cell.col]) != -1:
+                    self.groups[group_nr].add_cell(cell)
 
     def isolated_pumpkins(self) -> list[Cell]:
         return [cell
-                for cell in self.cells
-                if cell.average_block_distance >= 50
+                for cell in self.flat_cells
+                if cell.average_block_distance >= ISOLATION_THRESHOLD
                 and cell.projected_block == GeodeEnum.PUMPKIN]
 
     def _pretty_print_grid(self, str_func: Callable[[Cell], str]):
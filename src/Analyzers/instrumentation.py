@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+# Counters that Geode keeps when instrumentation is enabled
+COUNTERS = (
+    'isolation_expansions',  # Cells expanded by the breadth first searches of the isolation metric
+    'cluster_expansions',  # Cells expanded while rebuilding or splitting clusters
+    'cluster_splits',  # Placements that split up a cluster and had to be handled
+    'rollbacks',  # Placements that were rolled back after splitting up a cluster
+    'queue_pushes',  # Cells pushed onto the priority queue of populate_group
+    'queue_pops',  # Cells popped from the priority queue of populate_group
+    'bridge_skips',  # Bridges that were popped but not placed
+)
+
+# Phases that Geode times when instrumentation is enabled
+TIMERS = (
+    'average_isolation',  # Updating the isolation metric
+    'isolation_updates',  # Updating or invalidating the isolation metric after a cell joined or left a group
+    'compute_clusters',  # Rebuilding the cluster index
+    'cluster_updates',  # Updating the cluster index after a cell joined or left a group
+    'handle_cluster_splitting',  # Deciding whether a placement that split up a cluster is kept
+    'populate_group',  # Populating groups, which includes the phases above that run while populating
+)
+
+
+class GeodeStats:
+    """
+    Counters and timers for the phases of the heuristic placement of a geode.
+    Stats of multiple geodes can be added together to aggregate them across a batch.
+    """
+
+    def __init__(self):
+        self.counters: Counter[str] = Counter({counter: 0 for counter in COUNTERS})
+        self.seconds: dict[str, float] = defaultdict(float)
+
+    def count(self, counter: str, amount: int = 1):
+        self.counters[counter] += amount
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] += time.perf_counter() - start
+
+    def __add__(self, other: GeodeStats) -> GeodeStats:
+        total = GeodeStats()
+        total += self
+        total += other
+        return total
+
+    def __iadd__(self, other: GeodeStats) -> GeodeStats:
+        self.counters.update(other.counters)
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] += seconds
+        return self
+
+    @staticmethod
+    def aggregate(stats: Iterable[GeodeStats]) -> GeodeStats:
+        total = GeodeStats()
+        for geode_stats in stats:
+            total += geode_stats
+        return total
+
+    def as_dict(self) -> dict[str, dict]:
+        return {'counters': dict(self.counters), 'seconds': dict(self.seconds)}
+
+    @staticmethod
+    def from_dict(values: dict[str, dict]) -> GeodeStats:
+        stats = GeodeStats()
+        stats.counters.update(values['counters'])
+        stats.seconds.update(values['seconds'])
+        return stats
+
+    def __repr__(self):
+        counters = ', '.join(f'{counter}={value}' for counter, value in self.counters.items())
+        seconds = ', '.join(f'{phase}={value:.4f}s' for phase, value in self.seconds.items())
+        return f'GeodeStats({counters}; {seconds})'
@@ -0,0 +1,286 @@
+from typing import Iterable
+
+import numpy as np
+
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+from src.group import MAX_GROUP_SIZE
+
+# Pumpkins that can reach at most MAX_GROUP_SIZE pumpkins get a score of SMALL_CLUSTER_SCORE minus the number of
+# reachable pumpkins, which is higher than any average distance, so the algorithm groups them first
+SMALL_CLUSTER_SCORE = 60
+# Pumpkins with a score of at least this value are considered isolated
+ISOLATION_THRESHOLD = 50
+
+# Same neighbour order as Geode.__init_neighbours__
+NEIGHBOUR_OFFSETS = [(-1, 0), (0, -1), (1, 0), (0, 1)]
+
+
+def is_traversable(cell: Cell) -> bool:
+    # Only pumpkins and bridges that are not yet part of a group can be walked over
+    # Enum members are singletons, and identity checks avoid the (slow) aenum __eq__ in this hot path
+    return ((cell.projected_block is GeodeEnum.PUMPKIN or cell.projected_block is GeodeEnum.BRIDGE)
+            and cell.group_nr == -1)
+
+
+class IsolationEngine:
+    """
+    Keeps the isolation metric of cells up to date while cells join and leave groups.
+    The engine remembers the distances that the breadth first search of every cell found, and the sum of the
+    distances to its pumpkins. When a cell joins a group, the searches that only lose that cell, without any other
+    distance changing, are updated in place. Only the searches for which the cell was on the only shortest path to
+    another cell are marked stale, and recomputed when their metric is needed. When a cell leaves a group, it can
+    connect components or shorten paths, so every search in the component around the cell is marked stale.
+    """
+
+    def __init__(self, cells: Iterable[Cell]):
+        self.stale: set[Cell] = set(cells)
+        # Per cell with an up-to-date metric, the distance to every traversable cell it can reach
+        self.distances: dict[Cell, dict[Cell, int]] = {}
+        # Per cell with an up-to-date metric, the sum of the distances to the pumpkins it can reach
+        self.total_distances: dict[Cell, int] = {}
+        # The cells whose metric was updated in place since the last update
+        self.updated: set[Cell] = set()
+        # The total number of cells expanded by the breadth first searches
+        self.expansions = 0
+
+    def invalidate_all(self, cells: Iterable[Cell]):
+        # Used when the blocks or groups of the cells were changed directly, so their cached priorities are stale too
+        self.stale |= set(cells)
+        self.distances.clear()
+        self.total_distances.clear()
+        for cell in self.stale:
+            cell.invalidate_priority()
+
+    def mark_stale(self, cells: Iterable[Cell]):
+        for cell in cells:
+            self.stale.add(cell)
+            self.distances.pop(cell, None)
+            self.total_distances.pop(cell, None)
+
+    def invalidate(self, cell: Cell):
+        """
+        Updates or marks stale every cell whose isolation metric may have changed because `cell` was added to or
+        removed from a group.
+        Must be called after the group of the cell has changed.
+        :param cell: The cell that changed group
+        """
+        # The priority of the bridges next to the cell depends on whether the cell has a group
+        invalidate_priorities([cell])
+        self.mark_stale([cell])
+        if not is_traversable(cell):
+            for source, distances in list(self.distances.items()):
+                if cell in distances and not self.remove_from_search(source, distances, cell):
+                    self.mark_stale([source])
+            return
+
+        # The cell became traversable, which merged the components of its neighbours, so every cell that can reach the
+        # cell now is affected
+        current_cells = [cell]
+        visited_cells = set()
+        while current_cells:
+            visited_cells.update(current_cells)
+            current_cells = {neighbour
+                             for edge in current_cells
+                             for neighbour in edge.neighbours
+                             if neighbour not in visited_cells and is_traversable(neighbour)}
+        self.mark_stale(visited_cells)
+
+    def remove_from_search(self, source: Cell, distances: dict[Cell, int], cell: Cell) -> bool:
+        """
+        Takes a cell that is no longer traversable out of the search of a source, if that doesn't change any other
+        distance. That is the case if every cell one step further away than the cell has another neighbour at the
+        same distance as the cell, as the breadth first search then finds the same distances without it.
+        :return: Whether the search was updated, otherwise it has to be recomputed
+        """
+        distance = distances[cell]
+        for neighbour in cell.neighbours:
+            if (distances.get(neighbour) == distance + 1
+                    and not any(other is not cell and distances.get(other) == distance
+                                for other in neighbour.neighbours)):
+                return False
+        del distances[cell]
+        if cell.projected_block is GeodeEnum.PUMPKIN:
+            self.total_distances[source] -= distance
+            set_isolation(source, self.total_distances[source], source.reachable_pumpkins - 1)
+            invalidate_priorities([source])
+            self.updated.add(source)
+        return True
+
+    def update(self, cells: Iterable[Cell]) -> set[Cell]:
+        """
+        Recomputes the isolation metric for the cells that are stale
+        :param cells: The cells that need an up-to-date isolation metric
+        :return: The cells that were recomputed, and the cells that were updated in place since the last update
+        """
+        recomputed = {cell for cell in cells if cell in self.stale}
+        for cell in recomputed:
+            distances = isolation_distances(cell)
+            self.expansions += len(distances)
+            pumpkin_distances = [distance for reached, distance in distances.items()
+                                 if reached.projected_block is GeodeEnum.PUMPKIN]
+            self.remember(cell, distances, sum(pumpkin_distances), len(pumpkin_distances))
+        self.stale -= recomputed
+        invalidate_priorities(recomputed)
+        return self.take_updated(recomputed)
+
+    def update_batched(self, flat_cells: list[Cell], neighbours: np.ndarray) -> set[Cell]:
+        """
+        Recomputes the isolation metric for all stale cells in one vectorized pass, see batched_distances
+        :param flat_cells: All cells of the geode, ordered by flat id (row * cols + col)
+        :param neighbours: The neighbour table of the geode
+        :return: The cells that were recomputed, and the cells that were updated in place since the last update
+        """
+        sources = np.array([cell_id for cell_id, cell in enumerate(flat_cells) if cell in self.stale], dtype=np.int64)
+        traversable = np.array([is_traversable(cell) for cell in flat_cells])
+        pumpkins = traversable & np.array([cell.projected_block is GeodeEnum.PUMPKIN for cell in flat_cells])
+        levels = batched_distances(traversable, neighbours, sources)
+        reached = levels != -1
+        self.expansions += int(reached.sum())
+        total_distances = np.where(reached & pumpkins, levels, 0).sum(axis=1).tolist()
+        reachable_pumpkins = (reached & pumpkins).sum(axis=1).tolist()
+
+        cell_array = np.empty(len(flat_cells), dtype=object)
+        cell_array[:] = flat_cells
+        recomputed = set()
+        for search, cell_id in enumerate(sources.tolist()):
+            reachable = reached[search]
+            distances = dict(zip(cell_array[reachable].tolist(), levels[search, reachable].tolist()))
+            self.remember(flat_cells[cell_id], distances, total_distances[search], reachable_pumpkins[search])
+            recomputed.add(flat_cells[cell_id])
+        self.stale -= recomputed
+        invalidate_priorities(recomputed)
+        return self.take_updated(recomputed)
+
+    def take_updated(self, recomputed: set[Cell]) -> set[Cell]:
+        # The cells whose metric changed since the last update, which resets the cells that were updated in place
+        changed = recomputed | (self.updated - self.stale)
+        self.updated = set()
+        return changed
+
+    def remember(self, cell: Cell, distances: dict[Cell, int], total_distance: int, reachable_pumpkins: int):
+        # Sets the metric of the cell from its search, which is kept for later updates
+        set_isolation(cell, total_distance, reachable_pumpkins)
+        if distances:
+            self.distances[cell] = distances
+            self.total_distances[cell] = total_distance
+
+
+def invalidate_priorities(cells: Iterable[Cell]):
+    # The priority of a cell depends on its own isolation score and, for bridges, on the scores of its neighbours
+    for cell in cells:
+        cell.invalidate_priority()
+        for neighbour in cell.neighbours:
+            neighbour.invalidate_priority()
+
+
+def isolation_distances(cell: Cell) -> dict[Cell, int]:
+    # Breadth first search, returns the distance to every traversable cell that the cell can reach
+    if not is_traversable(cell):
+        return {}
+
+    distances = {}
+    current_distance = 0
+    current_cells = {cell}
+    while current_cells:
+        for edge in current_cells:
+            distances[edge] = current_distance
+        current_cells = {neighbour
+                         for edge in current_cells
+                         for neighbour in edge.neighbours
+                         if neighbour not in distances and is_traversable(neighbour)}
+        current_distance += 1
+    return distances
+
+
+def compute_isolation(cell: Cell) -> int:
+    # Computes the isolation metric of a single cell from scratch
+    # Returns the number of cells that were expanded
+    distances = isolation_distances(cell)
+    pumpkin_distances = [distance for reached, distance in distances.items()
+                         if reached.projected_block is GeodeEnum.PUMPKIN]
+    set_isolation(cell, sum(pumpkin_distances), len(pumpkin_distances))
+    return len(distances)
+
+
+def set_isolation(cell: Cell, total_distance: int, reachable_pumpkins: int):
+    # Sets the metric of a cell from the sum of the distances to the pumpkins it can reach
+    cell.reachable_pumpkins = reachable_pumpkins
+    try:
+        cell.average_block_distance = total_distance / reachable_pumpkins
+    except ZeroDivisionError:
+        cell.average_block_distance = float('inf')
+    # If it only visited less than MAX range blocks, increase the score so the algorithm has to get it
+    if is_traversable(cell) and reachable_pumpkins <= MAX_GROUP_SIZE:
+        cell.average_block_distance = SMALL_CLUSTER_SCORE - reachable_pumpkins
+
+
+def neighbour_table(rows: int, cols: int) -> np.ndarray:
+    """
+    Precomputes the neighbours of every cell of a grid
+    :return: A (rows * cols, 4) array with the flat ids (row * cols + col) of the neighbours of each cell,
+             or -1 if it falls outside the grid
+    """
+    row_ids, col_ids = np.divmod(np.arange(rows * cols), cols)
+    table = np.full((rows * cols, len(NEIGHBOUR_OFFSETS)), -1, dtype=np.int32)
+    for index, (row_, col_) in enumerate(NEIGHBOUR_OFFSETS):
+        neighbour_rows = row_ids + row_
+        neighbour_cols = col_ids + col_
+        in_bounds = (0 <= neighbour_rows) & (neighbour_rows < rows) & (0 <= neighbour_cols) & (neighbour_cols < cols)
+        table[in_bounds, index] = neighbour_rows[in_bounds] * cols + neighbour_cols[in_bounds]
+    return table
+
+
+def batched_distances(traversable: np.ndarray, neighbours: np.ndarray, sources: np.ndarray) -> np.ndarray:
+    """
+    Runs the breadth first searches of many cells at once, in lockstep as boolean frontier propagation over the grid
+    graph.
+    :param traversable: Per cell whether it can be walked over (ungrouped pumpkins and bridges)
+    :param neighbours: The neighbour table of the grid, see neighbour_table
+    :param sources: The flat ids of the cells to search from
+    :return: A (sources, cells) array with the distance from every source to every cell, -1 if it can't be reached.
+             Sources that aren't traversable can't reach any cell
+    """
+    levels = np.full((sources.size, traversable.size), -1, dtype=np.int32)
+    # Neighbours outside the grid point to an extra column that is never part of a frontier
+    padded_neighbours = np.where(neighbours == -1, traversable.size, neighbours)
+    frontier = np.zeros((sources.size, traversable.size + 1), dtype=bool)
+    frontier[np.arange(sources.size), sources] = traversable[sources]
+    visited = frontier.copy()
+    current_distance = 0
+    while frontier.any():
+        levels[frontier[:, :-1]] = current_distance
+        frontier[:, :-1] = frontier[:, padded_neighbours].any(axis=2) & traversable
+        frontier &= ~visited
+        visited |= frontier
+        current_distance += 1
+    return levels
+
+
+def batched_isolation(traversable: np.ndarray,
+                      pumpkins: np.ndarray,
+                      neighbours: np.ndarray,
+                      sources: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the isolation metric for many cells at once, see batched_distances
+    :param traversable: Per cell whether it can be walked over (ungrouped pumpkins and bridges)
+    :param pumpkins: Per cell whether it is an ungrouped pumpkin
+    :param neighbours: The neighbour table of the grid, see neighbour_table
+    :param sources: The flat ids of the cells to compute the metric for. Defaults to all cells
+    :return: The average block distance, the number of reachable pumpkins and the number of reachable cells for
+             each source
+    """
+    if sources is None:
+        sources = np.arange(traversable.size)
+    levels = batched_distances(traversable, neighbours, sources)
+    reached = levels != -1
+    total_distance = np.where(reached & pumpkins, levels, 0).sum(axis=1)
+    reachable_pumpkins = (reached & pumpkins).sum(axis=1)
+    reachable_cells = reached.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average_block_distance = np.where(reachable_pumpkins > 0, total_distance / reachable_pumpkins, np.inf)
+    # If it only visited less than MAX range blocks, increase the score so the algorithm has to get it
+    average_block_distance = np.where(traversable[sources] & (reachable_pumpkins <= MAX_GROUP_SIZE),
+                                      SMALL_CLUSTER_SCORE - reachable_pumpkins, average_block_distance)
+    return average_block_distance, reachable_pumpkins, reachable_cells
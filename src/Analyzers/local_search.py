@@ -0,0 +1,271 @@
+import time
+from typing import Iterable, Union
+
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+from src.group import Group, MAX_GROUP_SIZE
+
+
+def is_connected(cells: set[Cell]) -> bool:
+    # Groups have at most MAX_GROUP_SIZE cells, so a search within the group is cheap
+    if not cells:
+        return True
+    start = next(iter(cells))
+    visited_cells = {start}
+    current_cells = [start]
+    while current_cells:
+        cell = current_cells.pop()
+        for neighbour in cell.neighbours:
+            if neighbour in cells and neighbour not in visited_cells:
+                visited_cells.add(neighbour)
+                current_cells.append(neighbour)
+    return len(visited_cells) == len(cells)
+
+
+def layout_violations(geode) -> list[str]:
+    """
+    Checks the constraints on a group layout: every pumpkin is in a group, groups consist of pumpkins and bridges,
+    have at most MAX_GROUP_SIZE cells and are connected
+    :param geode: A Geode
+    :return: A description of every violated constraint, empty if the layout is valid
+    """
+    violations = [f'Pumpkin at {cell.row}, {cell.col} has no group'
+                  for cell in geode.flat_cells
+                  if cell.projected_block is GeodeEnum.PUMPKIN and not cell.has_group]
+    for group_nr, group in geode.groups.items():
+        if len(group) > MAX_GROUP_SIZE:
+            violations.append(f'Group {group_nr} has {len(group)} cells')
+        if any(cell.projected_block not in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE] for cell in group.cells):
+            violations.append(f'Group {group_nr} contains cells that are not pumpkins or bridges')
+        if not is_connected(group.cells):
+            violations.append(f'Group {group_nr} is not connected')
+    return violations
+
+
+class LocalSearch:
+    """
+    Improves an existing group layout of a geode by local moves, keeping every group within MAX_GROUP_SIZE and
+    connected. Connectivity is only ever checked within the groups that a move changes.
+    In order of preference, the moves are:
+      1. Dropping bridges that a group doesn't need to stay connected, which frees up room for the other moves
+      2. Merging two adjacent groups, or two groups next to the same ungrouped bridge
+      3. Re-routing a bridge: merging two groups through a bridge of a third group, which is connected through an
+         ungrouped bridge instead
+      4. Dissolving a group by moving all of its cells into adjacent groups, making room in a full adjacent group
+         by first moving one of its cells on to a third group
+      5. Moving cells from a group into an adjacent group that is at least two cells smaller, to even out group sizes
+      6. Swapping a cell of a group with a cell of an adjacent group, when that lowers the number of places where
+         the two groups touch. Both groups keep their size, and have to stay connected
+    Every move either lowers the number of groups, the number (or spread) of grouped cells or the number of contacts
+    between groups, so the search ends.
+    """
+
+    def __init__(self, geode):
+        self.geode = geode
+
+    def run(self, max_iterations: int = 10_000, time_limit: float = None) -> int:
+        """
+        Applies moves until none are left, or the iteration or time limit is reached
+        :param max_iterations: The maximum number of moves to apply
+        :param time_limit: The maximum number of seconds to search for
+        :return: The number of moves that were applied
+        """
+        deadline = None if time_limit is None else time.perf_counter() + time_limit
+        # Intermediate states are not of interest to the geode, it is updated once at the end
+        callbacks = [(group, group.on_change) for group in self.geode.groups.values()]
+        for group, _ in callbacks:
+            group.on_change = None
+
+        moves = 0
+        try:
+            while moves < max_iterations and (deadline is None or time.perf_counter() < deadline):
+                if not (self.drop_bridge() or self.merge_groups() or self.reroute_bridge() or self.dissolve_group()
+                        or self.balance_groups() or self.swap_cells()):
+                    break
+                moves += 1
+        finally:
+            for group, on_change in callbacks:
+                group.on_change = on_change
+            self.renumber_groups()
+            self.geode.reset_derived_state()
+        return moves
+
+    def ordered_groups(self) -> list[Group]:
+        # Smallest groups first, in a deterministic order
+        return sorted(self.geode.groups.values(), key=lambda group: (len(group), group.group_nr))
+
+    def adjacent_groups(self, cell: Cell) -> list[Group]:
+        return sorted({self.geode.groups[neighbour.group_nr]
+                       for neighbour in cell.neighbours
+                       if neighbour.has_group and neighbour.group_nr != cell.group_nr},
+                      key=lambda group: group.group_nr)
+
+    @staticmethod
+    def move(cell: Cell, source: Union[Group, None], target: Union[Group, None]):
+        if source is not None:
+            source.remove_cell(cell)
+        if target is not None:
+            target.add_cell(cell)
+
+    def drop_bridge(self) -> bool:
+        for group in self.ordered_groups():
+            for cell in sorted(group.cells):
+                if (cell.projected_block is GeodeEnum.BRIDGE and len(group) > 1
+                        and is_connected(group.cells - {cell})):
+                    group.remove_cell(cell)
+                    return True
+        return False
+
+    def merge_groups(self) -> bool:
+        for group in self.ordered_groups():
+            for cell in sorted(group.cells):
+                for other_group in self.adjacent_groups(cell):
+                    if len(group) + len(other_group) <= MAX_GROUP_SIZE:
+                        self.merge(group, other_group)
+                        return True
+            # Groups that aren't adjacent can still be merged through an ungrouped bridge next to both of them
+            for bridge in sorted({neighbour
+                                  for cell in group.cells
+                                  for neighbour in cell.neighbours
+                                  if neighbour.projected_block is GeodeEnum.BRIDGE and not neighbour.has_group}):
+                for other_group in self.adjacent_groups(bridge):
+                    if other_group is not group and len(group) + len(other_group) < MAX_GROUP_SIZE:
+                        group.add_cell(bridge)
+                        self.merge(group, other_group)
+                        return True
+        return False
+
+    def reroute_bridge(self) -> bool:
+        for group in self.ordered_groups():
+            # Bridges of other groups next to the group. Bridges that their group doesn't need are dropped first, so
+            # the third group needs a detour to give up the bridge
+            for bridge in sorted({neighbour
+                                  for cell in group.cells
+                                  for neighbour in cell.neighbours
+                                  if neighbour.projected_block is GeodeEnum.BRIDGE
+                                  and neighbour.has_group and neighbour.group_nr != group.group_nr}):
+                third_group = self.geode.groups[bridge.group_nr]
+                for other_group in self.adjacent_groups(bridge):
+                    if (other_group is group or len(group) + len(other_group) >= MAX_GROUP_SIZE
+                            or (detour := self.detour(third_group, bridge)) is None):
+                        continue
+                    third_group.add_cell(detour)
+                    self.move(bridge, third_group, group)
+                    self.merge(group, other_group)
+                    return True
+        return False
+
+    @staticmethod
+    def detour(group: Group, bridge: Cell) -> Union[Cell, None]:
+        """
+        Finds an ungrouped bridge that keeps the group connected without the given bridge
+        :return: The ungrouped bridge, None if there is none
+        """
+        remaining_cells = group.cells - {bridge}
+        for candidate in sorted({neighbour
+                                 for cell in remaining_cells
+                                 for neighbour in cell.neighbours
+                                 if neighbour.projected_block is GeodeEnum.BRIDGE and not neighbour.has_group}):
+            if is_connected(remaining_cells | {candidate}):
+                return candidate
+        return None
+
+    def merge(self, group: Group, other_group: Group):
+        # The smaller group is merged into the larger one
+        if len(group) > len(other_group):
+            group, other_group = other_group, group
+        for cell in list(group.cells):
+            self.move(cell, group, other_group)
+        del self.geode.groups[group.group_nr]
+
+    def dissolve_group(self) -> bool:
+        for group in self.ordered_groups():
+            applied_moves: list[tuple[Cell, Union[Group, None], Union[Group, None]]] = []
+            while group.cells and (next_moves := self.dissolve_step(group)):
+                for cell, source, target in next_moves:
+                    self.move(cell, source, target)
+                applied_moves.extend(next_moves)
+            if not group.cells:
+                del self.geode.groups[group.group_nr]
+                return True
+            # The group couldn't be dissolved completely, so all moves are undone
+            for cell, source, target in reversed(applied_moves):
+                self.move(cell, target, source)
+        return False
+
+    def dissolve_step(self, group: Group) -> list[tuple[Cell, Union[Group, None], Union[Group, None]]]:
+        """
+        Finds the moves that take one cell out of a group that is being dissolved, without disconnecting it
+        :return: The moves as (cell, source, target) tuples, a target of None means the cell loses its group
+        """
+        candidates = [cell for cell in sorted(group.cells) if is_connected(group.cells - {cell})]
+        for cell in candidates:
+            # Bridges don't have to be in a group, but pumpkins do
+            if cell.projected_block is GeodeEnum.BRIDGE:
+                return [(cell, group, None)]
+            for other_group in self.adjacent_groups(cell):
+                if len(other_group) < MAX_GROUP_SIZE:
+                    return [(cell, group, other_group)]
+        for cell in candidates:
+            for other_group in self.adjacent_groups(cell):
+                # Make room by moving a cell of the full group on to a third group. The cell can't be the one that
+                # connects the full group to the cell that moves in
+                for other_cell in sorted(other_group.cells):
+                    if (other_cell in cell.neighbours and len([neighbour for neighbour in cell.neighbours
+                                                               if neighbour in other_group.cells]) == 1) \
+                            or not is_connected(other_group.cells - {other_cell}):
+                        continue
+                    for third_group in self.adjacent_groups(other_cell):
+                        if third_group is not group and len(third_group) < MAX_GROUP_SIZE:
+                            return [(other_cell, other_group, third_group), (cell, group, other_group)]
+        return []
+
+    def balance_groups(self) -> bool:
+        for group in reversed(self.ordered_groups()):
+            for cell in sorted(group.cells):
+                for other_group in self.adjacent_groups(cell):
+                    if len(group) - len(other_group) >= 2 and is_connected(group.cells - {cell}):
+                        self.move(cell, group, other_group)
+                        return True
+        return False
+
+    def swap_cells(self) -> bool:
+        for group in self.ordered_groups():
+            for cell in sorted(group.cells):
+                for other_group in self.adjacent_groups(cell):
+                    for other_cell in sorted(other_group.cells):
+                        swapped = {cell: other_group.group_nr, other_cell: group.group_nr}
+                        # Both groups keep their size, so only the contacts and the connectivity need checking
+                        if (self.contacts(swapped, swapped) < self.contacts(swapped, {})
+                                and is_connected(group.cells - {cell} | {other_cell})
+                                and is_connected(other_group.cells - {other_cell} | {cell})):
+                            # The cell leaves first, so neither group is ever larger than MAX_GROUP_SIZE
+                            self.move(cell, group, None)
+                            self.move(other_cell, other_group, group)
+                            self.move(cell, None, other_group)
+                            return True
+        return False
+
+    @staticmethod
+    def contacts(cells: Iterable[Cell], group_nrs: dict[Cell, int]) -> int:
+        """
+        Counts the pairs of neighbouring cells in different groups that include one of the given cells
+        :param group_nrs: Group numbers that replace the current group numbers of some cells
+        """
+        def group_nr(cell: Cell) -> int:
+            return group_nrs.get(cell, cell.group_nr)
+
+        return len({frozenset((cell, neighbour))
+                    for cell in cells
+                    for neighbour in cell.neighbours
+                    if group_nr(neighbour) != -1 and group_nr(neighbour) != group_nr(cell)})
+
+    def renumber_groups(self):
+        # Dissolved and merged groups leave gaps in the group numbers
+        groups = sorted(self.geode.groups.values(), key=lambda group: group.group_nr)
+        self.geode.groups.clear()
+        for group_nr, group in enumerate(groups):
+            group.group_nr = group_nr
+            for cell in group.cells:
+                cell.group_nr = group_nr
+            self.geode.groups[group_nr] = group
@@ -0,0 +1,139 @@
+import argparse
+import time
+from collections import Counter
+from typing import Iterable, Iterator, NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.Analyzers.geode import Geode
+from src.Enums.axis_enum import Axis
+from src.Enums.flying_machine_enum import FlyingMachineEnum
+from src.Enums.geode_enum import GeodeEnum
+from src.Utils.dihedral import TRANSFORMS, transform
+
+
+class Placement(NamedTuple):
+    group_nr: int
+    machine: FlyingMachineEnum
+    axis: Axis
+    # The transform of the engine footprint of the machine, see engine_footprints
+    transform_nr: int
+    # The position of the top left cell of the engine footprint. It can lie outside the grid, as everything around
+    # the grid is air
+    row: int
+    col: int
+
+
+def engine_footprints(machine: FlyingMachineEnum, axis: Axis) -> dict[int, np.ndarray]:
+    """
+    Finds every orientation of the engine footprint of a machine along an axis. The footprints are defined for the
+    horizontal axis. A machine can be built mirrored or turned around, which are the transforms (see Utils.dihedral)
+    that rotate by 0 or 180 degrees and keep the axis. Rotating by 90 or 270 degrees swaps the axis.
+    :param machine: The machine
+    :param axis: The axis of the machine
+    :return: Per transform number the footprint, leaving out transforms that give the same footprint as an earlier one
+    """
+    footprint = np.array(machine.engine_footprint, dtype=bool)
+    footprints: dict[int, np.ndarray] = {}
+    for transform_nr in TRANSFORMS:
+        if (transform_nr % 2 == 1) != (axis is Axis.Vertical):
+            continue
+        transformed = np.ascontiguousarray(transform(footprint, transform_nr))
+        if not any(np.array_equal(transformed, other) for other in footprints.values()):
+            footprints[transform_nr] = transformed
+    return footprints
+
+
+# The engine footprints of every machine along every axis that it can be used on, as boolean masks
+FOOTPRINTS: dict[tuple[FlyingMachineEnum, Axis, int], np.ndarray] = {
+    (machine, axis, transform_nr): footprint
+    for machine in FlyingMachineEnum
+    for axis in machine.axes
+    for transform_nr, footprint in engine_footprints(machine, axis).items()}
+
+
+def fit_machines(blocks: np.ndarray, group_grid: np.ndarray) -> dict[int, list[Placement]]:
+    """
+    Finds every feasible placement of every flying machine for every group. A machine can be placed on a group if
+    none of the cells under its engine are obsidian or part of another group, and at least one of them is part of the
+    group, so the engine sticks to it.
+    Every footprint is slid over the whole grid at once: the obsidian under the engine, and the lowest and highest
+    group number under the engine, are computed for all offsets with sliding windows. An offset fits exactly one
+    group if there is no obsidian and the lowest and highest group number are the same group.
+    :param blocks: A 2d array with the GeodeEnum int values of the projected blocks, including bridges
+    :param group_grid: A 2d array with the group number of every cell, -1 for cells without a group
+    :return: Per group number the feasible placements, ordered by machine, axis, transform and position
+    """
+    group_grid = np.asarray(group_grid, dtype=np.int16)
+    no_group = np.iinfo(np.int16).max
+    placements: dict[int, list[Placement]] = {int(group_nr): [] for group_nr in np.unique(group_grid[group_grid != -1])}
+    for (machine, axis, transform_nr), footprint in FOOTPRINTS.items():
+        height, width = footprint.shape
+        # Pad the grid with air, so engines can stick out of the grid
+        padding = ((height - 1, height - 1), (width - 1, width - 1))
+        obsidian = np.pad(blocks == GeodeEnum.OBSIDIAN.int_value, padding, constant_values=False)
+        groups = np.pad(group_grid, padding, constant_values=-1)
+
+        blocked = (sliding_window_view(obsidian, footprint.shape) & footprint).any(axis=(-2, -1))
+        group_windows = sliding_window_view(groups, footprint.shape)
+        highest_group = np.where(footprint, group_windows, -1).max(axis=(-2, -1))
+        lowest_group = np.where(footprint & (group_windows != -1), group_windows, no_group).min(axis=(-2, -1))
+
+        rows, cols = np.nonzero(~blocked & (highest_group != -1) & (lowest_group == highest_group))
+        for row, col, group_nr in zip(rows.tolist(), cols.tolist(), highest_group[rows, cols].tolist()):
+            placements[group_nr].append(Placement(group_nr=group_nr, machine=machine, axis=axis,
+                                                  transform_nr=transform_nr,
+                                                  row=row - (height - 1), col=col - (width - 1)))
+    return placements
+
+
+def fit_geode(geode: Geode) -> dict[int, list[Placement]]:
+    # Fits the machines on the groups that are currently placed in the geode
+    return fit_machines(geode.block_array(), np.array(geode.group_grid(), dtype=np.int16))
+
+
+def fit_batch(layouts: Iterable[tuple[np.ndarray, np.ndarray]]) -> Iterator[dict[int, list[Placement]]]:
+    """
+    Fits the machines on many geodes
+    :param layouts: Per geode the blocks and the group grid, see fit_machines
+    :return: The placements of every geode, streamed in input order
+    """
+    return (fit_machines(blocks, group_grid) for blocks, group_grid in layouts)
+
+
+if __name__ == '__main__':
+    from src.Analyzers.compact_geode import CompactGeode
+    from src.batch_solver import solve_batch
+    from src.geode_corpus import text_to_blocks
+    from src.grid_reader import GeodeFile
+
+    parser = argparse.ArgumentParser(description='Place the groups of all geodes and fit flying machines on them')
+    parser.add_argument('path', nargs='?', default='geodes.txt')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--start', type=int, default=0, help='Index of the first geode')
+    parser.add_argument('--stop', type=int, default=None, help='Index after the last geode')
+    args = parser.parse_args()
+
+    batch_start = time.perf_counter()
+    fit_seconds = 0.0
+    groups_without_machine = 0
+    machines = Counter()
+    with GeodeFile(args.path) as geode_file:
+        start, stop, _ = slice(args.start, args.stop).indices(len(geode_file))
+        for result in solve_batch((geode_file.raw(index) for index in range(start, stop)), workers=args.workers,
+                                  start=start):
+            # The blocks include bridges, as groups can contain them
+            geode_blocks = CompactGeode(text_to_blocks(geode_file.raw(result.index))).blocks
+            fit_start = time.perf_counter()
+            group_placements = fit_machines(geode_blocks.reshape(len(result.group_grid), -1),
+                                            np.array(result.group_grid, dtype=np.int16))
+            fit_seconds += time.perf_counter() - fit_start
+            groups_without_machine += sum(1 for placements_ in group_placements.values() if not placements_)
+            machines.update({placement.machine for placements_ in group_placements.values()
+                             for placement in placements_})
+    print(f'Placed and fitted {stop - start} geodes in {(time.perf_counter() - batch_start):3.2f} seconds, '
+          f'of which fitting took {fit_seconds:3.2f} seconds')
+    print(f'{groups_without_machine} groups have no feasible placement')
+    print('Geodes with at least one feasible placement per machine: '
+          + ', '.join(f'{machine.canon_name}: {machines[machine]}' for machine in FlyingMachineEnum))
@@ -27,3 +27,96 @@ class PrioritySet:
 
     def __len__(self) -> int:
         return len(self.heap)
+
+
+class IndexedPriorityQueue:
+    """
+    Binary min-heap that keeps track of the position of every item, so the priority of an item can be changed
+    or the item can be removed in O(log n) without rebuilding the heap.
+    Items must be hashable, priorities are compared with <.
+    """
+
+    def __init__(self):
+        self.heap: list[list] = []  # [priority, item] pairs
+        self.index: dict[Any, int] = {}  # Position of every item in the heap
+
+    def push(self, item, priority):
+        """
+        Adds the item, or changes its priority if it is already in the queue
+        """
+        if item in self.index:
+            position = self.index[item]
+            old_priority = self.heap[position][0]
+            self.heap[position][0] = priority
+            if priority < old_priority:
+                self._sift_up(position)
+            elif old_priority < priority:
+                self._sift_down(position)
+            return
+        self.heap.append([priority, item])
+        self.index[item] = len(self.heap) - 1
+        self._sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        """
+        Removes and returns the item with the lowest priority
+        :raise IndexError: If the queue is empty
+        """
+        if not self.heap:
+            raise IndexError('pop from an empty priority queue')
+        item = self.heap[0][1]
+        self._remove_at(0)
+        return item
+
+    def remove(self, item):
+        self._remove_at(self.index[item])
+
+    def discard(self, item):
+        if item in self.index:
+            self._remove_at(self.index[item])
+
+    def priority(self, item):
+        return self.heap[self.index[item]][0]
+
+    def _remove_at(self, position: int):
+        # Move the last entry into the hole and restore the heap property in whichever direction it is violated
+        del self.index[self.heap[position][1]]
+        last = self.heap.pop()
+        if position == len(self.heap):
+            return
+        self.heap[position] = last
+        self.index[last[1]] = position
+        self._sift_up(position)
+        self._sift_down(self.index[last[1]])
+
+    def _sift_up(self, position: int):
+        entry = self.heap[position]
+        while position > 0:
+            parent = (position - 1) >> 1
+            if not entry[0] < self.heap[parent][0]:
+                break
+            self.heap[position] = self.heap[parent]
+            self.index[self.heap[position][1]] = position
+            position = parent
+        self.heap[position] = entry
+        self.index[entry[1]] = position
+
+    def _sift_down(self, position: int):
+        entry = self.heap[position]
+        size = len(self.heap)
+        while (child := 2 * position + 1) < size:
+            if child + 1 < size and self.heap[child + 1][0] < self.heap[child][0]:
+                child += 1
+            if not self.heap[child][0] < entry[0]:
+                break
+            self.heap[position] = self.heap[child]
+            self.index[self.heap[position][1]] = position
+            position = child
+        self.heap[position] = entry
+        self.index[entry[1]] = position
+
+    def __contains__(self, item) -> bool:
+        return item in self.index
+
+    def __len__(self) -> int:
+        return len(self.heap)
@@ -0,0 +1,32 @@
+import numpy as np
+
+# The 8 symmetries of a grid: transforms 0-3 rotate the grid by 0, 90, 180 and 270 degrees counterclockwise,
+# and transforms 4-7 mirror the grid horizontally before rotating it the same way.
+TRANSFORMS = range(8)
+
+
+def transform(grid: np.ndarray, transform_nr: int) -> np.ndarray:
+    if transform_nr >= 4:
+        grid = grid[:, ::-1]
+    return np.rot90(grid, transform_nr % 4)
+
+
+def inverse_transform(grid: np.ndarray, transform_nr: int) -> np.ndarray:
+    grid = np.rot90(grid, -(transform_nr % 4))
+    if transform_nr >= 4:
+        grid = grid[:, ::-1]
+    return grid
+
+
+def canonicalize(grid: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Finds the minimal representative of a grid under rotations and reflections
+    :param grid: A 2d array of small non-negative integers
+    :return: The canonical grid, and the transform that maps the grid onto it
+    """
+    def sort_key(transform_nr: int) -> tuple[tuple[int, ...], bytes]:
+        transformed = transform(grid, transform_nr)
+        return transformed.shape, np.ascontiguousarray(transformed, dtype=np.uint8).tobytes()
+
+    transform_nr = min(TRANSFORMS, key=sort_key)
+    return np.ascontiguousarray(transform(grid, transform_nr)), transform_nr
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple, Union
+
+from src.sat_projection import Coord, ProjectionProblem
+
+# The bud coordinates of a geode, as (x, y, z)
+BudSet = tuple[tuple[int, int, int], ...]
+
+
+class ProjectionRecord(NamedTuple):
+    index: int
+    # The id of the geode in the input file, defaults to its line number
+    name: str
+    # optimal, timeout (the best solution found in time), no_solution or skipped (the global budget ran out)
+    status: str
+    harvested_clusters: Union[int, None]
+    projections: Union[int, None]
+    # The active slices as (plane, coord_a, coord_b)
+    slices: tuple[tuple[str, int, int], ...]
+    # The budding amethysts that are kept, as (x, y, z)
+    budding_amethysts: tuple[tuple[int, int, int], ...]
+    seconds: float
+
+    def to_json(self) -> str:
+        return json.dumps(self._asdict())
+
+
+def read_bud_sets(path: str) -> Iterator[tuple[str, BudSet]]:
+    """
+    Reads the bud coordinates of many geodes from a JSONL file. Every line is either a list of [x, y, z] coordinates,
+    or an object with the coordinates under "budding_amethysts" and an optional "id".
+    :param path: The path to the file
+    :return: The id and bud coordinates of every geode, streamed while reading the file. A malformed line raises a
+             ValueError once it is reached
+    """
+    with open(path) as file:
+        for line_nr, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                geode = json.loads(line)
+                name, buds = (str(line_nr), geode) if isinstance(geode, list) else (str(geode.get('id', line_nr)),
+                                                                                   geode['budding_amethysts'])
+                bud_set = tuple(tuple(bud) for bud in buds)
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                raise ValueError(f'{path}:{line_nr}: {error!r}') from error
+            if not all(len(bud) == 3 and all(isinstance(value, int) for value in bud) for bud in bud_set):
+                raise ValueError(f'{path}:{line_nr}: expected [x, y, z] coordinates, got {line.strip()!r}')
+            yield name, bud_set
+
+
+def resume_output(path: str) -> set[str]:
+    """
+    Prepares the output of an earlier run to be appended to. Only the records of finished geodes are kept, so the
+    geodes that were skipped because the budget ran out are solved again, and a partly written last line is dropped.
+    :param path: The JSONL output of the earlier run. Nothing happens if it doesn't exist
+    :return: The ids of the finished geodes
+    """
+    if not os.path.exists(path):
+        return set()
+    finished: dict[str, str] = {}
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['status'] != 'skipped':
+                finished[record['name']] = line.rstrip('\n')
+    # The kept records are written to a new file first, so an interruption can't lose them
+    with open(path + '.tmp', 'w') as file:
+        file.writelines(line + '\n' for line in finished.values())
+    os.replace(path + '.tmp', path)
+    return set(finished)
+
+
+def solve_bud_set(index: int, name: str, buds: BudSet, time_limit: Union[float, None],
+                  deadline: Union[float, None], exact: bool) -> ProjectionRecord:
+    """
+    Optimizes the projections of one geode
+    :param time_limit: The maximum number of seconds for this geode, including building the model
+    :param deadline: The wall-clock time (time.time) at which the global budget runs out. Workers don't share a
+                     perf_counter, so the budget is passed as a wall-clock time
+    :param exact: See ProjectionProblem
+    """
+    start = time.perf_counter()
+    if deadline is not None:
+        remaining = deadline - time.time()
+        time_limit = remaining if time_limit is None else min(time_limit, remaining)
+    if time_limit is not None and time_limit <= 0:
+        return ProjectionRecord(index=index, name=name, status='skipped', harvested_clusters=None, projections=None,
+                                slices=(), budding_amethysts=(), seconds=0.0)
+
+    problem = ProjectionProblem({Coord(*bud) for bud in buds}, exact=exact)
+    if time_limit is not None:
+        # The solver keeps at least a moment to find a first solution
+        time_limit = max(0.01, time_limit - (time.perf_counter() - start))
+    solution = problem.solve(time_limit)
+    if solution is None:
+        return ProjectionRecord(index=index, name=name, status='no_solution', harvested_clusters=None,
+                                projections=None, slices=(), budding_amethysts=(),
+                                seconds=time.perf_counter() - start)
+    return ProjectionRecord(index=index,
+                            name=name,
+                            status='optimal' if solution.optimal else 'timeout',
+                            harvested_clusters=solution.harvested_clusters,
+                            projections=solution.projections,
+                            slices=tuple((plane.name, coord_a, coord_b) for plane, coord_a, coord_b in solution.slices),
+                            budding_amethysts=solution.budding_amethysts,
+                            seconds=time.perf_counter() - start)
+
+
+def solve_projections(bud_sets: Iterable[tuple[str, BudSet]], *,
+                      workers: int = None,
+                      time_limit: float = None,
+                      budget: float = None,
+                      exact: bool = False,
+                      finished: set[str] = frozenset()) -> Iterator[ProjectionRecord]:
+    """
+    Optimizes the projections of many geodes, each in a worker process
+    :param bud_sets: The id and bud coordinates of every geode, e.g. from read_bud_sets
+    :param workers: The number of worker processes. Defaults to the number of processors
+    :param time_limit: The maximum number of seconds per geode. A geode that runs out of time is recorded with the
+                       best solution found so far
+    :param budget: The maximum number of seconds for the whole batch. Once it runs out, the remaining geodes are
+                   recorded as skipped
+    :param exact: See ProjectionProblem
+    :param finished: The ids of geodes that are already solved, e.g. from resume_output. They get no new record
+    :return: The records in the order they complete, streamed as they become available
+    """
+    deadline = None if budget is None else time.time() + budget
+    workers = workers or os.cpu_count()
+    # Finished geodes keep their index in the input, so the records of a resumed run line up with the earlier ones
+    jobs = ((index, name, buds) for index, (name, buds) in enumerate(bud_sets) if name not in finished)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def submit(next_jobs: Iterable[tuple[int, str, BudSet]]) -> set[Future]:
+            return {executor.submit(solve_bud_set, index, name, buds, time_limit, deadline, exact)
+                    for index, name, buds in next_jobs}
+
+        # Geodes are submitted one per free worker, so the input is read lazily and geodes that are submitted after
+        # the budget runs out are skipped right away
+        pending = submit(islice(jobs, workers))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending |= submit(islice(jobs, len(done)))
+            for future in done:
+                yield future.result()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Optimize the projections of many geodes in parallel')
+    parser.add_argument('path', help='JSONL file with the bud coordinates of a geode per line')
+    parser.add_argument('--output', default=None, help='JSONL file to stream the results to, defaults to stdout')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--time-limit', type=float, default=None, help='Time limit per geode in seconds')
+    parser.add_argument('--budget', type=float, default=None, help='Time limit for all geodes in seconds')
+    parser.add_argument('--exact', action='store_true', help='Use the complete constraint between slices and buds')
+    parser.add_argument('--resume', action='store_true',
+                        help='Append to the output, and skip the geodes it already has a result for')
+    args = parser.parse_args()
+    if args.resume and args.output is None:
+        parser.error('--resume needs --output')
+
+    batch_start = time.perf_counter()
+    statuses: dict[str, int] = {}
+    finished_names = resume_output(args.output) if args.resume else set()
+    output = sys.stdout if args.output is None else open(args.output, 'a' if args.resume else 'w')
+    try:
+        for record in solve_projections(read_bud_sets(args.path), workers=args.workers,
+                                        time_limit=args.time_limit, budget=args.budget, exact=args.exact,
+                                        finished=finished_names):
+            # Every record is flushed right away, so the output of an interrupted run is still usable
+            output.write(record.to_json() + '\n')
+            output.flush()
+            statuses[record.status] = statuses.get(record.status, 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f'Solved {sum(statuses.values())} geodes in {(time.perf_counter() - batch_start):3.2f} seconds: '
+          + ', '.join(f'{count} {status}' for status, count in sorted(statuses.items())), file=sys.stderr)
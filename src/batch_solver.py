@@ -0,0 +1,160 @@
+import argparse
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, NamedTuple, Union
+
+import numpy as np
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.geode_corpus import text_to_blocks
+from src.grid_reader import GeodeFile
+from src.Utils.dihedral import canonicalize
+from src.result_cache import ResultCache, blocks_key, from_canonical_groups, to_canonical_groups
+
+
+class GeodeResult(NamedTuple):
+    index: int
+    # Group number per cell, -1 for cells without a group
+    group_grid: tuple[tuple[int, ...], ...]
+    group_sizes: tuple[int, ...]
+    seconds: float
+
+
+def solve_geode(index: int, raw_geode: str) -> GeodeResult:
+    # Workers receive the raw text instead of a pickled Cell graph, and send back plain numbers.
+    # The heuristic depends on the orientation of the geode, so it runs on the canonical form and the result is mapped
+    # back. That way a result is the same whether it was solved or taken from the cache, whichever rotation came first
+    start = time.perf_counter()
+    canonical_blocks, transform_nr = raw_geode_canonical_form(raw_geode)
+    geode = CompactGeode(canonical_blocks).to_geode()
+    geode.heuristic_placement()
+    return GeodeResult(index=index,
+                       group_grid=from_canonical_groups(geode.group_grid(), transform_nr),
+                       group_sizes=tuple(len(group) for group in geode.groups.values()),
+                       seconds=time.perf_counter() - start)
+
+
+def _solve_chunk(chunk: list[tuple[int, str]]) -> list[GeodeResult]:
+    return [solve_geode(index, raw_geode) for index, raw_geode in chunk]
+
+
+def raw_geode_canonical_form(raw_geode: str) -> tuple[np.ndarray, int]:
+    # The canonical form of the projected geode (including bridges), without building any cells
+    compact = CompactGeode(text_to_blocks(raw_geode))
+    return canonicalize(compact.blocks.reshape(compact.rows, compact.cols))
+
+
+def raw_geode_key(raw_geode: str) -> tuple[str, int]:
+    canonical_blocks, transform_nr = raw_geode_canonical_form(raw_geode)
+    return blocks_key(canonical_blocks), transform_nr
+
+
+def cached_result(index: int, group_grid: tuple[tuple[int, ...], ...]) -> GeodeResult:
+    group_sizes = Counter(group_nr for row in group_grid for group_nr in row if group_nr != -1)
+    return GeodeResult(index=index,
+                       group_grid=group_grid,
+                       group_sizes=tuple(group_sizes[group_nr] for group_nr in sorted(group_sizes)),
+                       seconds=0.0)
+
+
+def solve_batch(raw_geodes: Iterable[str], *,
+                workers: int = None,
+                chunksize: int = 1,
+                ordered: bool = True,
+                start: int = 0,
+                cache: ResultCache = None) -> Iterator[GeodeResult]:
+    """
+    Solves many geodes in parallel with a process pool
+    :param raw_geodes: The geodes in the geodes.txt format
+    :param workers: The number of worker processes. Defaults to the number of processors. About one chunk per worker
+                    is in flight, so the geodes are read lazily
+    :param chunksize: The number of geodes sent to a worker at once
+    :param ordered: Whether results are streamed in input order, or as soon as they complete
+    :param start: The index of the first geode, used to number the results
+    :param cache: If given, geodes that were solved before are taken from the cache, and new results are stored
+    :return: The results, streamed as they become available
+    """
+    keys: dict[int, tuple[str, int]] = {}
+    workers = workers or os.cpu_count()
+
+    def jobs() -> Iterator[tuple[list[tuple[int, str]], list[GeodeResult]]]:
+        # Reads the input lazily. Every job is either a chunk of geodes to solve, or the cached result of one geode
+        chunk = []
+        for index, raw_geode in enumerate(raw_geodes, start):
+            if cache is not None:
+                keys[index] = key, transform_nr = raw_geode_key(raw_geode)
+                if (group_grid := cache.get(key)) is not None:
+                    # The pending chunk goes first, so results stay in input order
+                    if chunk:
+                        yield chunk, []
+                        chunk = []
+                    yield [], [cached_result(index, from_canonical_groups(group_grid, transform_nr))]
+                    continue
+            chunk.append((index, raw_geode))
+            if len(chunk) == chunksize:
+                yield chunk, []
+                chunk = []
+        if chunk:
+            yield chunk, []
+
+    def chunk_results(future: Future) -> list[GeodeResult]:
+        results = future.result()
+        if cache is not None:
+            for result in results:
+                key, transform_nr = keys.pop(result.index)
+                cache.put(key, to_canonical_groups(result.group_grid, transform_nr))
+        return results
+
+    next_jobs = jobs()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # About one chunk per worker is in flight at any time, so the input is read while results are streamed
+        if ordered:
+            # Jobs are queued in input order, a job is yielded once all jobs before it are
+            queued: deque[Union[Future, list[GeodeResult]]] = deque()
+            while True:
+                while len(queued) <= workers and (job := next(next_jobs, None)) is not None:
+                    chunk, cached = job
+                    queued.append(executor.submit(_solve_chunk, chunk) if chunk else cached)
+                if not queued:
+                    break
+                job = queued.popleft()
+                yield from job if isinstance(job, list) else chunk_results(job)
+        else:
+            running: set[Future] = set()
+            while True:
+                while len(running) < workers and (job := next(next_jobs, None)) is not None:
+                    chunk, cached = job
+                    if chunk:
+                        running.add(executor.submit(_solve_chunk, chunk))
+                    else:  # Cached results are available right away
+                        yield from cached
+                if not running:
+                    break
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from chunk_results(future)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve all geodes of a file in parallel')
+    parser.add_argument('path', nargs='?', default='geodes.txt')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=1)
+    parser.add_argument('--unordered', action='store_true', help='Stream results as soon as they complete')
+    parser.add_argument('--start', type=int, default=0, help='Index of the first geode to solve')
+    parser.add_argument('--stop', type=int, default=None, help='Index after the last geode to solve')
+    parser.add_argument('--cache', default=None, help='Path of the result cache to use, if any')
+    args = parser.parse_args()
+
+    batch_start = time.perf_counter()
+    result_cache = None if args.cache is None else ResultCache(args.cache)
+    with GeodeFile(args.path) as geode_file:
+        start, stop, _ = slice(args.start, args.stop).indices(len(geode_file))
+        raw_geodes = (geode_file.raw(index) for index in range(start, stop))
+        for result in solve_batch(raw_geodes, workers=args.workers, chunksize=args.chunksize,
+                                  ordered=not args.unordered, start=start, cache=result_cache):
+            print(f'Geode {result.index} took {result.seconds:3.2f} seconds, '
+                  f'group sizes: {list(result.group_sizes)}')
+    print(f'Solved all geodes in {(time.perf_counter() - batch_start):3.2f} seconds')
@@ -23,6 +23,12 @@ class Cell:
         self.average_block_distance: float = float('inf')
         self.reachable_pumpkins: int = 0
         self.neighbours: set[Cell] = set()
+        # Perturbations used by randomized searches, both are 0 for the deterministic heuristic.
+        # The bias is added to the score of the cell, the tie breaker orders cells with the same score and block type
+        self.priority_bias: float = 0.0
+        self.tie_breaker: float = 0.0
+        # Cached priority, see invalidate_priority
+        self._priority: Union[tuple[Union[int, float], Cell], None] = None
 
     def projected_str(self) -> str:
         return self.projected_block.pretty_print
@@ -54,25 +60,36 @@ class Cell:
     def has_group(self):
         return self.group_nr != -1
 
+    def invalidate_priority(self):
+        """
+        Must be called whenever the isolation score or block of this cell changes, or the isolation score or group of
+        one of its neighbours changes, as the priority of bridges depends on their neighbours
+        """
+        self._priority = None
+
     @property
     def priority(self) -> tuple[Union[int, float], Cell]:
-        # The priority is a tuple with cell such that given the same score, pumpkins can be given priority over
-        # bridges and air
-        if self.projected_block == GeodeEnum.PUMPKIN:
-            return -self.average_block_distance, self
+        # The priority is a tuple with cell such that given the same score, ties are broken by comparing the cells
+        if self._priority is None:
+            self._priority = self._compute_priority()
+        return self._priority
+
+    def _compute_priority(self) -> tuple[Union[int, float], Cell]:
+        if self.projected_block is GeodeEnum.PUMPKIN:
+            return self.priority_bias - self.average_block_distance, self
 
         # Otherwise, return the maximum isolation score of all the neighbours
-        return -max((neighbour.average_block_distance
-                     for neighbour in self.neighbours
-                     if neighbour.projected_block == GeodeEnum.PUMPKIN
-                     and not neighbour.has_group),
-                    default=self.average_block_distance), self
+        return self.priority_bias - max((neighbour.average_block_distance
+                                         for neighbour in self.neighbours
+                                         if neighbour.projected_block is GeodeEnum.PUMPKIN
+                                         and neighbour.group_nr == -1),
+                                        default=self.average_block_distance), self
 
     def __lt__(self, other):
         # If something is a pumpkin, we say it is smaller to give it priority over other types.
-        if self.projected_block == GeodeEnum.PUMPKIN:
-            return True
-        elif other.projected_block == GeodeEnum.PUMPKIN:
-            return False
-        # In other situations we don't care
-        return True
+        # Remaining ties are broken by block type and position, so the order doesn't depend on the order in which
+        # cells were visited
+        return ((self.projected_block is not GeodeEnum.PUMPKIN, self.projected_block.int_value, self.tie_breaker,
+                 self.row, self.col)
+                < (other.projected_block is not GeodeEnum.PUMPKIN, other.projected_block.int_value, other.tie_breaker,
+                   other.row, other.col))
@@ -0,0 +1,175 @@
+import argparse
+import mmap
+import struct
+from typing import Iterable, Iterator, Union
+
+import numpy as np
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.Analyzers.geode import Geode
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+from src.grid_reader import GeodeFile
+
+# Binary corpus layout (all integers little-endian):
+#   header:        magic b'GEOD', version u16, reserved u16, geode count u32, offset table position u64
+#   geode records: rows u16, cols u16, then the cells in row-major order with 2 bits per cell (the GeodeEnum
+#                  int value), four cells per byte starting at the lowest bits
+#   offset table:  geode count + 1 u64 byte offsets of the records, the last one being the end of the records
+# The offset table comes last, so records can be written as they are produced.
+MAGIC = b'GEOD'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIQ')
+RECORD_HEADER = struct.Struct('<HH')
+CELLS_PER_BYTE = 4
+
+# Two characters per cell in the text format. Bridges are derived from the other blocks, so they are written as air.
+BLOCK_CHARS = {GeodeEnum.AIR: '  ',
+               GeodeEnum.PUMPKIN: '..',
+               GeodeEnum.OBSIDIAN: '##',
+               GeodeEnum.BRIDGE: '  '}
+
+# Maps the first character of a cell in the text format to the int value of its block
+_CHAR_LOOKUP = np.full(256, GeodeEnum.AIR.int_value, dtype=np.uint8)
+_CHAR_LOOKUP[ord('.')] = GeodeEnum.PUMPKIN.int_value
+_CHAR_LOOKUP[ord('#')] = GeodeEnum.OBSIDIAN.int_value
+
+# The offsets of a corpus without geodes, used once a corpus is closed
+_NO_OFFSETS = np.zeros(1, dtype='<u8')
+
+
+def text_to_blocks(raw_geode: str) -> np.ndarray:
+    """
+    Parses a geode in the geodes.txt format into a 2d array of GeodeEnum int values without creating any cells
+    """
+    lines = raw_geode.splitlines()
+    chars = np.frombuffer(''.join(lines).encode(), dtype=np.uint8).reshape(len(lines), -1)
+    return _CHAR_LOOKUP[chars[:, ::2]]
+
+
+def blocks_to_text(blocks: np.ndarray) -> str:
+    return ''.join(''.join(BLOCK_CHARS[GeodeEnum(int(value))] for value in row) + '\n' for row in blocks)
+
+
+def pack_blocks(blocks: np.ndarray) -> bytes:
+    rows, cols = blocks.shape
+    values = np.zeros(-(-blocks.size // CELLS_PER_BYTE) * CELLS_PER_BYTE, dtype=np.uint8)
+    values[:blocks.size] = blocks.ravel()
+    quads = values.reshape(-1, CELLS_PER_BYTE)
+    packed = quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+    return RECORD_HEADER.pack(rows, cols) + packed.astype(np.uint8).tobytes()
+
+
+def write_corpus(path: str, geodes: Iterable[np.ndarray]):
+    """
+    Writes geodes to a binary corpus
+    :param path: The file to write to
+    :param geodes: 2d arrays with the GeodeEnum int values of each geode, written as they are produced
+    """
+    with open(path, 'wb') as corpus_file:
+        # The number of geodes is only known at the end, so the header is written again once the records are written
+        corpus_file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        offsets = [HEADER.size]
+        for blocks in geodes:
+            offsets.append(offsets[-1] + corpus_file.write(pack_blocks(blocks)))
+        corpus_file.write(np.array(offsets, dtype='<u8').tobytes())
+        corpus_file.seek(0)
+        corpus_file.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets) - 1, offsets[-1]))
+
+
+class GeodeCorpus:
+    """
+    Memory-mapped binary geode corpus, see the layout at the top of this module.
+    Geodes are unpacked on access, either as block arrays, CompactGeodes, or Geodes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap: Union[mmap.mmap, None] = None
+        self.offsets: np.ndarray = _NO_OFFSETS
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self._mmap) < HEADER.size or self._mmap[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path} is not a binary geode corpus')
+            _, version, _, count, table_offset = HEADER.unpack_from(self._mmap, 0)
+            if version != VERSION:
+                raise ValueError(f'{path} has corpus version {version}, only version {VERSION} is supported')
+            self.offsets = np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=table_offset)
+        except BaseException:
+            self.close()
+            raise
+
+    def blocks(self, index: int) -> np.ndarray:
+        """
+        :return: A 2d array with the GeodeEnum int values of the geode
+        """
+        if not -len(self) <= index < len(self):
+            raise IndexError(f'Geode {index} does not exist, {self.path} contains {len(self)} geodes')
+        index %= len(self)
+        start = int(self.offsets[index])
+        rows, cols = RECORD_HEADER.unpack_from(self._mmap, start)
+        packed = np.frombuffer(self._mmap, dtype=np.uint8,
+                               count=int(self.offsets[index + 1]) - start - RECORD_HEADER.size,
+                               offset=start + RECORD_HEADER.size)
+        values = (packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 0b11
+        return values.ravel()[:rows * cols].reshape(rows, cols)
+
+    def compact(self, index: int) -> CompactGeode:
+        return CompactGeode(self.blocks(index))
+
+    def get(self, index: int) -> Geode:
+        blocks = self.blocks(index)
+        return Geode([[Cell(row, col, GeodeEnum(int(blocks[row, col])))
+                       for col in range(blocks.shape[1])]
+                      for row in range(blocks.shape[0])])
+
+    def iter_blocks(self) -> Iterator[np.ndarray]:
+        return (self.blocks(index) for index in range(len(self)))
+
+    def __getitem__(self, item: int) -> Geode:
+        return self.get(item)
+
+    def __iter__(self) -> Iterator[Geode]:
+        return (self.get(index) for index in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def close(self):
+        # The offsets are a view on the memory map, so they have to be released first. Closing twice is fine
+        self.offsets = _NO_OFFSETS
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def text_to_corpus(text_path: str, corpus_path: str):
+    with GeodeFile(text_path) as geode_file:
+        write_corpus(corpus_path, (text_to_blocks(raw_geode) for raw_geode in geode_file.iter_raw()))
+
+
+def corpus_to_text(corpus_path: str, text_path: str):
+    with GeodeCorpus(corpus_path) as corpus, open(text_path, 'w') as text_file:
+        for blocks in corpus.iter_blocks():
+            # Every geode is followed by a blank line
+            text_file.write(blocks_to_text(blocks) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert geodes between the text format and the binary corpus format')
+    parser.add_argument('direction', choices=['to-binary', 'to-text'])
+    parser.add_argument('source')
+    parser.add_argument('target')
+    args = parser.parse_args()
+
+    if args.direction == 'to-binary':
+        text_to_corpus(args.source, args.target)
+    else:
+        corpus_to_text(args.source, args.target)
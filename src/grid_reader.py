@@ -1,23 +1,135 @@
-from typing import IO, Iterator
+import mmap
+import os
+import re
+from array import array
+from typing import Iterator, Union
 
 from src.Analyzers.geode import Geode
 from src.Enums.geode_enum import GeodeEnum
 from src.cell import Cell
 
+# A blank line, which ends a geode. Copies of geodes.txt can have Windows line endings
+_BLANK_LINE = re.compile(rb'\n\r?\n')
 
-def geode_generator() -> Iterator[Geode]:
+
+def char_to_block(char: str) -> GeodeEnum:
+    return (GeodeEnum.OBSIDIAN if char == '#'
+            else GeodeEnum.PUMPKIN if char == '.'
+            else GeodeEnum.AIR)
+
+
+def parse_geode(raw_geode: str) -> Geode:
+    """
+    Parses a single geode in the geodes.txt format, where every cell is two characters wide
+    :param raw_geode: The rows of the geode, without the blank line that separates geodes
+    """
+    return Geode([[Cell(row, col, char_to_block(char))
+                   for col, char in enumerate(line[::2])]
+                  for row, line in enumerate(raw_geode.splitlines())])
+
+
+def raw_geode_generator(path: str = 'geodes.txt') -> Iterator[str]:
     geode = []
-    row = 0
-    with open('geodes.txt', 'r') as geode_file:
+    with open(path, 'r') as geode_file:
         while line := geode_file.readline():
             if line == '\n':
-                yield Geode(geode)
+                yield ''.join(geode)
                 geode = []
-                row = 0
             else:
-                geode.append([Cell(row, col,
-                                   GeodeEnum.OBSIDIAN if char == '#'
-                                   else GeodeEnum.PUMPKIN if char == '.'
-                                   else GeodeEnum.AIR)
-                              for col, char in enumerate(line[:-1:2])])
-                row += 1
+                geode.append(line)
+
+
+def geode_generator(path: str = 'geodes.txt') -> Iterator[Geode]:
+    for raw_geode in raw_geode_generator(path):
+        yield parse_geode(raw_geode)
+
+
+class GeodeFile:
+    """
+    Random access to the geodes in a geodes.txt file.
+    The file is memory-mapped and only the byte offsets of the geodes are read up front, so geodes are only parsed
+    when they are requested. The offsets are cached on disk next to the file and rebuilt when the file changes.
+    """
+
+    def __init__(self, path: str = 'geodes.txt', index_path: str = None):
+        self.path = path
+        self.index_path = f'{path}.idx' if index_path is None else index_path
+        self._file = open(path, 'rb')
+        # An empty file can't be mapped, it is read as a file without geodes
+        self._mmap: Union[mmap.mmap, None] = None
+        try:
+            if os.fstat(self._file.fileno()).st_size:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            # Geode i spans the bytes from offsets[i] up to offsets[i + 1], the last line being the blank line
+            self.offsets: array = self._load_index()
+            if self.offsets is None:
+                self.offsets = self._build_index()
+                self._save_index()
+        except BaseException:
+            self.close()
+            raise
+
+    def _source_stamp(self) -> array:
+        stat = os.stat(self.path)
+        return array('q', [stat.st_size, stat.st_mtime_ns])
+
+    def _load_index(self) -> Union[array, None]:
+        try:
+            with open(self.index_path, 'rb') as index_file:
+                index = array('q', index_file.read())
+        except (OSError, ValueError):
+            return None
+        # The first two values identify the version of geodes.txt the index was built for
+        if index[:2] != self._source_stamp():
+            return None
+        return index[2:]
+
+    def _save_index(self):
+        try:
+            with open(self.index_path, 'wb') as index_file:
+                (self._source_stamp() + self.offsets).tofile(index_file)
+        except OSError:
+            pass  # The index is only a cache, so not being able to write it is fine
+
+    def _build_index(self) -> array:
+        offsets = array('q', [0])
+        if self._mmap is not None:
+            # A geode ends at the first blank line, i.e. two newlines in a row
+            offsets.extend(blank_line.end() for blank_line in _BLANK_LINE.finditer(self._mmap))
+        return offsets
+
+    def raw(self, index: int) -> str:
+        if not -len(self) <= index < len(self):
+            raise IndexError(f'Geode {index} does not exist, {self.path} contains {len(self)} geodes')
+        index %= len(self)
+        raw_geode = self._mmap[self.offsets[index]:self.offsets[index + 1]].decode().replace('\r\n', '\n')
+        # Without the blank line
+        return raw_geode[:-1]
+
+    def get(self, index: int) -> Geode:
+        return parse_geode(self.raw(index))
+
+    def iter_raw(self) -> Iterator[str]:
+        return (self.raw(index) for index in range(len(self)))
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Geode, list[Geode]]:
+        if isinstance(item, slice):
+            return [self.get(index) for index in range(*item.indices(len(self)))]
+        return self.get(item)
+
+    def __iter__(self) -> Iterator[Geode]:
+        return (self.get(index) for index in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,19 +1,29 @@
+from typing import Callable
+
 from src.cell import Cell
 
+MAX_GROUP_SIZE = 12
+
 
 class Group:
 
-    def __init__(self):
+    def __init__(self, on_change: Callable[[Cell], None] = None):
         self.group_nr: int = -1
         self.cells: set[Cell] = set()
+        # Called with the cell after it was added to or removed from the group
+        self.on_change = on_change
 
     def add_cell(self, cell: Cell):
         self.cells.add(cell)
         cell.group_nr = self.group_nr
+        if self.on_change is not None:
+            self.on_change(cell)
 
     def remove_cell(self, cell: Cell):
         self.cells.remove(cell)
         cell.group_nr = -1
+        if self.on_change is not None:
+            self.on_change(cell)
 
     def __len__(self):
         return len(self.cells)
@@ -0,0 +1,173 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import statistics
+import time
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple, Union
+
+from src.Analyzers.geode import Geode
+from src.Enums.geode_enum import GeodeEnum
+from src.grid_reader import GeodeFile, parse_geode
+
+
+class SearchResult(NamedTuple):
+    # The seed of the randomized run, 0 is the unperturbed heuristic
+    seed: int
+    score: tuple[int, int, float]
+    # Group number per cell, -1 for cells without a group
+    group_grid: tuple[tuple[int, ...], ...]
+    seconds: float
+
+
+def layout_score(geode: Geode) -> tuple[int, int, float]:
+    """
+    Scores a group layout, lower is better
+    :return: The number of pumpkins without a group, the number of groups and the spread (standard deviation) of
+             the group sizes
+    """
+    uncovered_pumpkins = sum(1 for cell in geode.flat_cells
+                             if cell.projected_block is GeodeEnum.PUMPKIN and not cell.has_group)
+    group_sizes = [len(group) for group in geode.groups.values()]
+    return uncovered_pumpkins, len(group_sizes), statistics.pstdev(group_sizes) if group_sizes else 0.0
+
+
+def perturb(geode: Geode, rng: random.Random, bridge_bias: float):
+    # Shuffles the order of cells with equal scores and randomly makes bridges more or less attractive
+    for cell in geode.flat_cells:
+        cell.tie_breaker = rng.random()
+        if cell.projected_block is GeodeEnum.BRIDGE:
+            cell.priority_bias = rng.uniform(-bridge_bias, bridge_bias)
+
+
+def randomized_placement(raw_geode: str, seed: int, source_choices: int = 3, bridge_bias: float = 2.0,
+                         local_search: bool = False) -> SearchResult:
+    """
+    Runs one variant of the heuristic placement
+    :param raw_geode: The geode in the geodes.txt format
+    :param seed: Seeds the perturbations. Seed 0 runs the deterministic heuristic without perturbations
+    :param source_choices: The source of each group is picked at random from this many most isolated pumpkins
+    :param bridge_bias: The maximum amount by which the score of a bridge is perturbed
+    :param local_search: Whether to improve the layout with Geode.improve_layout afterwards
+    """
+    start = time.perf_counter()
+    geode = parse_geode(raw_geode)
+    if seed == 0:
+        geode.heuristic_placement()
+    else:
+        rng = random.Random(seed)
+        perturb(geode, rng, bridge_bias)
+        geode.heuristic_placement(rng=rng, source_choices=source_choices)
+    if local_search:
+        geode.improve_layout()
+    return SearchResult(seed=seed,
+                        score=layout_score(geode),
+                        group_grid=geode.group_grid(),
+                        seconds=time.perf_counter() - start)
+
+
+def iter_improvements(raw_geode: str, *,
+                      restarts: int = 64,
+                      workers: int = None,
+                      time_limit: float = None,
+                      source_choices: int = 3,
+                      bridge_bias: float = 2.0,
+                      local_search: bool = False) -> Iterator[SearchResult]:
+    """
+    Anytime multi-start search: runs randomized variants of the heuristic in parallel and yields every result that
+    improves on the best one so far. The caller can stop iterating at any time and keep the last result.
+    The first variant is always the unperturbed heuristic, so the search never does worse than heuristic_placement.
+    It runs in this process while the workers start on the other variants, and it always runs to completion, so
+    there is at least one result even if the time limit is hit first.
+    :param raw_geode: The geode in the geodes.txt format
+    :param restarts: The number of variants to run, including the unperturbed heuristic, which always runs
+    :param workers: The number of worker processes. Defaults to the number of processors
+    :param time_limit: Wall-clock cap in seconds. Variants that haven't finished by then are killed, except for the
+                       unperturbed heuristic
+    :param source_choices: See randomized_placement
+    :param bridge_bias: See randomized_placement
+    :param local_search: See randomized_placement
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    workers = workers or os.cpu_count()
+    best: SearchResult = None
+    # The pool passes every finished variant, or the exception it raised, to this queue
+    finished: queue.Queue[Union[SearchResult, BaseException]] = queue.Queue()
+    # Unlike a ProcessPoolExecutor, a pool can kill variants that are still running
+    pool = multiprocessing.Pool(workers)
+
+    def submit(seeds: Iterable[int]) -> int:
+        submitted = 0
+        for seed in seeds:
+            pool.apply_async(randomized_placement, (raw_geode, seed, source_choices, bridge_bias, local_search),
+                             callback=finished.put, error_callback=finished.put)
+            submitted += 1
+        return submitted
+
+    try:
+        # Variants are submitted one per free worker, so the search stops submitting once the time limit is hit
+        remaining_seeds = iter(range(1, restarts))
+        running = submit(islice(remaining_seeds, workers))
+        # The unperturbed heuristic runs here, so there is a result even if no variant finishes in time
+        best = randomized_placement(raw_geode, 0, source_choices, bridge_bias, local_search)
+        yield best
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                result = finished.get(timeout=timeout)
+            except queue.Empty:
+                break
+            running -= 1
+            if isinstance(result, BaseException):
+                raise result
+            running += submit(islice(remaining_seeds, 1))
+            # Ties are broken by seed, so the outcome doesn't depend on the order in which variants finish
+            if best is None or (result.score, result.seed) < (best.score, best.seed):
+                best = result
+                yield best
+    finally:
+        # Variants that are still running when the time limit is hit or the caller stops early are killed, so they
+        # don't keep using the processors, and the interpreter doesn't wait for them at exit
+        pool.terminate()
+        pool.join()
+
+
+def multi_start_search(raw_geode: str, **kwargs) -> SearchResult:
+    """
+    Runs iter_improvements to completion (or until its time limit) and returns the best result. There always is
+    one, because the unperturbed heuristic runs even if the time limit is hit before it finishes
+    """
+    best = None
+    for best in iter_improvements(raw_geode, **kwargs):
+        pass
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Improve the group layout of a geode with randomized restarts')
+    parser.add_argument('index', type=int, help='Index of the geode in the file')
+    parser.add_argument('path', nargs='?', default='geodes.txt')
+    parser.add_argument('--restarts', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--time-limit', type=float, default=None, help='Wall-clock cap in seconds')
+    parser.add_argument('--source-choices', type=int, default=3)
+    parser.add_argument('--bridge-bias', type=float, default=2.0)
+    parser.add_argument('--local-search', action='store_true', help='Improve every variant with a local search')
+    args = parser.parse_args()
+
+    with GeodeFile(args.path) as geode_file:
+        raw = geode_file.raw(args.index)
+    search_start = time.perf_counter()
+    improvement = None
+    for improvement in iter_improvements(raw, restarts=args.restarts, workers=args.workers,
+                                         time_limit=args.time_limit, source_choices=args.source_choices,
+                                         bridge_bias=args.bridge_bias, local_search=args.local_search):
+        uncovered, groups, spread = improvement.score
+        print(f'{time.perf_counter() - search_start:6.2f}s: seed {improvement.seed} found {groups} groups, '
+              f'{uncovered} uncovered pumpkins, group size spread {spread:.2f}')
+    geode_ = parse_geode(raw)
+    if improvement is not None:
+        geode_.apply_group_grid(improvement.group_grid)
+        geode_.pretty_print_group_grid()
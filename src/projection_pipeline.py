@@ -0,0 +1,88 @@
+import argparse
+import time
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from src.Analyzers.geode import Geode
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+from src.sat_projection import (Coord, PlaneEnum, ProjectionProblem, ProjectionResult, decompress, geode_compressed,
+                                load_budding_amethysts)
+
+
+def projected_blocks(solution: ProjectionResult) -> Iterator[tuple[PlaneEnum, np.ndarray]]:
+    """
+    Projects a solution of the projection problem onto the three planes, in the format of the 2d pipeline:
+      - An active slice is a pumpkin, as it has to be pushed out by a flying machine
+      - A slice that contains a budding amethyst that is kept is obsidian, as buds can't be moved
+      - Every other cell is air
+    Every grid spans the slices and buds of its plane, with a border of air around them.
+    :param solution: A solution of ProjectionProblem.solve
+    :return: Per plane, a 2d array with the GeodeEnum int values of the projected blocks
+    """
+    slices_per_plane: dict[PlaneEnum, list[tuple[int, int]]] = {plane: [] for plane in PlaneEnum}
+    for plane, coord_a, coord_b in solution.slices:
+        slices_per_plane[plane].append((coord_a, coord_b))
+
+    for plane in PlaneEnum:
+        pumpkins = np.array(slices_per_plane[plane], dtype=np.int64).reshape(-1, 2)
+        obsidian = np.array([plane.to_coord_2d(Coord(*bud)) for bud in solution.budding_amethysts],
+                            dtype=np.int64).reshape(-1, 2)
+        coords = np.concatenate([pumpkins, obsidian])
+        if not len(coords):
+            yield plane, np.zeros((2, 2), dtype=np.uint8)
+            continue
+        # Shift the coordinates so the grid starts with a border of air
+        origin = coords.min(axis=0) - 1
+        rows, cols = coords.max(axis=0) - origin + 2
+        blocks = np.full((rows, cols), GeodeEnum.AIR.int_value, dtype=np.uint8)
+        blocks[tuple((pumpkins - origin).T)] = GeodeEnum.PUMPKIN.int_value
+        blocks[tuple((obsidian - origin).T)] = GeodeEnum.OBSIDIAN.int_value
+        yield plane, blocks
+
+
+def placed_geodes(planes: Iterable[tuple[PlaneEnum, np.ndarray]]) -> Iterator[tuple[PlaneEnum, Geode]]:
+    """
+    Places the groups of every projected plane with Geode.heuristic_placement
+    :param planes: Per plane the projected blocks, e.g. from projected_blocks
+    :return: Per plane the geode with its groups, streamed as soon as the plane is placed
+    """
+    for plane, blocks in planes:
+        geode = Geode([[Cell(row, col, GeodeEnum(int(blocks[row, col])))
+                        for col in range(blocks.shape[1])]
+                       for row in range(blocks.shape[0])])
+        geode.heuristic_placement()
+        yield plane, geode
+
+
+def run_pipeline(budding_amethysts: Iterable[Coord], *,
+                 time_limit: float = None,
+                 exact: bool = False) -> Iterator[tuple[PlaneEnum, Geode]]:
+    """
+    Runs all stages in memory, from the bud coordinates of a geode to the group layouts of its three projections
+    :param budding_amethysts: The coordinates of the budding amethysts of the geode
+    :param time_limit: The maximum number of seconds for the projection step
+    :param exact: See ProjectionProblem
+    :return: Per plane the geode with its groups, nothing if the projection step found no solution in time
+    """
+    solution = ProjectionProblem(budding_amethysts, exact=exact).solve(time_limit)
+    if solution is None:
+        return
+    yield from placed_geodes(projected_blocks(solution))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Project a geode and place the groups of every projection')
+    parser.add_argument('path', nargs='?', default=None,
+                        help='File with the coordinates of the budding amethysts, defaults to the built-in geode')
+    parser.add_argument('--time-limit', type=float, default=None, help='Time limit of the projection step')
+    parser.add_argument('--exact', action='store_true', help='Use the complete constraint between slices and buds')
+    args = parser.parse_args()
+
+    pipeline_start = time.perf_counter()
+    buds = decompress(geode_compressed) if args.path is None else load_budding_amethysts(args.path)
+    for plane_, geode_ in run_pipeline(buds, time_limit=args.time_limit, exact=args.exact):
+        print(f'Plane {plane_.name} after {(time.perf_counter() - pipeline_start):3.2f} seconds, group sizes: '
+              f'{[len(group) for group in geode_.groups.values()]}')
+        geode_.pretty_print_merged()
@@ -0,0 +1,108 @@
+import hashlib
+import sqlite3
+import time
+from typing import Union
+
+import numpy as np
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.Analyzers.geode import Geode
+from src.Analyzers.isolation import ISOLATION_THRESHOLD, SMALL_CLUSTER_SCORE
+from src.Utils.dihedral import inverse_transform, transform
+from src.group import MAX_GROUP_SIZE
+
+# Bump this whenever the heuristic changes in a way that changes its results, or the way results are stored changes,
+# which invalidates all cached results
+HEURISTIC_VERSION = 4
+
+
+def heuristic_stamp() -> str:
+    return f'v{HEURISTIC_VERSION}-{MAX_GROUP_SIZE}-{SMALL_CLUSTER_SCORE}-{ISOLATION_THRESHOLD}'
+
+
+def blocks_key(blocks: np.ndarray) -> str:
+    # The dimensions are part of the key, so geodes with the same cells in a different shape don't collide
+    return hashlib.sha256(np.array(blocks.shape, dtype='<u2').tobytes()
+                          + blocks.astype(np.uint8).tobytes()).hexdigest()
+
+
+def to_canonical_groups(group_grid: tuple[tuple[int, ...], ...], transform_nr: int) -> tuple[tuple[int, ...], ...]:
+    return tuple(tuple(row) for row in transform(np.array(group_grid), transform_nr).tolist())
+
+
+def from_canonical_groups(group_grid: tuple[tuple[int, ...], ...], transform_nr: int) -> tuple[tuple[int, ...], ...]:
+    return tuple(tuple(row) for row in inverse_transform(np.array(group_grid), transform_nr).tolist())
+
+
+class ResultCache:
+    """
+    On-disk cache mapping the content hash of a projected geode to its group assignment.
+    Geodes are stored in their canonical form (see Geode.canonical_form), so rotations and mirror images of a geode
+    share one entry.
+    The number of entries is bounded, evicting the least recently used entries first. Entries computed with other
+    heuristic parameters (see heuristic_stamp) are dropped when the cache is opened.
+    """
+
+    def __init__(self, path: str = 'geode_cache.sqlite', max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self.stamp = heuristic_stamp()
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                 'key TEXT PRIMARY KEY, '
+                                 'stamp TEXT NOT NULL, '
+                                 'rows INTEGER NOT NULL, '
+                                 'group_grid BLOB NOT NULL, '
+                                 'last_used INTEGER NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self._connection.execute('DELETE FROM results WHERE stamp != ?', (self.stamp,))
+        self._connection.commit()
+
+    def get(self, key: str) -> Union[tuple[tuple[int, ...], ...], None]:
+        row = self._connection.execute('SELECT rows, group_grid FROM results WHERE key = ? AND stamp = ?',
+                                       (key, self.stamp)).fetchone()
+        if row is None:
+            return None
+        self._connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time_ns(), key))
+        self._connection.commit()
+        rows, group_grid = row
+        return tuple(tuple(row_) for row_ in np.frombuffer(group_grid, dtype='<i2').reshape(rows, -1).tolist())
+
+    def put(self, key: str, group_grid: tuple[tuple[int, ...], ...]):
+        self._connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                                 (key, self.stamp, len(group_grid),
+                                  np.array(group_grid, dtype='<i2').tobytes(), time.time_ns()))
+        self._connection.execute('DELETE FROM results WHERE key IN ('
+                                 'SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                                 (self.max_entries,))
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def cached_heuristic_placement(geode: Geode, cache: ResultCache) -> bool:
+    """
+    Places the groups of the geode, reusing the cached group assignment if the geode was solved before.
+    The heuristic depends on the orientation of the geode, so it always runs on the canonical form, and the result is
+    mapped back onto the geode. Otherwise the cached layout would depend on which rotation of the geode came first.
+    :return: Whether the result came from the cache
+    """
+    canonical_blocks, transform_nr = geode.canonical_form()
+    key = blocks_key(canonical_blocks)
+    cached = (group_grid := cache.get(key)) is not None
+    if not cached:
+        canonical_geode = CompactGeode(canonical_blocks).to_geode()
+        canonical_geode.heuristic_placement()
+        group_grid = canonical_geode.group_grid()
+        cache.put(key, group_grid)
+    geode.apply_group_grid(from_canonical_groups(group_grid, transform_nr))
+    return cached
@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import argparse
+import time
 from collections import defaultdict
 from enum import Enum
+from typing import Callable, Iterable, NamedTuple, Union
 
-from z3 import Int, Solver, And, If, Implies, Sum, Or, Bool, Xor, Z3Exception, Not, BoolRef
+from z3 import And, Implies, Or, Bool, Xor, Not, BoolRef, Optimize, Z3Exception, is_true, sat, unsat
 
 
-# While the structure of this file is garbage at best, it's an untested proof of concept for
-# sat-solving the geode projection problem.
+# This is an untested proof of concept for sat-solving the geode projection problem.
 # It's untested because displaying the results in 3d is difficult.
 # To test it, this file should be reimplemented in the Geodesy Minecraft mod.
 
@@ -30,35 +32,50 @@ class PlaneEnum(Enum):
         return Slice(self, *self.to_coord_2d(coord))
 
 
+# The position of every plane, which hashes the same between runs
+_PLANE_NRS: dict[PlaneEnum, int] = {plane: plane_nr for plane_nr, plane in enumerate(PlaneEnum)}
+
+
 class Coord:
+    # The hash is computed once, and only depends on the coordinates, which keeps the iteration order of sets the
+    # same between runs
+    __slots__ = ('coord_x', 'coord_y', 'coord_z', '_hash')
+
     def __init__(self, coord_x: int, coord_y: int, coord_z: int):
-        self.coord_x = coord_x
-        self.coord_y = coord_y
-        self.coord_z = coord_z
-    
+        self.coord_x, self.coord_y, self.coord_z = coord_x, coord_y, coord_z
+        self._hash = hash((coord_x, coord_y, coord_z))
+
+    def __eq__(self, other):
+        return (self is other or isinstance(other, Coord) and self._hash == other._hash
+                and self.coord_x == other.coord_x and self.coord_y == other.coord_y and self.coord_z == other.coord_z)
+
+    def __hash__(self):
+        return self._hash
+
     def add(self, coord_x: int, coord_y: int, coord_z: int) -> Coord:
         return Coord(self.coord_x + coord_x, self.coord_y + coord_y, self.coord_z + coord_z)
-    
+
     def neighbours(self) -> list[Coord]:
         return [self.add(offset_x, offset_y, offset_z)
                 for offset_x, offset_y, offset_z in [(0, 0, 1), (0, 1, 0), (1, 0, 0),
                                                      (0, 0, -1), (0, -1, 0), (-1, 0, 0)]]
 
-    def __eq__(self, other):
-        if isinstance(other, Coord):
-            return vars(self) == vars(other)
-        return False
-
-    def __hash__(self):
-        return hash(tuple(vars(self).values()))
-
 
 class Slice:
+    # Slices hash like coords. They don't hold a solver variable, see ProjectionProblem.slice_bool
+    __slots__ = ('plane', 'coord_a', 'coord_b', '_hash')
+
     def __init__(self, plane: PlaneEnum, coord_a: int, coord_b: int):
-        self.plane = plane
-        self.coord_a = coord_a
-        self.coord_b = coord_b
-        self.sat_bool = Bool(f'slice__{self.plane}__{self.coord_a}__{self.coord_b}')
+        self.plane, self.coord_a, self.coord_b = plane, coord_a, coord_b
+        # Enums hash by name, which differs between runs
+        self._hash = hash((_PLANE_NRS[plane], coord_a, coord_b))
+
+    def __eq__(self, other):
+        return (self is other or isinstance(other, Slice) and self._hash == other._hash
+                and self.plane is other.plane and self.coord_a == other.coord_a and self.coord_b == other.coord_b)
+
+    def __hash__(self):
+        return self._hash
 
     def add(self, coord_a: int, coord_b: int) -> Slice:
         return Slice(self.plane, self.coord_a + coord_a, self.coord_b + coord_b)
@@ -72,19 +89,302 @@ class Slice:
             case PlaneEnum.z:
                 return self.coord_a, self.coord_b, plane_coord
 
-    def __eq__(self, other):
-        if isinstance(other, Slice):
-            return vars(self) == vars(other)
-        return False
-
-    def __hash__(self):
-        return hash(tuple(vars(self).values()))
-
     def neighbours(self) -> list[Slice]:
         return [self.add(offset_a, offset_b)
                 for offset_a, offset_b in [(0, 1), (1, 0), (0, -1), (-1, 0)]]
 
 
+def decompress(compressed: dict[int, list[tuple[int, int]]]) -> set[Coord]:
+    # Turns the compressed format (x mapped to the y, z coordinates of its buds) into coordinates
+    return {Coord(x, y, z)
+            for x, val in compressed.items()
+            for y, z in val}
+
+
+def load_budding_amethysts(path: str) -> set[Coord]:
+    """
+    Reads the coordinates of budding amethysts from a text file with one bud per line, as three integers separated
+    by whitespace or commas. Empty lines and lines starting with # are skipped.
+    :param path: The path to the file
+    :return: The coordinates of the buds
+    """
+    buds = set()
+    with open(path) as file:
+        for line_nr, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            values = line.replace(',', ' ').split()
+            if len(values) != 3:
+                raise ValueError(f'{path}:{line_nr}: expected three coordinates, got {line!r}')
+            buds.add(Coord(*map(int, values)))
+    return buds
+
+
+class ProjectionResult(NamedTuple):
+    harvested_clusters: int
+    projections: int
+    # The active slices as (plane, coord_a, coord_b)
+    slices: tuple[tuple[PlaneEnum, int, int], ...]
+    # The budding amethysts that are kept, as (x, y, z)
+    budding_amethysts: tuple[tuple[int, int, int], ...]
+    # Whether the solver proved that no projection harvests more clusters, or uses fewer projections for as many
+    optimal: bool
+    seconds: float
+
+
+class ProjectionProblem:
+    """
+    SAT model of the projection problem of a geode: which slices to project (and which budding amethysts to give up
+    for them) to harvest as many amethyst clusters as possible, and to use as few projections as possible for that.
+    The model is built once, and both goals are optimized lexicographically as weighted MaxSAT by z3 Optimize, which
+    proves the optimum of the built-in geode in well under a second.
+    """
+
+    def __init__(self, budding_amethysts: Iterable[Coord], exact: bool = False):
+        """
+        :param budding_amethysts: The coordinates of the budding amethysts of the geode
+        :param exact: Whether to use the complete constraint between slices and the buds they clear, which finds the
+                      true optimum, instead of the incomplete one (see projection_constraints)
+        """
+        self.budding_amethysts: set[Coord] = set(budding_amethysts)
+        self.exact = exact
+        # Create clusters
+        # NOTE: We intentionally leave in locations that already have buds because the sat solver can
+        # choose to enable/disable buds to optimize the total number of projected budding amethysts
+        self.amethyst_clusters: set[Coord] = {neighbour_coord
+                                              for coord in self.budding_amethysts
+                                              for neighbour_coord in coord.neighbours()}
+
+        # Define budding amethysts
+        # The bool indicates whether they are active (true) or destroyed (false)
+        self.budding_amethysts_dict: dict[Coord, BoolRef] = {
+            bud: Bool(f'budding_amethyst__{bud.coord_x}__{bud.coord_y}__{bud.coord_z}')
+            for bud in self.budding_amethysts}
+
+        # Define amethyst crystals
+        # The bool indicates whether they are active (true) or destroyed (false)
+        self.amethyst_clusters_dict: dict[Coord, BoolRef] = {
+            cluster: Bool(f'amethyst_cluster__{cluster.coord_x}__{cluster.coord_y}__{cluster.coord_z}')
+            for cluster in self.amethyst_clusters}
+
+        # To make constraints about budding amethysts, amethyst clusters, and slices, we need to create dictionaries
+        # first
+        self.slice_coord_to_harvesting_coords_dict: dict[Slice, set[Coord]] = defaultdict(set)
+        self.harvesting_coords_to_slice_coords_dict: dict[Coord, set[Slice]] = defaultdict(set)
+        for plane in PlaneEnum:
+            for coord in self.amethyst_clusters | self.budding_amethysts:
+                slice_ = plane.to_slice(coord)
+                self.slice_coord_to_harvesting_coords_dict[slice_].add(coord)
+                self.harvesting_coords_to_slice_coords_dict[coord].add(slice_)
+        # Define slices
+        self.slices = list(self.slice_coord_to_harvesting_coords_dict.keys())
+        # The slices as a set, for membership tests
+        self.slice_set: set[Slice] = set(self.slices)
+        # The solver variable of every slice that is part of the model, created on first use
+        self.slice_bools: dict[Slice, BoolRef] = {}
+        cluster_harvest_dict: dict[Coord, list[BoolRef]] = {
+            coord: [self.slice_bool(slice_) for slice_ in self.harvesting_coords_to_slice_coords_dict[coord]]
+            for coord in self.budding_amethysts | self.amethyst_clusters}
+
+        # A cluster is harvested if it is active and one of the slices harvests it
+        self.harvested: list[BoolRef] = [And(cluster, Or(cluster_harvest_dict[coord]))
+                                         for coord, cluster in self.amethyst_clusters_dict.items()]
+        self.projections: list[BoolRef] = [self.slice_bool(slice_) for slice_ in self.slices]
+
+        # Both goals are soft constraints: every cluster should be harvested, and no slice should be projected.
+        # Goals are optimized lexicographically in the order they are added, by core-guided MaxSAT
+        self.optimizer = Optimize()
+        self.optimizer.add(self.growth_constraints())
+        self.optimizer.add(self.projection_constraints())
+        for harvested in self.harvested:
+            self.optimizer.add_soft(harvested, 1, 'clusters')
+        for projection in self.projections:
+            self.optimizer.add_soft(Not(projection), 1, 'projections')
+
+    def slice_bool(self, slice_: Slice) -> BoolRef:
+        # The bool indicates whether the slice is projected
+        if (sat_bool := self.slice_bools.get(slice_)) is None:
+            sat_bool = self.slice_bools[slice_] = Bool(f'slice__{slice_.plane}__{slice_.coord_a}__{slice_.coord_b}')
+        return sat_bool
+
+    def growth_constraints(self) -> list[BoolRef]:
+        ####################################################################################################
+        # Set relations between amethyst clusters and budding amethysts                                    #
+        # We have three relations to define:                                                               #
+        # Relation 1: Amethyst Cluster is true -> one of the neighbouring Budding Amethysts is true        #
+        # Relation 2: Budding Amethyst is true                                                             #
+        #   -> all neighbours either (have no bud possibility and have a crystal) or (have a bud or a      #
+        #      crystal)                                                                                    #
+        # Relation 3: Budding Amethyst xor Amethyst Cluster                                                #
+        ####################################################################################################
+        buds, clusters = self.budding_amethysts_dict, self.amethyst_clusters_dict
+
+        # Relation 1: Amethyst Cluster is true -> one of the neighbouring Budding Amethysts is true
+        cluster_implies_neighbour_bud_c = [
+            Implies(clusters[amethyst_coords],                                # Amethyst coords imply that
+                    Or([buds[possible_bud_coord]                              # One or more neighbouring buds are true
+                        for possible_bud_coord in amethyst_coords.neighbours()
+                        if possible_bud_coord in buds]))                      # We exclude buds coords that don't exist
+            for amethyst_coords in self.amethyst_clusters]
+
+        # Relation 2: Budding Amethyst is true
+        #   -> all neighbours either (have no bud possibility and have a crystal) or (have a bud or a crystal)
+        bud_implies_possible_neighbour_cluster_c = [
+            Implies(buds[bud_coord],                                         # Bud coords imply that
+                    And([Or(buds[neighbour_coord],                           # For all neighbours, if a bud can exist,
+                            clusters[neighbour_coord])                       # the coord either has a bud or a crystal,
+                         if neighbour_coord in buds                          #
+                         else clusters[neighbour_coord]                      # otherwise, it has a crystal
+                         for neighbour_coord in bud_coord.neighbours()]))    #
+            for bud_coord in self.budding_amethysts]
+
+        # Relation 3: Budding Amethyst xor Amethyst Cluster
+        bud_xor_cluster_c = [Xor(buds[coord], clusters[coord])
+                             for coord in self.amethyst_clusters & self.budding_amethysts]
+
+        return cluster_implies_neighbour_bud_c + bud_implies_possible_neighbour_cluster_c + bud_xor_cluster_c
+
+    def projection_constraints(self) -> list[BoolRef]:
+        ###############################################################################################
+        # Set projection relations
+        # We have three relations to define:
+        # Relation 1: For all buds a slice would clear, the slice is active xor the bud is active
+        # Relation 2: 1x1 holes in the vertical (y) plane cannot exist
+        # Relation 3: 1x1 holes in the horizontal (x, z) planes can exist in specific scenarios
+        ###############################################################################################
+        slices, slice_bool = self.slice_set, self.slice_bool
+
+        # Set relation 1: For all buds a slice would clear, the slice is active xor the bud is active
+        # NOTE: Technically, this condition limits the completeness of the problem.
+        # If a slice covers two buds, and removing only one of those buds could lead to improved
+        # cluster coverage (through one of the other two slices), then that scenario cannot be detected.
+        # The condition xor(slice, or(all buds that the slice clears)) would be the constraint that
+        # could replace the current constraint with perfect soundness and completeness, which is what exact mode
+        # uses instead.
+        if self.exact:
+            relation_1_c = self.complete_bud_slice_constraints()
+        else:
+            relation_1_c = [
+                Xor(self.budding_amethysts_dict[coord], slice_bool(slice_))
+                for coord, coord_slices in self.harvesting_coords_to_slice_coords_dict.items()
+                if coord in self.budding_amethysts
+                for slice_ in coord_slices]
+
+        # For relations 2 and 3, we need to identify potential 1x1 holes first:
+        potential_one_by_one_holes: set[Slice] = {
+            slice_
+            for slice_ in slices
+            if all(neighbour in slices
+                   for neighbour in slice_.neighbours())}
+
+        # Set relation 2: 1x1 holes in the vertical (y) plane cannot exist:
+        # Written as:
+        # If a potential hole in the y plane is active,
+        # then at least one of its neighbours must be active too, so it is not a 1x1 hole.
+        block_vertical_one_by_one_holes_c = [
+            Implies(slice_bool(slice_),                                               # A potential hole implies
+                    Or([slice_bool(neighbour)                                         # that at least one neighbour
+                        for neighbour in slice_.neighbours()]))                       # is active
+            for slice_ in potential_one_by_one_holes if slice_.plane == PlaneEnum.y]  # if the hole is vertical
+
+        # For relation 3, we must first create a map from each potential hole to a list of up to three sets of
+        # projections in a specific shape.
+        # If slices can be placed for all positions in at least one of those sets, the potential hole could be
+        # harvested even if it is a 1x1 hole.
+        # The following holes allow for the projection to be active
+        #     B
+        #     B
+        #   AA#CC
+        #    #H#
+        #     #
+        # Where # is blocked, H is the hole, and all A's, B's, or C's have to be free
+        potential_holes_to_list_of_sets_of_required_projections: dict[Slice, list[set[BoolRef]]] = {}
+        for slice_ in potential_one_by_one_holes:
+            if slice_.plane == PlaneEnum.y:
+                continue
+            potential_holes_to_list_of_sets_of_required_projections[slice_] = [
+                {slice_bool(offset_slice)
+                 for offset_a, offset_b in offset_coords
+                 if (offset_slice := slice_.add(offset_a, offset_b)) in slices}
+                for offset_coords in [{(-2, 1), (-1, 1)}, {(0, 2), (0, 3)}, {(1, 1), (1, 2)}]]
+
+        # Set relation 3: 1x1 holes in the horizontal (x, z) planes can exist in specific scenarios
+        # Written as:
+        # A potential hole being active while its neighbours are inactive, which is therefore a 1x1 hole,
+        # requires at least one of the sets to be fully
+        # active so the original hole can be powered.
+        # NOTE: It is intended for sets to sometimes be empty. It will just lead to an empty `and()`,
+        #       which is equivalent to `true` and therefore does not pose a problem.
+        block_specific_horizontal_one_by_one_holes_c = [
+            Implies(And(slice_bool(slice_),                                    # An active hole on the horizontal plane
+                        *[Not(slice_bool(neighbour))                           # that is blocked in by its neighbours
+                          for neighbour in slice_.neighbours()]),              # implies that
+                    Or([And(required_active_group)                             # at least one of the three groups
+                        for required_active_group                              # required to power the hole is fully
+                        in potential_holes_to_list_of_sets_of_required_projections[slice_]]))  # active
+            for slice_ in potential_one_by_one_holes if slice_.plane != PlaneEnum.y]
+
+        return relation_1_c + block_vertical_one_by_one_holes_c + block_specific_horizontal_one_by_one_holes_c
+
+    def complete_bud_slice_constraints(self) -> list[BoolRef]:
+        # xor(slice, or(buds)) for every slice that clears buds, written as clauses so no Or term has to be shared:
+        # the slice is only active if all of its buds are cleared, and it is active once all of them are cleared.
+        # Slices that don't clear any buds are left free, like in the incomplete constraint
+        constraints = []
+        for slice_, coords in self.slice_coord_to_harvesting_coords_dict.items():
+            buds = [self.budding_amethysts_dict[coord] for coord in coords if coord in self.budding_amethysts]
+            if not buds:
+                continue
+            constraints += [Or(Not(self.slice_bool(slice_)), Not(bud)) for bud in buds]
+            constraints.append(Or(self.slice_bool(slice_), *buds))
+        return constraints
+
+    def result(self, model, optimal: bool, seconds: float) -> ProjectionResult:
+        active_slices = [slice_ for slice_ in self.slices
+                         if is_true(model.eval(self.slice_bool(slice_), model_completion=True))]
+        return ProjectionResult(
+            harvested_clusters=sum(1 for harvested in self.harvested
+                                   if is_true(model.eval(harvested, model_completion=True))),
+            projections=len(active_slices),
+            slices=tuple(sorted(((slice_.plane, slice_.coord_a, slice_.coord_b) for slice_ in active_slices),
+                                key=lambda slice_: (slice_[0].name, slice_[1], slice_[2]))),
+            budding_amethysts=tuple(sorted((bud.coord_x, bud.coord_y, bud.coord_z)
+                                           for bud, bud_bool in self.budding_amethysts_dict.items()
+                                           if is_true(model.eval(bud_bool, model_completion=True)))),
+            optimal=optimal,
+            seconds=seconds)
+
+    def solve(self, time_limit: float = None,
+              on_improvement: Callable[[ProjectionResult], None] = None) -> Union[ProjectionResult, None]:
+        """
+        Maximizes the number of harvested clusters, and then minimizes the number of projections for that number of
+        clusters
+        :param time_limit: The maximum number of seconds to solve for
+        :param on_improvement: Called with every solution that the optimizer finds on the way
+        :return: The best solution, or None if none was found in time
+        """
+        start = time.perf_counter()
+        if time_limit is not None:
+            self.optimizer.set('timeout', max(1, int(time_limit * 1000)))
+        if on_improvement is not None:
+            self.optimizer.set_on_model(lambda model: on_improvement(self.result(model, False,
+                                                                                 time.perf_counter() - start)))
+        try:
+            status = self.optimizer.check()
+            try:
+                # After a timeout, the model is the best one that was found so far
+                model = self.optimizer.model()
+            except Z3Exception:
+                return None
+        finally:
+            self.optimizer.set('timeout', 4294967295)
+            self.optimizer.set_on_model(lambda model: None)
+        if status == unsat:
+            return None
+        return self.result(model, status == sat, time.perf_counter() - start)
+
+
 # Compressed formats describing only the coordinates of the budding amethysts
 geode_compressed: dict[int, list[tuple[int, int]]] = {
     0: [],
@@ -105,212 +405,23 @@ geode_compressed: dict[int, list[tuple[int, int]]] = {
     15: [],
 }
 
-# Decompress list, create buds
-budding_amethysts: set[Coord] = {Coord(x, y, z)
-                                 for x, val in geode_compressed.items()
-                                 for y, z in val}
-# Create clusters
-# NOTE: We intentionally leave in locations that already have buds because the sat solver can
-# choose to enable/disable buds to optimize the total number of projected budding amethysts
-amethyst_clusters: set[Coord] = {neighbour_coord
-                                 for coord in budding_amethysts
-                                 for neighbour_coord in coord.neighbours()}
-
-##################################################
-# Start of building up the SAT solver conditions #
-##################################################
-
-# Define budding amethysts
-# The bool indicates whether they are active (true) or destroyed (false)
-budding_amethysts_dict: dict[Coord, BoolRef] = {
-    bud: Bool(f'budding_amethyst__{bud.coord_x}__{bud.coord_y}__{bud.coord_z}')
-    for bud in budding_amethysts}
-budding_amethysts_d: list[BoolRef] = list(budding_amethysts_dict.values())
-
-# Define amethyst crystals
-# The bool indicates whether they are active (true) or destroyed (false)
-amethyst_clusters_dict: dict[Coord, BoolRef] = {
-    cluster: Bool(f'amethyst_cluster__{cluster.coord_x}__{cluster.coord_y}__{cluster.coord_z}')
-    for cluster in amethyst_clusters}
-amethyst_clusters_d: list[BoolRef] = list(amethyst_clusters_dict.values())
-
-# To make constraints about budding amethysts, amethyst clusters, and slices, we need to create dictionaries first
-slice_coord_to_harvesting_coords_dict: dict[Slice, set[Coord]] = defaultdict(set)
-harvesting_coords_to_slice_coords_dict: dict[Coord, set[Slice]] = defaultdict(set)
-for plane in PlaneEnum:
-    for coord in amethyst_clusters | budding_amethysts:
-        slice_ = plane.to_slice(coord)
-        slice_coord_to_harvesting_coords_dict[slice_].add(coord)
-        harvesting_coords_to_slice_coords_dict[coord].add(slice_)
-# Define slices
-slices = list(slice_coord_to_harvesting_coords_dict.keys())
-cluster_harvest_dict: dict[Coord, list[BoolRef]] = {
-    coord: [slice_.sat_bool for slice_ in harvesting_coords_to_slice_coords_dict[coord]]
-    for coord in budding_amethysts | amethyst_clusters}
-
-########################################################################################################
-# Set relations between amethyst clusters and budding amethysts                                        #
-# We have three relations to define:                                                                   #
-# Relation 1: Amethyst Cluster is true -> one of the neighbouring Budding Amethysts is true            #
-# Relation 2: Budding Amethyst is true                                                                 #
-#   -> all neighbours either (have no bud possibility and have a crystal) or (have a bud or a crystal) #
-# Relation 3: Budding Amethyst xor Amethyst Cluster                                                    #
-########################################################################################################
-
-# Relation 1: Amethyst Cluster is true -> one of the neighbouring Budding Amethysts is true
-cluster_implies_neighbour_bud_c = [
-    Implies(amethyst_clusters_dict[amethyst_coords],                      # Amethyst coords imply that
-            Or([budding_amethysts_dict[possible_bud_coord]                # One or more neighbouring buds are true
-                for possible_bud_coord in amethyst_coords.neighbours()    #
-                if possible_bud_coord in budding_amethysts_dict]))        # We exclude buds coords that don't exist
-    for amethyst_coords in amethyst_clusters]
-
-# Relation 2: Budding Amethyst is true
-#   -> all neighbours either (have no bud possibility and have a crystal) or (have a bud or a crystal)
-bud_implies_possible_neighbour_cluster_c = [
-    Implies(budding_amethysts_dict[bud_coord],                       # Bud coords imply that
-            And([Or(budding_amethysts_dict[neighbour_coord],         # For all neighbours, if a bud can exist,
-                    amethyst_clusters_dict[neighbour_coord])         # the coord either has a bud or a crystal,
-                 if neighbour_coord in budding_amethysts_dict        #
-                 else amethyst_clusters_dict[neighbour_coord]        # otherwise, it has a crystal
-                 for neighbour_coord in bud_coord.neighbours()]))    #
-    for bud_coord in budding_amethysts]
-
-# Relation 3: Budding Amethyst xor Amethyst Cluster
-bud_xor_cluster_c = [Xor(budding_amethysts_dict[coord], amethyst_clusters_dict[coord])
-                     for coord in amethyst_clusters & budding_amethysts]
-
-###############################################################################################
-# Set projection relations
-# We have three relations to define:
-# Relation 1: For all buds a slice would clear, the slice is active xor the bud is active
-# Relation 2: 1x1 holes in the vertical (y) plane cannot exist
-# Relation 3: 1x1 holes in the horizontal (x, z) planes can exist in specific scenarios
-###############################################################################################
-
-# Set relation 1: For all buds a slice would clear, the slice is active xor the bud is active
-# NOTE: Technically, this condition limits the completeness of the problem.
-# If a slice covers two buds, and removing only one of those buds could lead to improved
-# cluster coverage (through one of the other two slices), then that scenario cannot be detected.
-# The condition xor(slice, or(all buds that the slice clears)) would be the constraint that
-# could replace the current constraint with perfect soundness and completeness, but in practice,
-# it performs much worse.
-# With the complete constraint, getting to ~345 harvested clusters can already take minutes,
-# whereas with the incomplete constraint, getting to 360 (with 361 being unsat) takes 5 seconds.
-# While that leaves no guarantee that 360 is truly the limit, it's much more practical for
-# the purposes of quickly getting a (very) optimal projection.
-bud_xor_slices_c = [
-    Xor(budding_amethysts_dict[coord], slice_.sat_bool)
-    for coord, slices in harvesting_coords_to_slice_coords_dict.items() if coord in budding_amethysts
-    for slice_ in slices]
-
-# For relations 2 and 3, we need to identify potential 1x1 holes first:
-potential_one_by_one_holes: set[Slice] = {
-    slice_
-    for slice_ in slices
-    if all(neighbour in slices 
-           for neighbour in slice_.neighbours())}
-
-# Set relation 2: 1x1 holes in the vertical (y) plane cannot exist:
-# Written as:
-# If a potential hole in the y plane is active,
-# then at least one of its neighbours must be active too, so it is not a 1x1 hole.
-block_vertical_one_by_one_holes_c = [
-    Implies(slice_.sat_bool,                                                  # A potential hole implies
-            Or([neighbour.sat_bool                                            # that at least one neighbour
-                for neighbour in slice_.neighbours()]))                       # is active
-    for slice_ in potential_one_by_one_holes if slice_.plane == PlaneEnum.y]  # if the hole is vertical
-
-
-# For relation 3, we must first create a map from each potential hole to a list of up to three sets of
-# projections in a specific shape.
-# If slices can be placed for all positions in at least one of those sets, the potential hole could be
-# harvested even if it is a 1x1 hole.
-# The following holes allow for the projection to be active
-#     B
-#     B
-#   AA#CC
-#    #H#
-#     #
-# Where # is blocked, H is the hole, and all A's, B's, or C's have to be free
-potential_holes_to_list_of_sets_of_required_projections: dict[Slice, list[set[BoolRef]]] = {}
-for slice_ in potential_one_by_one_holes:
-    if slice_.plane == PlaneEnum.y:
-        continue
-    potential_holes_to_list_of_sets_of_required_projections[slice_] = [
-         {offset_slice.sat_bool
-          for offset_a, offset_b in offset_coords
-          if (offset_slice := slice_.add(offset_a, offset_b)) in slices}
-         for offset_coords in [{(-2, 1), (-1, 1)}, {(0, 2), (0, 3)}, {(1, 1), (1, 2)}]]
-
-# Set relation 3: 1x1 holes in the horizontal (x, z) planes can exist in specific scenarios
-# Written as:
-# A potential hole being active while its neighbours are inactive, which is therefore a 1x1 hole,
-# requires at least one of the sets to be fully
-# active so the original hole can be powered.
-# NOTE: It is intended for sets to sometimes be empty. It will just lead to an empty `and()`,
-#       which is equivalent to `true` and therefore does not pose a problem.
-block_specific_horizontal_one_by_one_holes_c = [
-    Implies(And(slice_.sat_bool,                                       # An active hole on the horizontal plane
-                *[Not(neighbour.sat_bool)                              # that is blocked in by its neighbours
-                  for neighbour in slice_.neighbours()]),              # implies that
-            Or([And(required_active_group)                             # at least one of the three groups required
-                for required_active_group                              # to power the hole is fully active
-                in potential_holes_to_list_of_sets_of_required_projections[slice_]]))
-    for slice_ in potential_one_by_one_holes if slice_.plane != PlaneEnum.y]
-
-# Determine the number of clusters that are active and are harvested by any of the slices that are active
-nr_of_harvested_clusters = Int('nr_of_harvested_clusters')
-nr_of_harvested_clusters_c = nr_of_harvested_clusters == Sum(
-    [If(And(cluster,                                                  # If the cluster is active
-            Or(cluster_harvest_dict[coord])),                         # and one of the slices harvests it,
-        1, 0)                                                         # then count the cluster as 1, otherwise as 0
-     for coord, cluster in amethyst_clusters_dict.items()])           #
-
-# Determine the number of slices/projections that are active
-nr_of_projections = Int('nr_of_projections')
-nr_of_projections_c = nr_of_projections == Sum([If(slice_.sat_bool, 1, 0)
-                                                for slice_ in slices])
-
-score = Int('score')
-score_c = score == nr_of_harvested_clusters  # * 10 + (len(amethyst_clusters) - nr_of_projections)
-
-s = Solver()
-s.append(cluster_implies_neighbour_bud_c)
-s.append(bud_implies_possible_neighbour_cluster_c)
-s.append(bud_xor_cluster_c)
-s.append(bud_xor_slices_c)
-s.append(block_vertical_one_by_one_holes_c)
-s.append(block_specific_horizontal_one_by_one_holes_c)
-s.append(nr_of_harvested_clusters_c)
-s.append(nr_of_projections_c)
-s.append(score_c)
-
-minimum_harvested_clusters = 330
-while True:
-    s.check(minimum_harvested_clusters <= nr_of_harvested_clusters)
-    try:
-        model = s.model()
-    except Z3Exception:
-        break
-    print(f'nr_of_harvested_clusters: {model[nr_of_harvested_clusters]}')
-    print(f'nr_of_projections: {model[nr_of_projections]}')
-    if int(str(model[nr_of_harvested_clusters])) > minimum_harvested_clusters:
-        minimum_harvested_clusters = int(str(model[nr_of_harvested_clusters]))
-
-    minimum_harvested_clusters += 1
-minimum_harvested_clusters -= 1
-s.add(minimum_harvested_clusters <= nr_of_harvested_clusters)
-maximum_projections = int(str(model[nr_of_projections]))
-while True:
-    s.check(maximum_projections >= nr_of_projections)
-    try:
-        model = s.model()
-    except Z3Exception:
-        break
-    print(f'nr_of_harvested_clusters: {model[nr_of_harvested_clusters]}')
-    print(f'nr_of_projections: {model[nr_of_projections]}')
-    if int(str(model[nr_of_projections])) < maximum_projections:
-        maximum_projections = int(str(model[nr_of_projections]))
-
-    maximum_projections -= 1
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Optimize the projections of a geode')
+    parser.add_argument('path', nargs='?', default=None,
+                        help='File with the coordinates of the budding amethysts, defaults to the built-in geode')
+    parser.add_argument('--time-limit', type=float, default=None)
+    parser.add_argument('--exact', action='store_true', help='Use the complete constraint between slices and buds')
+    args = parser.parse_args()
+
+    problem = ProjectionProblem(decompress(geode_compressed) if args.path is None
+                                else load_budding_amethysts(args.path), exact=args.exact)
+    solution = problem.solve(args.time_limit,
+                             on_improvement=lambda improvement: print(
+                                 f'{improvement.seconds:7.2f}s: nr_of_harvested_clusters: '
+                                 f'{improvement.harvested_clusters}, nr_of_projections: {improvement.projections}'))
+    if solution is None:
+        print('No solution found')
+    else:
+        print(f'Harvested {solution.harvested_clusters} clusters with {solution.projections} projections in '
+              f'{solution.seconds:.2f} seconds ({"optimal" if solution.optimal else "not proven optimal"})')
@@ -1,4 +1,41 @@
-from z3 import Int, Solver, IntVector, And, If, Implies, Sum, ForAll, Or
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, NamedTuple, Union
+
+import numpy as np
+from z3 import (Int, Solver, IntVector, And, If, Implies, Sum, ForAll, Or, Bool, BoolRef, Not, AtMost, AtLeast,
+                PbGe, SolverFor, is_true, sat, unsat)
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.Enums.geode_enum import GeodeEnum
+from src.group import MAX_GROUP_SIZE
+
+# Groups of slime or honey need at least this many blocks
+MIN_GROUP_SIZE = 4
+
+# Contains 93 pumpkins
+# This is the main direction in Ilmango's tutorial video
+TUTORIAL_GRID = '''00000000000000000
+00000000p00000000
+0000000pop0000000
+000000pooop0p0000
+00000ppoop0pop000
+000ppoppopppop000
+00popppoopoppp000
+00poooppp0p0pop00
+0poopppoppop0pop0
+0poopppp00p0pop00
+00ppooop0pp00p000
+00popppppooppp000
+000p00poppppoop00
+0000000ppoppop000
+000000ppppopop000
+00000poooopop0000
+000000ppoopp00000
+00000000pp0000000
+00000000000000000'''
 
 
 def flatten(grid: list[IntVector]):
@@ -180,3 +217,520 @@ def parse_input(input_: str):
     print(s.check())
     model = s.model()
     print(model)
+
+
+# The encoding above uses quantifiers over Int variables, which z3 struggles with. The encoding below instantiates
+# every group explicitly with Bool variables and pseudo-boolean constraints, so it stays quantifier-free.
+
+def input_to_blocks(input_: str) -> np.ndarray:
+    # Converts the input format of parse_input (0 = empty, p = pumpkin, o = obsidian) to GeodeEnum int values
+    values = {'0': GeodeEnum.AIR.int_value, 'p': GeodeEnum.PUMPKIN.int_value, 'o': GeodeEnum.OBSIDIAN.int_value}
+    return np.array([[values[char] for char in line] for line in input_.splitlines()], dtype=np.uint8)
+
+
+class SatResult(NamedTuple):
+    # Group number per cell, -1 for cells without a group
+    group_grid: tuple[tuple[int, ...], ...]
+    # Whether each group is slime (True) or honey (False)
+    group_types: tuple[bool, ...]
+    group_count: int
+    # Whether the solver proved that no layout with fewer groups exists
+    optimal: bool
+    seconds: float
+
+
+def coverable_cells(compact: CompactGeode, bridges_only: bool = False) -> np.ndarray:
+    # The cells that a group can cover
+    if bridges_only:
+        return (compact.blocks == GeodeEnum.PUMPKIN.int_value) | (compact.blocks == GeodeEnum.BRIDGE.int_value)
+    return compact.blocks != GeodeEnum.OBSIDIAN.int_value
+
+
+def candidate_cells(compact: CompactGeode, coverable: np.ndarray, min_group_size: int) -> np.ndarray:
+    """
+    The cells that an optimal layout can be built from, if any layout exists. Taking a cell without a pumpkin out of a
+    group that is larger than min_group_size keeps the layout valid, as long as the group stays connected: it touches
+    fewer cells, and keeps its pumpkins. In a layout where no such cell can be taken out, every cell without a pumpkin
+    is either in a group of min_group_size cells, or it connects two pumpkins of its group through at most
+    MAX_GROUP_SIZE cells. Either way it is close to a pumpkin.
+    :param compact: The geode
+    :param coverable: A flat boolean mask of the cells that a group can cover, see coverable_cells
+    :param min_group_size: The minimum number of cells in a group
+    :return: A flat boolean mask of the coverable cells that are close enough to a pumpkin, through coverable cells
+    """
+    candidates = coverable & (compact.blocks == GeodeEnum.PUMPKIN.int_value)
+    for _ in range(max((MAX_GROUP_SIZE - 1) // 2, min_group_size - 1)):
+        candidates = coverable & (candidates | compact.neighbour_values(candidates, False).any(axis=1))
+    return candidates
+
+
+class PumpkinModel:
+    """
+    Quantifier-free model of the slime/honey layout of a projected geode.
+    Like parse_input, any cell but obsidian can be part of a group, which the candidate_cells are pruned down to.
+    For every group g and candidate cell c there is a Bool member[g][c], and every group has a Bool type (slime or
+    honey). The constraints are:
+      - Every cell is part of at most one group, and every group that is used contains a pumpkin
+      - Groups have between min_group_size and MAX_GROUP_SIZE cells
+      - Adjacent cells of different groups have different types, as slime and honey don't stick to each other
+      - Groups are connected: every group has one root cell, from which every other cell of the group can be reached
+        in steps within the group
+      - At least pumpkin_target pumpkins are part of a group
+    Symmetries between group numbers are broken by using groups in order, and by only allowing a cell in group g + 1
+    if a cell that comes before it is in group g.
+    The model is built once, and solve tightens the number of groups incrementally with push/pop.
+    A valid layout, e.g. from Geode.heuristic_placement, can be used as a warm start: it bounds the number of groups,
+    seeds the phases of the solver, and the solver is only asked for layouts with fewer groups. A layout that only
+    violates the model because of groups below min_group_size, or touching groups that can't alternate between slime
+    and honey, still seeds the phases, and the solver first looks for a layout with at most as many groups as it has.
+    """
+
+    def __init__(self, blocks: np.ndarray,
+                 allowed: np.ndarray = None, *,
+                 max_groups: int = None,
+                 min_group_size: int = MIN_GROUP_SIZE,
+                 pumpkin_target: int = None,
+                 warm_start: tuple[tuple[int, ...], ...] = None,
+                 bridges_only: bool = False):
+        """
+        :param blocks: A 2d array with the GeodeEnum int values of the geode, bridges are added if they are missing
+        :param allowed: An optional 2d boolean mask of the cells that can be part of a group
+        :param max_groups: The maximum number of groups. Defaults to the most groups that could be needed
+        :param min_group_size: The minimum number of cells in a group
+        :param pumpkin_target: The number of pumpkins that have to be part of a group. Defaults to all of them
+        :param warm_start: An optional group grid (see Geode.group_grid) to start from. It is ignored if it can't
+                           be read, see read_layout
+        :param bridges_only: Whether only pumpkins and bridges can be part of a group, like in the heuristic. This
+                             roughly halves the model, but misses layouts that need other air cells, e.g. to connect
+                             pumpkins two cells apart, or to pad a small cluster to min_group_size
+        """
+        compact = CompactGeode(blocks)
+        self.rows, self.cols = compact.rows, compact.cols
+        candidates = coverable_cells(compact, bridges_only)
+        if allowed is not None:
+            candidates &= allowed.ravel()
+        candidates = candidate_cells(compact, candidates, min_group_size)
+        # Cells are numbered by their position in cell_ids, which are the flat ids (row * cols + col) of the cells
+        self.cell_ids: list[int] = np.flatnonzero(candidates).tolist()
+        index_of = {cell_id: index for index, cell_id in enumerate(self.cell_ids)}
+        self.pumpkins: list[int] = [index for index, cell_id in enumerate(self.cell_ids)
+                                    if compact.blocks[cell_id] == GeodeEnum.PUMPKIN.int_value]
+        self.neighbours: list[list[int]] = [[index_of[neighbour] for neighbour in compact.neighbours[cell_id]
+                                             if neighbour in index_of]
+                                            for cell_id in self.cell_ids]
+        self.min_group_size = min_group_size
+        self.pumpkin_target = len(self.pumpkins) if pumpkin_target is None else pumpkin_target
+        # Every group holds at most MAX_GROUP_SIZE pumpkins
+        self.min_groups = -(-self.pumpkin_target // MAX_GROUP_SIZE)
+        # The layout of the warm start, and whether it satisfies the model. Only a valid layout is an incumbent that
+        # solve has to improve on, the group count of an invalid one is a bound that solve tries first
+        warm_layout, warm_valid = (None, False) if warm_start is None else self.read_layout(warm_start)
+        if max_groups is not None:
+            self.max_groups = max_groups
+        elif warm_valid:
+            # Better layouts have fewer groups than the incumbent, which keeps the model small
+            self.max_groups = warm_layout.group_count
+        else:
+            # A group without pumpkins can always be left out, so there are never more groups than pumpkins
+            self.max_groups = min(len(self.pumpkins), len(self.cell_ids) // min_group_size)
+        if warm_layout is not None and warm_layout.group_count > self.max_groups:
+            warm_layout = None
+        self.incumbent: Union[SatResult, None] = warm_layout if warm_valid else None
+        self.group_bound: Union[int, None] = None if warm_layout is None or warm_valid else warm_layout.group_count
+
+        groups, cells = range(self.max_groups), range(len(self.cell_ids))
+        self.member: list[list[BoolRef]] = [[Bool(f'member__{g}__{c}') for c in cells] for g in groups]
+        self.root: list[list[BoolRef]] = [[Bool(f'root__{g}__{c}') for c in cells] for g in groups]
+        self.used: list[BoolRef] = [Bool(f'used__{g}') for g in groups]
+        self.slime: list[BoolRef] = [Bool(f'slime__{g}') for g in groups]
+        self.in_group: list[BoolRef] = [Bool(f'in_group__{c}') for c in cells]
+        self.cell_slime: list[BoolRef] = [Bool(f'cell_slime__{c}') for c in cells]
+        # reach[g][k][c] is true if cell c is in group g and within k steps of the root of the group
+        self.reach: list[list[list[BoolRef]]] = [[[Bool(f'reach__{g}__{k}__{c}') for c in cells]
+                                                  for k in range(MAX_GROUP_SIZE)]
+                                                 for g in groups]
+        # prefix[g][c] is true if any of the cells up to and including c is in group g
+        self.prefix: list[list[BoolRef]] = [[Bool(f'prefix__{g}__{c}') for c in cells] for g in groups]
+
+        # The finite domain solver bit-blasts everything into a SAT solver with native pseudo-boolean constraints
+        self.solver = SolverFor('QF_FD')
+        self.solver.add(self.constraints())
+        if warm_layout is not None:
+            self.hint_layout(warm_layout)
+
+    def constraints(self) -> list[BoolRef]:
+        groups, cells = range(self.max_groups), range(len(self.cell_ids))
+        constraints = []
+
+        for c in cells:
+            # Every cell is part of at most one group, and has the type of its group
+            if self.max_groups > 1:
+                constraints.append(AtMost(*(self.member[g][c] for g in groups), 1))
+            constraints.append(self.in_group[c] == Or([self.member[g][c] for g in groups]))
+            constraints += [Implies(self.member[g][c], self.cell_slime[c] == self.slime[g]) for g in groups]
+
+        for g in groups:
+            members = self.member[g]
+            constraints.append(self.used[g] == Or(members))
+            constraints.append(Implies(self.used[g], Or([members[p] for p in self.pumpkins])))
+            constraints.append(Implies(self.used[g], AtLeast(*members, self.min_group_size)))
+            constraints.append(AtMost(*members, MAX_GROUP_SIZE))
+
+            # The root of a group is its first cell, and every cell of the group can be reached from the root in
+            # fewer than MAX_GROUP_SIZE steps within the group
+            reach = self.reach[g]
+            for c in cells:
+                constraints.append(self.root[g][c] == (members[c] if c == 0
+                                                       else And(members[c], Not(self.prefix[g][c - 1]))))
+                # Reaching a cell only has to be justified, not the other way around
+                constraints.append(Implies(reach[0][c], self.root[g][c]))
+                for k in range(1, MAX_GROUP_SIZE):
+                    constraints.append(Implies(reach[k][c], Or(reach[k - 1][c],
+                                                               And(members[c], Or([reach[k - 1][n]
+                                                                                   for n in self.neighbours[c]])))))
+                constraints.append(Implies(members[c], reach[MAX_GROUP_SIZE - 1][c]))
+
+        # Adjacent cells of different groups must have different types, otherwise they would stick together
+        for a in cells:
+            for b in self.neighbours[a]:
+                if a < b:
+                    constraints += [Implies(And(self.member[g][a], self.in_group[b], Not(self.member[g][b])),
+                                            self.cell_slime[a] != self.cell_slime[b])
+                                    for g in groups]
+
+        # Symmetry breaking: groups are used in order, a cell can only be in group g + 1 if an earlier cell is in
+        # group g, and swapping slime and honey everywhere gives the same layout
+        for g in groups:
+            for c in cells:
+                constraints.append(self.prefix[g][c] == (self.member[g][c] if c == 0
+                                                         else Or(self.prefix[g][c - 1], self.member[g][c])))
+                if g > 0:
+                    constraints.append(Implies(self.member[g][c], False if c == 0 else self.prefix[g - 1][c - 1]))
+            if g > 0:
+                constraints.append(Implies(self.used[g], self.used[g - 1]))
+        if self.max_groups:
+            constraints.append(self.slime[0])
+
+        constraints.append(PbGe([(self.in_group[p], 1) for p in self.pumpkins], self.pumpkin_target))
+        return constraints
+
+    def at_most_groups(self, group_count: int) -> BoolRef:
+        # Groups are used in order, so there are at most group_count groups if group group_count isn't used
+        return Not(self.used[group_count]) if group_count < self.max_groups else True
+
+    def layout(self, model) -> tuple[tuple[tuple[int, ...], ...], tuple[bool, ...]]:
+        group_grid = np.full(self.rows * self.cols, -1, dtype=np.int16)
+        group_types = []
+        for g in range(self.max_groups):
+            if not is_true(model.eval(self.used[g], model_completion=True)):
+                break
+            group_types.append(is_true(model.eval(self.slime[g], model_completion=True)))
+            for c, cell_id in enumerate(self.cell_ids):
+                if is_true(model.eval(self.member[g][c], model_completion=True)):
+                    group_grid[cell_id] = g
+        return tuple(tuple(row) for row in group_grid.reshape(self.rows, self.cols).tolist()), tuple(group_types)
+
+    def root_distances(self, group_cells: list[int]) -> dict[int, int]:
+        # The number of steps within the group from its root (its first cell) to every cell that can be reached
+        distances = {group_cells[0]: 0}
+        current_cells = [group_cells[0]]
+        members = set(group_cells)
+        while current_cells:
+            next_cells = []
+            for c in current_cells:
+                for n in self.neighbours[c]:
+                    if n in members and n not in distances:
+                        distances[n] = distances[c] + 1
+                        next_cells.append(n)
+            current_cells = next_cells
+        return distances
+
+    def read_layout(self, group_grid: tuple[tuple[int, ...], ...]) -> tuple[Union[SatResult, None], bool]:
+        """
+        Checks whether a layout satisfies the model, and numbers its groups the way the model does: by their first
+        cell. Slime and honey are assigned by 2-colouring the groups that touch each other. If the touching groups form
+        an odd cycle there is no such colouring, and the types that don't fit are assigned greedily.
+        Layouts whose groups are too small or can't alternate types are close enough to be read, e.g. as a bound for
+        the solver, but don't satisfy the model.
+        :param group_grid: The group number of every cell, -1 for cells without a group
+        :return: The layout as a SatResult, or None if it can't be read, and whether it satisfies the model
+        """
+        flat_groups = np.asarray(group_grid, dtype=np.int16).ravel()
+        if flat_groups.size != self.rows * self.cols:
+            return None, False
+        group_ids = flat_groups[self.cell_ids].tolist()
+        # Grouped cells that can't be part of a group in this model, e.g. because of the allowed mask
+        if np.count_nonzero(flat_groups != -1) != sum(1 for group_nr in group_ids if group_nr != -1):
+            return None, False
+
+        renumbered: dict[int, int] = {}
+        group_cells: list[list[int]] = []
+        for c, group_nr in enumerate(group_ids):
+            if group_nr == -1:
+                continue
+            if group_nr not in renumbered:
+                renumbered[group_nr] = len(group_cells)
+                group_cells.append([])
+            group_cells[renumbered[group_nr]].append(c)
+        pumpkins = set(self.pumpkins)
+        if sum(1 for p in self.pumpkins if group_ids[p] != -1) < self.pumpkin_target:
+            return None, False
+        for cells in group_cells:
+            if (len(cells) > MAX_GROUP_SIZE or pumpkins.isdisjoint(cells)
+                    or len(self.root_distances(cells)) != len(cells)):
+                return None, False
+        valid = all(len(cells) >= self.min_group_size for cells in group_cells)
+
+        # Groups that touch need different types, which is only possible if the touching groups form a bipartite graph
+        group_of = [-1 if group_nr == -1 else renumbered[group_nr] for group_nr in group_ids]
+        touching: list[set[int]] = [set() for _ in group_cells]
+        for c, g in enumerate(group_of):
+            for n in self.neighbours[c]:
+                if g != -1 and group_of[n] not in (-1, g):
+                    touching[g].add(group_of[n])
+        slime: list[Union[bool, None]] = [None] * len(group_cells)
+        for first_group in range(len(group_cells)):
+            if slime[first_group] is not None:
+                continue
+            slime[first_group] = True
+            current_groups = [first_group]
+            while current_groups:
+                g = current_groups.pop()
+                for other_group in touching[g]:
+                    if slime[other_group] is None:
+                        slime[other_group] = not slime[g]
+                        current_groups.append(other_group)
+                    elif slime[other_group] == slime[g]:
+                        valid = False
+
+        layout_grid = np.full(self.rows * self.cols, -1, dtype=np.int16)
+        layout_grid[self.cell_ids] = group_of
+        return SatResult(group_grid=tuple(tuple(row) for row in layout_grid.reshape(self.rows, self.cols).tolist()),
+                         group_types=tuple(slime),
+                         group_count=len(group_cells),
+                         optimal=len(group_cells) <= self.min_groups,
+                         seconds=0.0), valid
+
+    def hint_layout(self, layout: SatResult):
+        """
+        Sets the initial value of every variable to its value in a layout that was read by read_layout, so the solver
+        starts its search next to it. The layout doesn't have to satisfy the model
+        """
+        flat_groups = np.asarray(layout.group_grid, dtype=np.int16).ravel()
+        group_of = flat_groups[self.cell_ids].tolist()
+        distances = {}
+        for g in range(layout.group_count):
+            distances[g] = self.root_distances([c for c, group_nr in enumerate(group_of) if group_nr == g])
+
+        set_value = self.solver.set_initial_value
+        for g in range(self.max_groups):
+            used = g < layout.group_count
+            set_value(self.used[g], used)
+            set_value(self.slime[g], used and layout.group_types[g])
+            in_prefix = False
+            for c, group_nr in enumerate(group_of):
+                member = group_nr == g
+                set_value(self.member[g][c], member)
+                set_value(self.root[g][c], member and not in_prefix)
+                in_prefix = in_prefix or member
+                set_value(self.prefix[g][c], in_prefix)
+                for k in range(MAX_GROUP_SIZE):
+                    set_value(self.reach[g][k][c], member and distances[g][c] <= k)
+        for c, group_nr in enumerate(group_of):
+            set_value(self.in_group[c], group_nr != -1)
+            set_value(self.cell_slime[c], group_nr != -1 and layout.group_types[group_nr])
+
+    def solve(self, time_limit: float = None,
+              on_improvement: Callable[[SatResult], None] = None) -> Union[SatResult, None]:
+        """
+        Finds a layout with as few groups as possible. After every layout that is found, the number of groups is
+        tightened to one less than that layout in a new solver scope, until the solver proves that no better layout
+        exists or the time limit is hit. The model itself is left unchanged afterwards.
+        With a warm start, the first call already asks for fewer groups than the incumbent, so the incumbent is
+        returned (and proven optimal) as soon as the solver shows that it can't be improved. Without an incumbent, the
+        first call asks for at most group_bound groups, and the bound is dropped if the solver proves that it is too
+        tight.
+        :param time_limit: The maximum number of seconds to solve for
+        :param on_improvement: Called with every layout that improves on the previous one
+        :return: The best layout, or None if there is no valid layout or none was found in time
+        """
+        start = time.perf_counter()
+        best: Union[SatResult, None] = self.incumbent
+        group_bound = None if best is not None else self.group_bound
+        scopes = 0
+        try:
+            while best is None or best.group_count > self.min_groups:
+                if best is not None or group_bound is not None:
+                    self.solver.push()
+                    scopes += 1
+                    self.solver.add(self.at_most_groups(group_bound if best is None else best.group_count - 1))
+                if time_limit is not None:
+                    remaining = time_limit - (time.perf_counter() - start)
+                    if remaining <= 0:
+                        break
+                    self.solver.set('timeout', max(1, int(remaining * 1000)))
+                status = self.solver.check()
+                if status == unsat and best is None and group_bound is not None:
+                    # No valid layout has as few groups as the warm start, search again without the bound
+                    self.solver.pop()
+                    scopes -= 1
+                    group_bound = None
+                    continue
+                if status != sat:
+                    # unsat means that the previous layout is optimal, otherwise the solver ran out of time
+                    if best is not None:
+                        best = best._replace(optimal=status == unsat)
+                    break
+
+                group_grid, group_types = self.layout(self.solver.model())
+                best = SatResult(group_grid=group_grid,
+                                 group_types=group_types,
+                                 group_count=len(group_types),
+                                 optimal=len(group_types) <= self.min_groups,
+                                 seconds=time.perf_counter() - start)
+                if on_improvement is not None:
+                    on_improvement(best)
+        finally:
+            self.solver.pop(scopes)
+            self.solver.set('timeout', 4294967295)
+        return None if best is None else best._replace(seconds=time.perf_counter() - start)
+
+
+def heuristic_layout(blocks: np.ndarray) -> tuple[tuple[int, ...], ...]:
+    # The layout of Geode.heuristic_placement, improved by a local search
+    geode = CompactGeode(blocks).to_geode()
+    geode.heuristic_placement()
+    geode.improve_layout()
+    return geode.group_grid()
+
+
+def solve_blocks(blocks: np.ndarray, allowed: np.ndarray = None, *,
+                 time_limit: float = None,
+                 on_improvement: Callable[[SatResult], None] = None,
+                 warm_start: bool = False,
+                 **kwargs) -> Union[SatResult, None]:
+    """
+    Solves the layout of a geode exactly, see PumpkinModel for the other arguments
+    :param warm_start: Whether to run the heuristic first and only ask the solver to improve on its layout. If the
+                       heuristic layout has groups smaller than min_group_size or touching groups that can't get
+                       different types, the solver first looks for a layout with at most as many groups instead
+    """
+    if warm_start:
+        kwargs['warm_start'] = heuristic_layout(blocks)
+    return PumpkinModel(blocks, allowed, **kwargs).solve(time_limit, on_improvement)
+
+
+def _solve_cluster(blocks: np.ndarray, allowed: np.ndarray, deadline: Union[float, None], min_group_size: int,
+                   warm_start: Union[tuple[tuple[int, ...], ...], None], bridges_only: bool) -> Union[SatResult, None]:
+    # Runs in a worker process. The deadline is a wall-clock time, as perf_counter isn't shared between processes
+    time_limit = None if deadline is None else max(0.0, deadline - time.time())
+    return PumpkinModel(blocks, allowed, min_group_size=min_group_size, warm_start=warm_start,
+                        bridges_only=bridges_only).solve(time_limit)
+
+
+def solve_clusters(blocks: np.ndarray, *,
+                   time_limit: float = None,
+                   workers: int = None,
+                   min_group_size: int = MIN_GROUP_SIZE,
+                   warm_start: bool = False,
+                   bridges_only: bool = False) -> Union[SatResult, None]:
+    """
+    Solves the layout of a geode exactly, one cluster at a time. A cluster is a set of connected candidate cells (see
+    candidate_cells and CompactGeode.compute_clusters). Pumpkins in different clusters can never share a group, and
+    groups of different clusters never touch, so every cluster is an independent model. The size of the largest model
+    depends on the largest cluster instead of the whole geode, and clusters are solved in parallel processes.
+    A cluster of at most MAX_GROUP_SIZE cells is always a single group, so it doesn't need a solver at all.
+    :param blocks: A 2d array with the GeodeEnum int values of the geode
+    :param time_limit: The maximum number of seconds to solve for, for all clusters together
+    :param workers: The number of worker processes. Defaults to the number of processors
+    :param min_group_size: The minimum number of cells in a group
+    :param warm_start: Whether to start every cluster from the layout of the heuristic, see solve_blocks
+    :param bridges_only: Whether only pumpkins and bridges can be part of a group, see PumpkinModel
+    :return: The layouts of all clusters stitched together, or None if any cluster has no layout (in time). The
+             result is optimal if the layout of every cluster is
+    """
+    start = time.perf_counter()
+    deadline = None if time_limit is None else time.time() + time_limit
+    compact = CompactGeode(blocks)
+    labels = compact.compute_clusters(candidate_cells(compact, coverable_cells(compact, bridges_only), min_group_size))
+    heuristic_grid = np.asarray(heuristic_layout(blocks), dtype=np.int16).ravel() if warm_start else None
+
+    clusters = [labels == label for label in np.unique(labels[labels != -1]).tolist()]
+    # The pumpkins of a cluster that is too small for a group can't be part of any layout
+    if any(np.count_nonzero(in_cluster) < min_group_size for in_cluster in clusters):
+        return None
+
+    cluster_results: list[Union[SatResult, None]] = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for in_cluster in clusters:
+            if np.count_nonzero(in_cluster) <= MAX_GROUP_SIZE:
+                group_grid = np.where(in_cluster, 0, -1).reshape(compact.rows, compact.cols)
+                cluster_results.append(SatResult(group_grid=tuple(tuple(row) for row in group_grid.tolist()),
+                                                 group_types=(True,),
+                                                 group_count=1,
+                                                 optimal=True,
+                                                 seconds=0.0))
+                continue
+            cluster_warm_start = None
+            if heuristic_grid is not None:
+                cluster_warm_start = tuple(tuple(row) for row in np.where(in_cluster, heuristic_grid, -1)
+                                           .reshape(compact.rows, compact.cols).tolist())
+            cluster_results.append(executor.submit(_solve_cluster, blocks,
+                                                   in_cluster.reshape(compact.rows, compact.cols),
+                                                   deadline, min_group_size, cluster_warm_start, bridges_only))
+        cluster_results = [result if isinstance(result, SatResult) else result.result() for result in cluster_results]
+    if any(result is None for result in cluster_results):
+        return None
+
+    # The group numbers of every cluster are offset by the number of groups of the clusters before it
+    group_grid = np.full(compact.rows * compact.cols, -1, dtype=np.int16)
+    group_types = []
+    for result in cluster_results:
+        cluster_grid = np.asarray(result.group_grid, dtype=np.int16).ravel()
+        group_grid[cluster_grid != -1] = cluster_grid[cluster_grid != -1] + len(group_types)
+        group_types += result.group_types
+    return SatResult(group_grid=tuple(tuple(row) for row in group_grid.reshape(compact.rows, compact.cols).tolist()),
+                     group_types=tuple(group_types),
+                     group_count=len(group_types),
+                     optimal=all(result.optimal for result in cluster_results),
+                     seconds=time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve the slime/honey layout of a geode exactly')
+    parser.add_argument('--index', type=int, default=None,
+                        help='Index of a geode in geodes.txt, defaults to the grid of the tutorial')
+    parser.add_argument('--path', default='geodes.txt')
+    parser.add_argument('--time-limit', type=float, default=None)
+    parser.add_argument('--min-group-size', type=int, default=MIN_GROUP_SIZE)
+    parser.add_argument('--warm-start', action='store_true', help='Start from the layout of the heuristic')
+    parser.add_argument('--clusters', action='store_true', help='Solve every cluster separately, in parallel')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--bridges-only', action='store_true',
+                        help='Only cover pumpkins and bridges, which is faster but can miss the optimal layout')
+    args = parser.parse_args()
+
+    if args.index is None:
+        geode_blocks = input_to_blocks(TUTORIAL_GRID)
+    else:
+        from src.geode_corpus import text_to_blocks
+        from src.grid_reader import GeodeFile
+        with GeodeFile(args.path) as geode_file:
+            geode_blocks = text_to_blocks(geode_file.raw(args.index))
+
+    if args.clusters:
+        result = solve_clusters(geode_blocks, time_limit=args.time_limit, workers=args.workers,
+                                min_group_size=args.min_group_size, warm_start=args.warm_start,
+                                bridges_only=args.bridges_only)
+    else:
+        result = solve_blocks(geode_blocks, time_limit=args.time_limit, min_group_size=args.min_group_size,
+                              warm_start=args.warm_start, bridges_only=args.bridges_only,
+                              on_improvement=lambda improvement: print(f'{improvement.seconds:7.2f}s: '
+                                                                       f'{improvement.group_count} groups'))
+    if result is None:
+        print('No layout found')
+    else:
+        print(f'Found {result.group_count} groups in {result.seconds:.2f} seconds '
+              f'({"optimal" if result.optimal else "not proven optimal"})')
+        for row in result.group_grid:
+            print(' '.join('..' if group_nr == -1 else f'{group_nr:02}' for group_nr in row))
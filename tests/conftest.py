@@ -0,0 +1,30 @@
+import random
+from typing import Callable
+
+import pytest
+
+from src.Analyzers.geode import Geode
+from src.Enums.geode_enum import GeodeEnum
+from src.cell import Cell
+
+
+def random_geode(rng: random.Random, rows: int, cols: int) -> Geode:
+    # Pumpkins, obsidian and air in random proportions, with a border of air like the geodes in geodes.txt
+    pumpkin_share, obsidian_share = rng.uniform(0.3, 0.6), rng.uniform(0.0, 0.2)
+    grid = [[GeodeEnum.AIR if row in (0, rows - 1) or col in (0, cols - 1)
+             else rng.choices([GeodeEnum.PUMPKIN, GeodeEnum.OBSIDIAN, GeodeEnum.AIR],
+                              [pumpkin_share, obsidian_share, 1 - pumpkin_share - obsidian_share])[0]
+             for col in range(cols)]
+            for row in range(rows)]
+    return Geode([[Cell(row, col, grid[row][col]) for col in range(cols)] for row in range(rows)])
+
+
+@pytest.fixture
+def make_geode() -> Callable[[int], Geode]:
+    """
+    Builds a random geode from a seed
+    """
+    def make(seed: int) -> Geode:
+        rng = random.Random(seed)
+        return random_geode(rng, rng.randint(5, 14), rng.randint(5, 14))
+    return make
@@ -0,0 +1,77 @@
+import json
+import re
+import time
+
+import pytest
+
+from src.batch_projection import ProjectionRecord, read_bud_sets, resume_output, solve_bud_set, solve_projections
+
+# Small enough to solve to optimality in a moment
+BUDS = ((0, 0, 0), (2, 0, 0), (0, 3, 1), (5, 5, 5))
+
+
+def write_lines(path, lines: list[str]) -> str:
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+
+def test_read_bud_sets(tmp_path):
+    path = write_lines(tmp_path / 'buds.jsonl', [json.dumps([list(bud) for bud in BUDS]),
+                                                 '',
+                                                 json.dumps({'id': 'seed-7', 'budding_amethysts': [[1, 2, 3]]}),
+                                                 json.dumps({'budding_amethysts': []})])
+    assert list(read_bud_sets(path)) == [('1', BUDS), ('seed-7', ((1, 2, 3),)), ('4', ())]
+
+
+@pytest.mark.parametrize('line', ['[[0, 0, 0]', '{"id": "no buds"}', '[[0, 0]]', '[[0, 0, "1"]]', '7'])
+def test_malformed_line(tmp_path, line):
+    path = write_lines(tmp_path / 'buds.jsonl', [json.dumps([[0, 0, 0]]), line])
+    bud_sets = read_bud_sets(path)
+    # The geodes before the malformed line are still read
+    assert next(bud_sets) == ('1', ((0, 0, 0),))
+    with pytest.raises(ValueError, match=re.escape(f'{path}:2: ')):
+        next(bud_sets)
+
+
+def test_record_shape():
+    record = solve_bud_set(3, 'seed-7', BUDS, time_limit=None, deadline=None, exact=False)
+    assert record.status == 'optimal'
+    assert (record.index, record.name) == (3, 'seed-7')
+    assert record.projections == len(record.slices)
+    assert set(record.budding_amethysts) <= set(BUDS)
+
+    written = json.loads(record.to_json())
+    assert list(written) == list(ProjectionRecord._fields)
+    assert all(plane in 'xyz' and isinstance(coord_a, int) and isinstance(coord_b, int)
+               for plane, coord_a, coord_b in written['slices'])
+    # Tuples are written as lists, otherwise the record round-trips
+    assert ProjectionRecord(**{**written,
+                               'slices': tuple(map(tuple, written['slices'])),
+                               'budding_amethysts': tuple(map(tuple, written['budding_amethysts']))}) == record
+
+
+def test_budget_runs_out():
+    record = solve_bud_set(0, '1', BUDS, time_limit=None, deadline=time.time() - 1, exact=False)
+    assert record == ProjectionRecord(index=0, name='1', status='skipped', harvested_clusters=None,
+                                      projections=None, slices=(), budding_amethysts=(), seconds=0.0)
+
+
+def test_resume(tmp_path):
+    finished = solve_bud_set(0, 'a', BUDS, time_limit=None, deadline=None, exact=False)
+    skipped = solve_bud_set(1, 'b', BUDS, time_limit=None, deadline=time.time() - 1, exact=False)
+    # The earlier run was interrupted while it wrote the record of the third geode
+    output = tmp_path / 'output.jsonl'
+    output.write_text(finished.to_json() + '\n' + skipped.to_json() + '\n' + finished._replace(name='c').to_json()[:40])
+
+    assert resume_output(str(output)) == {'a'}
+    assert output.read_text() == finished.to_json() + '\n'
+    # The skipped and the unfinished geode are solved again, with their index in the input
+    bud_sets = [('a', BUDS), ('b', BUDS), ('c', BUDS[:2])]
+    records = sorted(solve_projections(bud_sets, workers=1, finished={'a'}))
+    assert [(record.index, record.name, record.status) for record in records] == [(1, 'b', 'optimal'),
+                                                                                (2, 'c', 'optimal')]
+
+
+def test_nothing_to_resume(tmp_path):
+    assert resume_output(str(tmp_path / 'output.jsonl')) == set()
+    assert not (tmp_path / 'output.jsonl').exists()
@@ -0,0 +1,51 @@
+import os
+from itertools import islice
+
+from src.batch_solver import solve_batch
+from src.grid_reader import GeodeFile
+from src.result_cache import ResultCache
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+
+def raw_geodes(count: int) -> list[str]:
+    with GeodeFile(GEODES_PATH) as geode_file:
+        return [geode_file.raw(index) for index in range(count)]
+
+
+def test_ordered_results_follow_the_input():
+    results = list(solve_batch(raw_geodes(4), workers=2, start=10))
+    assert [result.index for result in results] == [10, 11, 12, 13]
+
+
+def test_unordered_results_match_ordered_results():
+    geodes = raw_geodes(4)
+    ordered = list(solve_batch(geodes, workers=2))
+    unordered = sorted(solve_batch(geodes, workers=2, ordered=False, chunksize=3))
+    assert [result.group_grid for result in unordered] == [result.group_grid for result in ordered]
+
+
+def test_input_is_read_lazily():
+    read = []
+
+    def geodes():
+        for index, raw_geode in enumerate(raw_geodes(8)):
+            read.append(index)
+            yield raw_geode
+
+    for ordered in (True, False):
+        read.clear()
+        results = solve_batch(geodes(), workers=1, ordered=ordered)
+        next(results)
+        assert len(read) <= 3
+        results.close()
+
+
+def test_warm_cache_gives_the_cold_results(tmp_path):
+    geodes = raw_geodes(3)
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        cold = list(solve_batch(geodes, workers=1, cache=cache))
+        warm = list(islice(solve_batch(geodes, workers=1, cache=cache), 3))
+    assert [result.group_grid for result in warm] == [result.group_grid for result in cold]
+    assert [result.group_sizes for result in warm] == [result.group_sizes for result in cold]
+    assert all(result.seconds == 0.0 for result in warm)
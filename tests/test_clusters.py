@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from src.Analyzers.clusters import ClusterIndex
+from src.Analyzers.isolation import is_traversable
+from src.Enums.geode_enum import GeodeEnum
+
+
+def cluster_sets(index: ClusterIndex) -> set[frozenset]:
+    return {frozenset(cluster) for cluster in index.clusters}
+
+
+def rebuilt_clusters(cells) -> set[frozenset]:
+    index = ClusterIndex()
+    index.rebuild(cells)
+    return cluster_sets(index)
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_local_updates_match_a_rebuild(make_geode, seed):
+    geode = make_geode(seed)
+    rng = random.Random(seed)
+    index = ClusterIndex()
+    index.rebuild(geode.flat_cells)
+    candidates = [cell for cell in geode.flat_cells
+                  if cell.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]]
+    grouped = []
+
+    for step in range(2 * len(candidates)):
+        ungrouped = [cell for cell in candidates if not cell.has_group]
+        if grouped and (not ungrouped or rng.random() < 0.3):
+            # Roll back a placement
+            cell = grouped.pop(rng.randrange(len(grouped)))
+            cell.group_nr = -1
+            assert cell in index.restore(cell)
+        elif ungrouped:
+            cell = rng.choice(ungrouped)
+            old_cluster = index.members[index.cluster_of[cell]] - {cell}
+            cell.group_nr = step
+            pieces = index.remove(cell)
+            # The returned pieces are the clusters that the old cluster broke up into
+            assert ({frozenset(piece) for piece in pieces}
+                    == {cluster for cluster in rebuilt_clusters(geode.flat_cells) if cluster <= old_cluster})
+            grouped.append(cell)
+
+        assert cluster_sets(index) == rebuilt_clusters(geode.flat_cells)
+        assert set(index.cluster_of) == {cell for cell in geode.flat_cells if is_traversable(cell)}
+        assert all(index.cluster_of[cell] == cluster_id
+                   for cluster_id, members in index.members.items() for cell in members)
+
+
+def test_removing_an_untracked_cell(make_geode):
+    geode = make_geode(0)
+    index = ClusterIndex()
+    index.rebuild(geode.flat_cells)
+    obsidian_or_air = next(cell for cell in geode.flat_cells if not is_traversable(cell))
+    assert index.remove(obsidian_or_air) == []
+
+
+def pieces_around(cell, seeds) -> set[frozenset]:
+    # The pieces of traversable cells that the neighbours of the cell are part of
+    pieces = set()
+    for seed in seeds:
+        if any(seed in piece for piece in pieces):
+            continue
+        piece, current_cells = {seed}, {seed}
+        while current_cells:
+            current_cells = {neighbour
+                             for edge in current_cells
+                             for neighbour in edge.neighbours
+                             if neighbour not in piece and is_traversable(neighbour)}
+            piece |= current_cells
+        pieces.add(frozenset(piece))
+    return pieces
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_split_off_returns_every_piece_but_one(make_geode, seed):
+    geode = make_geode(seed)
+    index = ClusterIndex()
+    index.rebuild(geode.flat_cells)
+    for cell in [cell for cell in geode.flat_cells if cell in index.cluster_of]:
+        seeds = [neighbour for neighbour in cell.neighbours if neighbour in index.cluster_of]
+        if len(seeds) < 2:
+            continue
+        # Take the cell out of the index without updating the clusters, so the search starts from the seeds
+        cell.group_nr = 0
+        pieces = pieces_around(cell, seeds)
+        cluster_id = index.cluster_of.pop(cell)
+        split_off = {frozenset(piece) for piece in index._split_off(seeds)}
+        index.cluster_of[cell] = cluster_id
+        cell.group_nr = -1
+
+        # Exactly one piece keeps the label of the old cluster
+        assert split_off < pieces
+        assert len(split_off) == len(pieces) - 1
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.Utils.dihedral import TRANSFORMS, canonicalize, inverse_transform, transform
+from src.geode_corpus import text_to_blocks
+from src.grid_reader import GeodeFile
+from src.result_cache import ResultCache, cached_heuristic_placement, to_canonical_groups
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+GRID = np.arange(12).reshape(3, 4)
+
+
+@pytest.mark.parametrize('transform_nr', TRANSFORMS)
+def test_inverse_transform_undoes_transform(transform_nr):
+    assert np.array_equal(inverse_transform(transform(GRID, transform_nr), transform_nr), GRID)
+
+
+def test_transforms_are_distinct():
+    assert len({transform(GRID, transform_nr).tobytes() + bytes(transform(GRID, transform_nr).shape)
+                for transform_nr in TRANSFORMS}) == len(TRANSFORMS)
+
+
+@pytest.mark.parametrize('transform_nr', TRANSFORMS)
+def test_canonical_form_is_shared_by_all_transforms(transform_nr):
+    canonical, canonical_nr = canonicalize(GRID)
+    transformed_canonical, transformed_nr = canonicalize(transform(GRID, transform_nr))
+
+    assert np.array_equal(transformed_canonical, canonical)
+    assert np.array_equal(transform(transform(GRID, transform_nr), transformed_nr), canonical)
+
+
+def test_cached_layout_does_not_depend_on_the_orientation_solved_first(tmp_path):
+    # The heuristic gives a different number of groups for some orientations of this geode
+    with GeodeFile(GEODES_PATH) as geode_file:
+        blocks = text_to_blocks(geode_file.raw(7))
+
+    canonical_layouts = set()
+    for transform_nr in TRANSFORMS:
+        transformed = np.ascontiguousarray(transform(blocks, transform_nr))
+        geode = CompactGeode(transformed).to_geode()
+        with ResultCache(str(tmp_path / f'cache_{transform_nr}.sqlite')) as cache:
+            assert not cached_heuristic_placement(geode, cache)
+        canonical_layouts.add(to_canonical_groups(geode.group_grid(), geode.canonical_form()[1]))
+    assert len(canonical_layouts) == 1
@@ -0,0 +1,27 @@
+from src.Enums.geode_enum import GeodeEnum
+from src.grid_reader import parse_geode
+
+# Placing the source pumpkin of the second group splits its cluster into clusters that are too large to absorb, so the
+# source is rolled back and the group stays empty
+ROLLED_BACK_SOURCE = '\n'.join([
+    '                ',
+    '    .           ',
+    '  .       . .   ',
+    '    . . .   .   ',
+    '    . .   .     ',
+    '  .         .   ',
+    '    .     . .   ',
+    '    . .   .     ',
+    '        .   .   ',
+    '      .         ',
+    '                ',
+])
+
+
+def test_rolled_back_source_is_placed():
+    geode = parse_geode(ROLLED_BACK_SOURCE)
+    geode.heuristic_placement()
+
+    assert all(cell.has_group for cell in geode.cells if cell.projected_block == GeodeEnum.PUMPKIN)
+    assert all(len(group) for group in geode.groups.values())
+    assert [len(group) for group in geode.groups.values()] == [12, 11, 8]
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.Enums.geode_enum import GeodeEnum
+from src.geode_corpus import (GeodeCorpus, blocks_to_text, corpus_to_text, pack_blocks, text_to_blocks,
+                              text_to_corpus, write_corpus)
+from src.grid_reader import raw_geode_generator
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+
+def test_text_round_trip(tmp_path):
+    corpus_path = str(tmp_path / 'geodes.bin')
+    text_path = str(tmp_path / 'geodes.txt')
+    text_to_corpus(GEODES_PATH, corpus_path)
+    corpus_to_text(corpus_path, text_path)
+
+    assert list(raw_geode_generator(text_path)) == list(raw_geode_generator(GEODES_PATH))
+
+
+def test_corpus_matches_text(tmp_path):
+    corpus_path = str(tmp_path / 'geodes.bin')
+    text_to_corpus(GEODES_PATH, corpus_path)
+    with GeodeCorpus(corpus_path) as corpus:
+        raw_geodes = list(raw_geode_generator(GEODES_PATH))
+        assert len(corpus) == len(raw_geodes)
+        for index in (0, 1, len(corpus) - 1, -1):
+            assert np.array_equal(corpus.blocks(index), text_to_blocks(raw_geodes[index]))
+        # Bridges are derived from the other blocks when the geode is built
+        assert (corpus.get(0).block_array() == corpus.compact(0).blocks.reshape(corpus.blocks(0).shape)).all()
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 5), (4, 4), (7, 9)])
+def test_blocks_round_trip(tmp_path, shape):
+    rng = np.random.default_rng(sum(shape))
+    geodes = [rng.integers(0, 4, size=shape, dtype=np.uint8) for _ in range(3)]
+    corpus_path = str(tmp_path / 'geodes.bin')
+    # Records are written as the generator produces them
+    write_corpus(corpus_path, (blocks for blocks in geodes))
+
+    with GeodeCorpus(corpus_path) as corpus:
+        assert [blocks.tolist() for blocks in corpus.iter_blocks()] == [blocks.tolist() for blocks in geodes]
+    assert len(pack_blocks(geodes[0])) == 4 + -(-geodes[0].size // 4)
+
+
+def test_empty_corpus(tmp_path):
+    corpus_path = str(tmp_path / 'empty.bin')
+    write_corpus(corpus_path, [])
+    with GeodeCorpus(corpus_path) as corpus:
+        assert len(corpus) == 0
+        with pytest.raises(IndexError):
+            corpus.blocks(0)
+
+
+def test_close_twice(tmp_path):
+    corpus_path = str(tmp_path / 'geodes.bin')
+    write_corpus(corpus_path, [text_to_blocks(blocks_to_text(np.full((2, 3), GeodeEnum.PUMPKIN.int_value)))])
+    corpus = GeodeCorpus(corpus_path)
+    with corpus:
+        assert len(corpus) == 1
+    corpus.close()
+    assert len(corpus) == 0
+
+
+def test_not_a_corpus(tmp_path):
+    path = tmp_path / 'geodes.txt'
+    path.write_bytes(b'. . \n\n' * 8)
+    with pytest.raises(ValueError):
+        GeodeCorpus(str(path))
@@ -0,0 +1,61 @@
+import mmap
+import os
+
+import pytest
+
+from src.grid_reader import GeodeFile, raw_geode_generator
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+
+def test_geodes_match_the_generator(tmp_path):
+    with GeodeFile(GEODES_PATH, index_path=str(tmp_path / 'geodes.idx')) as geode_file:
+        assert list(geode_file.iter_raw()) == list(raw_geode_generator(GEODES_PATH))
+
+
+def test_cached_index_is_reused(tmp_path):
+    index_path = str(tmp_path / 'geodes.idx')
+    with GeodeFile(GEODES_PATH, index_path=index_path) as geode_file:
+        offsets = geode_file.offsets
+    with GeodeFile(GEODES_PATH, index_path=index_path) as geode_file:
+        assert geode_file._load_index() == offsets
+        assert geode_file.offsets == offsets
+
+
+def test_windows_line_endings(tmp_path):
+    with open(GEODES_PATH, 'rb') as geodes:
+        content = geodes.read()
+    path = tmp_path / 'geodes_crlf.txt'
+    path.write_bytes(content.replace(b'\n', b'\r\n'))
+
+    expected = list(raw_geode_generator(GEODES_PATH))
+    with GeodeFile(str(path)) as geode_file:
+        assert len(geode_file) == len(expected)
+        assert geode_file.raw(0) == expected[0]
+        assert geode_file.raw(-1) == expected[-1]
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+    with GeodeFile(str(path)) as geode_file:
+        assert len(geode_file) == 0
+        assert list(geode_file) == []
+        with pytest.raises(IndexError):
+            geode_file.raw(0)
+
+
+def test_file_is_closed_when_mapping_fails(tmp_path, monkeypatch):
+    path = tmp_path / 'geodes.txt'
+    path.write_bytes(b'. \n\n')
+    opened = []
+
+    def failing_mmap(fileno, *args, **kwargs):
+        opened.append(fileno)
+        raise OSError('cannot map')
+
+    monkeypatch.setattr(mmap, 'mmap', failing_mmap)
+    with pytest.raises(OSError):
+        GeodeFile(str(path))
+    with pytest.raises(OSError):
+        os.fstat(opened[0])
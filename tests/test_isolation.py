@@ -0,0 +1,113 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.Analyzers.isolation import batched_isolation, compute_isolation, is_traversable
+from src.Enums.geode_enum import GeodeEnum
+from src.grid_reader import GeodeFile
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+
+def group_random_cells(geode, seed: int):
+    # Some cells are grouped, so the traversable cells split up into several components
+    rng = random.Random(seed)
+    for cell in geode.flat_cells:
+        if cell.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE] and rng.random() < 0.3:
+            cell.group_nr = 0
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_batched_matches_scalar(make_geode, seed):
+    geode = make_geode(seed)
+    group_random_cells(geode, seed)
+    traversable = np.array([is_traversable(cell) for cell in geode.flat_cells])
+    pumpkins = traversable & np.array([cell.projected_block is GeodeEnum.PUMPKIN for cell in geode.flat_cells])
+    average_block_distance, reachable_pumpkins, reachable_cells = batched_isolation(traversable, pumpkins,
+                                                                                     geode.neighbour_table)
+
+    for cell_id, cell in enumerate(geode.flat_cells):
+        expanded = compute_isolation(cell)
+        assert average_block_distance[cell_id] == pytest.approx(cell.average_block_distance)
+        assert reachable_pumpkins[cell_id] == cell.reachable_pumpkins
+        assert reachable_cells[cell_id] == expanded
+
+
+@pytest.mark.parametrize('index', range(0, 40, 8))
+@pytest.mark.parametrize('grouped', [False, True])
+def test_compact_geode_matches_scalar(index, grouped):
+    with GeodeFile(GEODES_PATH) as geode_file:
+        geode = geode_file.get(index)
+    if grouped:
+        group_random_cells(geode, index)
+    compact = CompactGeode.from_geode(geode)
+    assert np.array_equal(compact.blocks, [cell.projected_block.int_value for cell in geode.flat_cells])
+    compact.average_isolation()
+
+    for cell_id, cell in enumerate(geode.flat_cells):
+        compute_isolation(cell)
+        assert compact.average_block_distance[cell_id] == pytest.approx(cell.average_block_distance)
+        assert compact.reachable_pumpkins[cell_id] == cell.reachable_pumpkins
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batched_sources(make_geode, seed):
+    geode = make_geode(seed)
+    group_random_cells(geode, seed)
+    traversable = np.array([is_traversable(cell) for cell in geode.flat_cells])
+    pumpkins = traversable & np.array([cell.projected_block is GeodeEnum.PUMPKIN for cell in geode.flat_cells])
+    all_cells = batched_isolation(traversable, pumpkins, geode.neighbour_table)
+
+    sources = np.array(random.Random(seed).sample(range(len(geode.flat_cells)), 10), dtype=np.int64)
+    some_cells = batched_isolation(traversable, pumpkins, geode.neighbour_table, sources)
+    for all_values, some_values in zip(all_cells, some_cells):
+        assert np.array_equal(all_values[sources], some_values)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_engine_updates_match_a_full_recompute(make_geode, seed):
+    geode = make_geode(seed)
+    rng = random.Random(seed)
+    geode.average_isolation()
+    candidates = [cell for cell in geode.flat_cells if cell.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]]
+    group = geode.new_group()
+    for cell in rng.sample(candidates, len(candidates) // 3):
+        # The group notifies the geode, which invalidates the affected cells
+        group.add_cell(cell)
+        frontier = set(rng.sample(geode.flat_cells, 10))
+        geode.average_isolation(frontier)
+        for frontier_cell in frontier:
+            average_block_distance, reachable_pumpkins = (frontier_cell.average_block_distance,
+                                                          frontier_cell.reachable_pumpkins)
+            compute_isolation(frontier_cell)
+            assert average_block_distance == frontier_cell.average_block_distance
+            assert reachable_pumpkins == frontier_cell.reachable_pumpkins
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_engine_keeps_every_fresh_metric_up_to_date(make_geode, seed):
+    geode = make_geode(seed)
+    rng = random.Random(seed)
+    geode.average_isolation()
+    candidates = [cell for cell in geode.flat_cells if cell.projected_block in [GeodeEnum.PUMPKIN, GeodeEnum.BRIDGE]]
+    group = geode.new_group()
+    for _ in range(2 * len(candidates)):
+        # Cells join the group, and sometimes leave it again like a rolled back placement
+        if group.cells and rng.random() < 0.3:
+            group.remove_cell(rng.choice(list(group.cells)))
+        else:
+            group.add_cell(rng.choice(candidates))
+        geode.average_isolation(set(rng.sample(geode.flat_cells, 5)))
+
+        # The metric of every cell that isn't stale was updated in place, and matches a search from scratch
+        engine = geode.isolation_engine
+        for cell in geode.flat_cells:
+            if cell in engine.stale:
+                continue
+            average_block_distance, reachable_pumpkins = cell.average_block_distance, cell.reachable_pumpkins
+            compute_isolation(cell)
+            assert average_block_distance == cell.average_block_distance
+            assert reachable_pumpkins == cell.reachable_pumpkins
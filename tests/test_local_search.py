@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from src.Analyzers.local_search import LocalSearch, layout_violations
+from src.Enums.geode_enum import GeodeEnum
+from src.grid_reader import GeodeFile, parse_geode
+from src.group import MAX_GROUP_SIZE
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+# The air cell between the four pumpkins in the middle is a bridge, and so is the air cell right of the top pumpkin
+REROUTE_GEODE = '\n'.join([
+    '            ',
+    '    ##..    ',
+    '    ..  ..  ',
+    '    ##..##  ',
+    '            ',
+])
+# Two rows of four pumpkins
+SWAP_GEODE = '\n'.join([
+    '            ',
+    '  ........  ',
+    '  ........  ',
+    '            ',
+])
+
+
+def group_grid(rows: int, cols: int, groups: dict[tuple[int, int], int]) -> tuple[tuple[int, ...], ...]:
+    return tuple(tuple(groups.get((row, col), -1) for col in range(cols)) for row in range(rows))
+
+
+def singleton_groups(geode):
+    # Every pumpkin in a group of its own, which is a valid but poor layout
+    pumpkins = [cell for cell in geode.flat_cells if cell.projected_block is GeodeEnum.PUMPKIN]
+    geode.apply_group_grid(group_grid(len(geode.grid), len(geode.grid[0]),
+                                      {(cell.row, cell.col): group_nr for group_nr, cell in enumerate(pumpkins)}))
+
+
+def checked_moves(geode) -> LocalSearch:
+    # A local search that checks the layout after every move
+    search = LocalSearch(geode)
+    for name in ['drop_bridge', 'merge_groups', 'reroute_bridge', 'dissolve_group', 'balance_groups', 'swap_cells']:
+        def checked(move=getattr(search, name)):
+            applied = move()
+            assert layout_violations(geode) == []
+            return applied
+        setattr(search, name, checked)
+    return search
+
+
+@pytest.mark.parametrize('index', range(0, 40, 4))
+def test_moves_keep_heuristic_layouts_valid(index):
+    with GeodeFile(GEODES_PATH) as geode_file:
+        geode = geode_file.get(index)
+    geode.heuristic_placement()
+    groups = len(geode.groups)
+
+    checked_moves(geode).run()
+    assert layout_violations(geode) == []
+    assert len(geode.groups) <= groups
+    assert sorted(geode.groups) == list(range(len(geode.groups)))
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_moves_keep_random_layouts_valid(make_geode, seed):
+    geode = make_geode(seed)
+    singleton_groups(geode)
+    groups = len(geode.groups)
+
+    checked_moves(geode).run()
+    assert layout_violations(geode) == []
+    assert len(geode.groups) <= groups
+    assert all(len(group) <= MAX_GROUP_SIZE for group in geode.groups.values())
+
+
+def test_reroute_bridge():
+    geode = parse_geode(REROUTE_GEODE)
+    bridge, detour = geode.grid[2][3], geode.grid[1][4]
+    assert bridge.projected_block is GeodeEnum.BRIDGE and detour.projected_block is GeodeEnum.BRIDGE
+    # The two pumpkins left of and below the bridge are in groups of their own, the other two pumpkins are connected
+    # through the bridge
+    geode.apply_group_grid(group_grid(5, 6, {(2, 2): 0, (3, 3): 1, (1, 3): 2, (2, 3): 2, (2, 4): 2}))
+
+    assert LocalSearch(geode).reroute_bridge()
+    assert layout_violations(geode) == []
+    assert len(geode.groups) == 2
+    assert bridge.group_nr == geode.grid[2][2].group_nr == geode.grid[3][3].group_nr
+    assert detour.group_nr == geode.grid[1][3].group_nr == geode.grid[2][4].group_nr
+
+
+def test_swap_cells():
+    geode = parse_geode(SWAP_GEODE)
+    # Two interlocking groups of four, which touch in four places
+    geode.apply_group_grid(group_grid(4, 6, {(1, 1): 0, (1, 2): 0, (1, 3): 0, (2, 1): 0,
+                                             (2, 2): 1, (2, 3): 1, (2, 4): 1, (1, 4): 1}))
+
+    assert LocalSearch(geode).swap_cells()
+    assert layout_violations(geode) == []
+    # The groups are now squares that only touch in two places
+    assert geode.group_grid()[1:3] == ((-1, 0, 0, 1, 1, -1), (-1, 0, 0, 1, 1, -1))
+    assert not LocalSearch(geode).swap_cells()
+
+
+def test_swap_cells_between_full_groups():
+    cols = MAX_GROUP_SIZE + 2
+    geode = parse_geode('\n'.join(['  ' * cols] + ['  ' + '..' * MAX_GROUP_SIZE + '  '] * 2 + ['  ' * cols]))
+    # Two full groups that can't be merged or balanced, with a step in the line between them
+    half = MAX_GROUP_SIZE // 2
+    groups = {(row, col): int(col > half + (row == 1) - (row == 2))
+              for row in range(1, 3) for col in range(1, MAX_GROUP_SIZE + 1)}
+    geode.apply_group_grid(group_grid(4, cols, groups))
+    assert sorted(len(group) for group in geode.groups.values()) == [MAX_GROUP_SIZE, MAX_GROUP_SIZE]
+
+    assert checked_moves(geode).run() == 1
+    assert sorted(len(group) for group in geode.groups.values()) == [MAX_GROUP_SIZE, MAX_GROUP_SIZE]
+    # The line between the groups is straight
+    assert all(geode.grid[row][col].group_nr == geode.grid[1][1].group_nr
+               for row in range(1, 3) for col in range(1, half + 1))
+
+
+def test_layout_violations():
+    geode = parse_geode(REROUTE_GEODE)
+    assert layout_violations(geode) == ['Pumpkin at 1, 3 has no group', 'Pumpkin at 2, 2 has no group',
+                                        'Pumpkin at 2, 4 has no group', 'Pumpkin at 3, 3 has no group']
+    geode.apply_group_grid(group_grid(5, 6, {(2, 2): 0, (3, 3): 0, (1, 3): 1, (2, 4): 1, (0, 0): 1}))
+    assert layout_violations(geode) == ['Group 0 is not connected',
+                                        'Group 1 contains cells that are not pumpkins or bridges',
+                                        'Group 1 is not connected']
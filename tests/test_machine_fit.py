@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from src.Analyzers.machine_fit import FOOTPRINTS, Placement, fit_geode, fit_machines
+from src.Enums.axis_enum import Axis
+from src.Enums.flying_machine_enum import FlyingMachineEnum
+from src.Enums.geode_enum import GeodeEnum
+
+
+def brute_force_placements(blocks: np.ndarray, group_grid: np.ndarray) -> set[Placement]:
+    # Tries every footprint at every offset, and checks the cells under the engine one by one
+    rows, cols = blocks.shape
+    placements = set()
+    for (machine, axis, transform_nr), footprint in FOOTPRINTS.items():
+        height, width = footprint.shape
+        for row in range(-(height - 1), rows):
+            for col in range(-(width - 1), cols):
+                engine_cells = [(row + offset_row, col + offset_col)
+                                for offset_row, offset_col in zip(*np.nonzero(footprint))
+                                if 0 <= row + offset_row < rows and 0 <= col + offset_col < cols]
+                if any(blocks[cell] == GeodeEnum.OBSIDIAN.int_value for cell in engine_cells):
+                    continue
+                groups = {int(group_grid[cell]) for cell in engine_cells} - {-1}
+                if len(groups) == 1:
+                    placements.add(Placement(group_nr=groups.pop(), machine=machine, axis=axis,
+                                             transform_nr=transform_nr, row=row, col=col))
+    return placements
+
+
+@pytest.mark.parametrize('seed', range(15))
+def test_matches_brute_force(make_geode, seed):
+    geode = make_geode(seed)
+    geode.heuristic_placement()
+    blocks, group_grid = geode.block_array(), np.array(geode.group_grid(), dtype=np.int16)
+
+    placements = fit_geode(geode)
+    assert sorted(placements) == sorted(set(group_grid[group_grid != -1].tolist()))
+    assert all(placement.group_nr == group_nr for group_nr, group_placements in placements.items()
+               for placement in group_placements)
+    fitted = [placement for group_placements in placements.values() for placement in group_placements]
+    assert len(fitted) == len(set(fitted))
+    assert set(fitted) == brute_force_placements(blocks, group_grid)
+
+
+def test_mirrored_footprints():
+    # The only room around the group is an L that only fits the L shape double pusher mirrored or rotated
+    blocks = np.full((5, 5), GeodeEnum.OBSIDIAN.int_value, dtype=np.uint8)
+    blocks[1, 1] = GeodeEnum.PUMPKIN.int_value
+    blocks[1, 2] = blocks[2, 1] = GeodeEnum.AIR.int_value
+    group_grid = np.full((5, 5), -1, dtype=np.int16)
+    group_grid[1, 1] = 0
+
+    l_shapes = [placement for placement in fit_machines(blocks, group_grid)[0]
+                if placement.machine is FlyingMachineEnum.L_SHAPE_DOUBLE_PUSHER]
+    assert [(placement.axis, placement.transform_nr, placement.row, placement.col) for placement in l_shapes] == [
+        (Axis.Horizontal, 4, 1, 1), (Axis.Vertical, 1, 1, 1)]
@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import time
+
+from src.grid_reader import GeodeFile, parse_geode
+from src.multi_start import iter_improvements, layout_score, multi_start_search
+
+GEODES_PATH = os.path.join(os.path.dirname(__file__), '..', 'geodes.txt')
+
+
+def raw_geode(index: int) -> str:
+    with GeodeFile(GEODES_PATH) as geode_file:
+        return geode_file.raw(index)
+
+
+def test_improvements_start_with_the_heuristic():
+    raw = raw_geode(5)
+    geode = parse_geode(raw)
+    geode.heuristic_placement()
+
+    improvements = list(iter_improvements(raw, restarts=4, workers=1))
+    assert improvements[0].seed == 0
+    assert improvements[0].score == layout_score(geode)
+    assert all((later.score, later.seed) < (earlier.score, earlier.seed)
+               for earlier, later in zip(improvements, improvements[1:]))
+    best = multi_start_search(raw, restarts=4, workers=1)
+    assert (best.seed, best.group_grid) == (improvements[-1].seed, improvements[-1].group_grid)
+
+
+def test_time_limit_kills_running_variants():
+    start = time.perf_counter()
+    multi_start_search(raw_geode(5), restarts=10_000, workers=2, time_limit=1.0, local_search=True)
+
+    # Variants that were still running at the time limit don't outlive the search
+    assert time.perf_counter() - start < 5.0
+    assert multiprocessing.active_children() == []
+
+
+def test_tiny_time_limit_returns_the_heuristic():
+    raw = raw_geode(5)
+    geode = parse_geode(raw)
+    geode.heuristic_placement()
+
+    # The time limit is over before any variant can finish, but the unperturbed heuristic always runs. Variants that
+    # finished while it ran can still improve on it
+    improvements = list(iter_improvements(raw, restarts=64, workers=1, time_limit=1e-6))
+    assert improvements[0].seed == 0
+    assert improvements[0].group_grid == geode.group_grid()
+    best = multi_start_search(raw, restarts=64, workers=1, time_limit=1e-6)
+    assert best.score <= layout_score(geode)
+    assert multiprocessing.active_children() == []
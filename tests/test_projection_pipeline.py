@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.Analyzers.local_search import layout_violations
+from src.Enums.geode_enum import GeodeEnum
+from src.grid_reader import parse_geode
+from src.projection_pipeline import placed_geodes, projected_blocks, run_pipeline
+from src.sat_projection import Coord, PlaneEnum, ProjectionProblem
+
+# Small enough to solve to optimality in a moment
+BUDS = {Coord(0, 0, 0), Coord(2, 0, 0), Coord(0, 3, 1), Coord(1, 4, 3), Coord(5, 5, 5)}
+# The characters of the geodes.txt format
+CHARS = {GeodeEnum.AIR.int_value: '  ', GeodeEnum.PUMPKIN.int_value: '..', GeodeEnum.OBSIDIAN.int_value: '##'}
+
+
+def group_sizes(geode) -> list[int]:
+    return [len(geode.groups[group_nr]) for group_nr in sorted(geode.groups)]
+
+
+def test_pipeline_matches_the_heuristic_layout():
+    solution = ProjectionProblem(BUDS).solve()
+    planes = list(projected_blocks(solution))
+    assert [plane for plane, _ in planes] == list(PlaneEnum)
+    # Every active slice is a pumpkin in the projection of its plane
+    assert sum(int(np.count_nonzero(blocks == GeodeEnum.PUMPKIN.int_value)) for _, blocks in planes) == \
+        solution.projections
+
+    for (plane, blocks), (placed_plane, geode) in zip(planes, placed_geodes(planes)):
+        assert placed_plane is plane
+        assert layout_violations(geode) == []
+        # The same layout as going through the geodes.txt format by hand
+        expected = parse_geode('\n'.join(''.join(CHARS[value] for value in row) for row in blocks.tolist()))
+        expected.heuristic_placement()
+        assert group_sizes(geode) == group_sizes(expected)
+        assert geode.group_grid() == expected.group_grid()
+
+
+def test_run_pipeline():
+    geodes = dict(run_pipeline(BUDS))
+    assert list(geodes) == list(PlaneEnum)
+    assert all(geode.groups and layout_violations(geode) == [] for geode in geodes.values())
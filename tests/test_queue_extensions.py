@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from src.Utils.collections.queue_extensions import IndexedPriorityQueue
+
+
+def assert_heap_invariant(queue: IndexedPriorityQueue):
+    assert len(queue.index) == len(queue.heap)
+    for position, (priority, item) in enumerate(queue.heap):
+        assert queue.index[item] == position
+        if position:
+            assert not priority < queue.heap[(position - 1) >> 1][0]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_operations_match_a_dict(seed):
+    rng = random.Random(seed)
+    queue = IndexedPriorityQueue()
+    expected: dict[int, int] = {}
+
+    for _ in range(500):
+        operation = rng.random()
+        item = rng.randrange(40)
+        if operation < 0.5:
+            # Adds the item or changes its priority
+            priority = rng.randrange(20)
+            queue.push(item, priority)
+            expected[item] = priority
+        elif operation < 0.65:
+            queue.discard(item)
+            expected.pop(item, None)
+        elif operation < 0.75 and item in expected:
+            queue.remove(item)
+            del expected[item]
+        elif expected:
+            lowest = min(expected.values())
+            # Ties are broken arbitrarily, but the priority must be the lowest one
+            assert expected.pop(queue.pop()) == lowest
+
+        assert_heap_invariant(queue)
+        assert len(queue) == len(expected)
+        assert all(item_ in queue and queue.priority(item_) == priority_ for item_, priority_ in expected.items())
+
+
+def test_pop_order():
+    queue = IndexedPriorityQueue()
+    for item, priority in [('a', 5), ('b', 1), ('c', 3), ('d', 4)]:
+        queue.push(item, priority)
+    queue.push('a', 0)
+    queue.push('b', 6)
+    queue.remove('c')
+
+    assert [queue.pop() for _ in range(len(queue))] == ['a', 'd', 'b']
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_remove_missing_item():
+    queue = IndexedPriorityQueue()
+    queue.push('a', 1)
+    with pytest.raises(KeyError):
+        queue.remove('b')
+    queue.discard('b')
+    assert 'a' in queue and 'b' not in queue
@@ -0,0 +1,39 @@
+import pickle
+
+from src.sat_projection import Coord, PlaneEnum, ProjectionProblem, Slice, decompress, geode_compressed
+
+
+def test_equal_coords_and_slices():
+    assert Coord(1, 2, 3) == Coord(1, 2, 3) and hash(Coord(1, 2, 3)) == hash(Coord(1, 2, 3))
+    assert Coord(1, 2, 3) != Coord(3, 2, 1)
+    assert Slice(PlaneEnum.y, 1, 3) == PlaneEnum.y.to_slice(Coord(1, 2, 3))
+    assert Slice(PlaneEnum.x, 1, 3) != Slice(PlaneEnum.y, 1, 3)
+    assert len({Coord(0, 0, 0).add(1, 0, 0), Coord(2, 0, 0).add(-1, 0, 0)}) == 1
+
+
+def test_pickle():
+    coord, slice_ = Coord(1, 2, 3), Slice(PlaneEnum.z, 4, 5)
+    assert pickle.loads(pickle.dumps(coord)) == coord
+    assert pickle.loads(pickle.dumps(slice_)) == slice_
+
+
+def test_built_in_geode():
+    solution = ProjectionProblem(decompress(geode_compressed)).solve()
+    assert (solution.harvested_clusters, solution.projections, solution.optimal) == (360, 201, True)
+
+
+def test_exact_mode_is_at_least_as_good():
+    # The exact optimum of the built-in geode harvests more clusters, with more projections
+    incomplete = ProjectionProblem(decompress(geode_compressed)).solve()
+    exact = ProjectionProblem(decompress(geode_compressed), exact=True).solve()
+    assert (exact.harvested_clusters, exact.projections, exact.optimal) == (366, 204, True)
+    assert exact.harvested_clusters >= incomplete.harvested_clusters
+
+
+def test_exact_mode_on_a_small_geode():
+    # Six buds for which the incomplete constraint misses the optimum by a cluster
+    buds = {Coord(*bud) for bud in [(1, 1, 1), (2, 0, 0), (2, 4, 1), (3, 0, 0), (3, 0, 1), (3, 1, 2)]}
+    incomplete = ProjectionProblem(buds).solve()
+    exact = ProjectionProblem(buds, exact=True).solve()
+    assert (incomplete.harvested_clusters, incomplete.projections, incomplete.optimal) == (27, 20, True)
+    assert (exact.harvested_clusters, exact.projections, exact.optimal) == (28, 21, True)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from src.Analyzers.compact_geode import CompactGeode
+from src.sat_pumpkin_solver import (PumpkinModel, candidate_cells, coverable_cells, input_to_blocks, solve_blocks,
+                                    solve_clusters)
+
+# 24 pumpkins, which need at least two groups of at most 12 cells. The obsidian keeps groups to the pumpkins
+PUMPKIN_BLOCK = '\n'.join([
+    'oooooooooo',
+    'oppppppppo',
+    'oppppppppo',
+    'oppppppppo',
+    'oooooooooo',
+])
+
+
+def layout(groups: dict[int, list[tuple[int, int]]]) -> tuple[tuple[int, ...], ...]:
+    group_grid = [[-1] * 10 for _ in range(5)]
+    for group_nr, cells in groups.items():
+        for row, col in cells:
+            group_grid[row][col] = group_nr
+    return tuple(tuple(row) for row in group_grid)
+
+
+# Three columns of groups in a row, so only neighbouring groups touch
+STRIPS = layout({group_nr: [(row, col) for row in range(1, 4) for col in cols]
+                 for group_nr, cols in enumerate([range(1, 4), range(4, 6), range(6, 9)])})
+# Every group touches the other two, so they can't alternate between slime and honey
+TRIANGLE = layout({0: [(row, col) for row in range(1, 3) for col in range(1, 5)],
+                   1: [(row, col) for row in range(1, 3) for col in range(5, 9)],
+                   2: [(3, col) for col in range(1, 9)]})
+
+
+def assert_valid(model: PumpkinModel, result):
+    read, valid = model.read_layout(result.group_grid)
+    assert valid
+    assert read.group_count == result.group_count
+
+
+def test_solve_blocks():
+    blocks = input_to_blocks(PUMPKIN_BLOCK)
+    result = solve_blocks(blocks)
+    assert result.group_count == 2 and result.optimal
+    assert_valid(PumpkinModel(blocks), result)
+
+
+def test_valid_warm_start_is_the_incumbent():
+    model = PumpkinModel(input_to_blocks(PUMPKIN_BLOCK), warm_start=STRIPS)
+    assert model.incumbent.group_count == 3 and model.group_bound is None
+    # Only layouts with fewer groups than the incumbent are modelled
+    assert model.max_groups == 3
+
+    result = model.solve()
+    assert result.group_count == 2 and result.optimal
+    assert_valid(model, result)
+
+
+def test_uncolourable_warm_start_bounds_the_search():
+    model = PumpkinModel(input_to_blocks(PUMPKIN_BLOCK), warm_start=TRIANGLE)
+    read, valid = model.read_layout(TRIANGLE)
+    assert read.group_count == 3 and not valid
+    assert model.incumbent is None and model.group_bound == 3
+
+    result = model.solve()
+    assert result.group_count == 2 and result.optimal
+    assert_valid(model, result)
+
+
+def test_too_tight_bound_is_dropped():
+    model = PumpkinModel(input_to_blocks(PUMPKIN_BLOCK), warm_start=TRIANGLE)
+    # No layout has a single group, so the solver has to search again without the bound
+    model.group_bound = 1
+    result = model.solve()
+    assert result.group_count == 2 and result.optimal
+    assert_valid(model, result)
+
+
+def test_small_group_bounds_the_search():
+    small_group = layout({0: [(1, col) for col in range(1, 4)],
+                          1: [(row, col) for row in range(1, 3) for col in range(4, 9)],
+                          2: [(2, col) for col in range(1, 4)] + [(3, col) for col in range(1, 9)]})
+    model = PumpkinModel(input_to_blocks(PUMPKIN_BLOCK), warm_start=small_group)
+    assert model.incumbent is None and model.group_bound == 3
+    assert model.solve().group_count == 2
+
+
+def test_unreadable_warm_start_is_ignored():
+    # A single group is larger than MAX_GROUP_SIZE
+    one_group = layout({0: [(row, col) for row in range(1, 4) for col in range(1, 9)]})
+    model = PumpkinModel(input_to_blocks(PUMPKIN_BLOCK), warm_start=one_group)
+    assert model.read_layout(one_group) == (None, False)
+    assert model.incumbent is None and model.group_bound is None
+    assert model.solve().group_count == 2
+
+
+def test_air_cells_pad_small_clusters():
+    # Three pumpkins are too few for a group on their own, and have no bridges
+    blocks = input_to_blocks('\n'.join(['00000', '0ppp0', '0o0o0', '00000']))
+    result = solve_blocks(blocks)
+    assert result.group_count == 1 and result.optimal
+    # The three pumpkins and at least one air cell next to them
+    assert result.group_grid[1][1:4] == (0, 0, 0)
+    assert sum(group_nr == 0 for row in result.group_grid for group_nr in row) >= 4
+
+    assert solve_blocks(blocks, bridges_only=True) is None
+    assert solve_clusters(blocks, workers=1).group_count == 1
+    assert solve_clusters(blocks, workers=1, bridges_only=True) is None
+
+
+def test_candidates_are_close_to_pumpkins():
+    # A pumpkin at the end of a long corridor of air
+    blocks = input_to_blocks('\n'.join(['o' * 12, 'p' + '0' * 10 + 'o', 'o' * 12]))
+    compact = CompactGeode(blocks)
+    candidates = candidate_cells(compact, coverable_cells(compact), 4).reshape(blocks.shape)
+    assert np.flatnonzero(candidates[1]).tolist() == list(range(6))
+    assert not candidates[0].any() and not candidates[2].any()